@@ -1,132 +1,430 @@
 import pandas as pd
 import numpy as np
 import os
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Sequence, Tuple
 import argparse
+import contextlib
+import io
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
 
-def calculate_statistics(data: List[float]) -> Dict[str, float]:
+import profiling
+from bootstrap import DEFAULT_STATISTICS, compare_samples
+from columnar_cache import load_columns
+from compressed_io import find_input, open_input
+from csv_tail import follow_csv_column
+from percentiles import exact_quantiles, parse_percentiles
+from quantile_sketch import LogHistogram, merge_sketches
+
+# Column names that may hold the timing data, in order of preference
+TIMING_COLUMNS = ['HTTP Request Time', 'time', 'avg', 'latency', 'duration']
+# Also accepted when following a stream (tshark -T fields -E header=y output)
+FOLLOW_COLUMNS = TIMING_COLUMNS + ['http.time']
+# Percentiles reported by default by the exact and the sketch engines
+DEFAULT_PERCENTILES = [50, 90, 95]
+SKETCH_PERCENTILES = [50, 90, 95, 99, 99.9]
+SKETCH_SUFFIX = '.sketch.json'
+
+def percentile_key(q: float) -> str:
+    """Return the statistics key of a percentile ('median' for 50, 'p99.9' for 99.9)."""
+    return 'median' if q == 50 else f'p{q:g}'
+
+def ordinal(number: str) -> str:
+    """Return '1st', '2nd', '90th', '99.9th' for a percentile written as text."""
+    if '.' in number or number[-2:] in ('11', '12', '13'):
+        return number + 'th'
+    return number + {'1': 'st', '2': 'nd', '3': 'rd'}.get(number[-1], 'th')
+
+def calculate_statistics(data: Sequence[float], percentiles: Sequence[float] = DEFAULT_PERCENTILES,
+                         dtype=None) -> Dict[str, float]:
     """
     Calculate statistical metrics for a list of values.
     
+    All percentiles, the minimum and the maximum come from a single
+    selection pass over the data.
+    
     Args:
-        data: List of numerical values (durations/times)
+        data: List or array of numerical values (durations/times)
+        percentiles: Percentiles to report (0-100)
+        dtype: Storage type of the values (e.g. np.float32 to halve memory)
     
     Returns:
         Dictionary containing statistical metrics
     """
-    if not data:
-        return {
-            'count': 0,
-            'min': 0,
-            'max': 0,
-            'mean': 0,
-            'median': 0,
-            'p90': 0,
-            'p95': 0
-        }
+    if len(data) == 0:
+        stats = {'count': 0, 'min': 0, 'max': 0, 'mean': 0}
+        stats.update({percentile_key(q): 0 for q in percentiles})
+        return stats
     
-    data_array = np.array(data)
+    data_array = np.asarray(data, dtype=dtype)
+    values, minimum, maximum = exact_quantiles(data_array, percentiles, with_extremes=True)
     
-    return {
+    stats = {
         'count': len(data),
-        'min': float(np.min(data_array)),
-        'max': float(np.max(data_array)),
-        'mean': float(np.mean(data_array)),
-        'median': float(np.median(data_array)),
-        'p90': float(np.percentile(data_array, 90)),
-        'p95': float(np.percentile(data_array, 95))
+        'min': minimum,
+        'max': maximum,
+        'mean': float(np.mean(data_array, dtype=np.float64)),
     }
+    for q, value in zip(percentiles, values):
+        stats[percentile_key(q)] = float(value)
+    return stats
 
-def read_csv_file(file_path: str) -> Tuple[List[float], str]:
+def sketch_statistics(sketch: LogHistogram, percentiles: Sequence[float] = SKETCH_PERCENTILES) -> Dict[str, float]:
+    """
+    Calculate statistical metrics from a quantile sketch.
+    
+    count, min, max and mean are exact; percentiles are within the
+    sketch's relative error.
+    
+    Args:
+        sketch: Sketch holding the timing data
+        percentiles: Percentiles to report (0-100)
+    
+    Returns:
+        Dictionary containing statistical metrics
+    """
+    stats = {
+        'count': sketch.count,
+        'min': sketch.min if sketch.count else 0,
+        'max': sketch.max if sketch.count else 0,
+        'mean': sketch.total / sketch.count if sketch.count else 0,
+    }
+    for q, value in zip(percentiles, sketch.quantiles([q / 100 for q in percentiles])):
+        stats[percentile_key(q)] = float(value)
+    return stats
+
+def find_timing_column(file_path: str) -> Optional[str]:
+    """
+    Find the timing column of a CSV file by reading its header only.
+    
+    Args:
+        file_path: Path to the CSV file
+    
+    Returns:
+        Name of the timing column, or None if there is none
+    """
+    with open_input(file_path, block_size=1 << 16, prefetch=1) as f:
+        header = pd.read_csv(f, nrows=0).columns
+    for col in TIMING_COLUMNS:
+        if col in header:
+            return col
+    print(f"Warning: No timing data found in {os.path.basename(file_path)}")
+    print(f"Available columns: {list(header)}")
+    return None
+
+def read_csv_file(file_path: str) -> Tuple[np.ndarray, str]:
     """
     Read CSV file and extract timing data.
     
+    The timing column is found from the header and only that column is
+    parsed, chunk by chunk, into a columnar cache next to the file; later
+    runs memory-map the cached column instead of parsing the text again.
+    
     Args:
         file_path: Path to the CSV file
     
     Returns:
         Tuple of (timing_data, file_identifier)
     """
+    file_name = os.path.basename(file_path)
     try:
-        df = pd.read_csv(file_path)
-        file_name = os.path.basename(file_path)
-        
-        # Try different column names for timing data
-        timing_columns = ['HTTP Request Time', 'time', 'avg', 'latency', 'duration']
-        timing_data = []
-        
-        for col in timing_columns:
-            if col in df.columns:
-                timing_data = df[col].dropna().tolist()
-                break
-        
-        if not timing_data:
-            print(f"Warning: No timing data found in {file_name}")
-            print(f"Available columns: {list(df.columns)}")
+        col = find_timing_column(file_path)
+        if col is None:
+            return np.empty(0), file_name
         
+        timing_data = load_columns(file_path, [col]).get(col, np.empty(0))
+        if timing_data.dtype.kind == 'f':
+            timing_data = timing_data[~np.isnan(timing_data)]
         return timing_data, file_name
     
     except Exception as e:
         print(f"Error reading {file_path}: {str(e)}")
-        return [], os.path.basename(file_path)
+        return np.empty(0), file_name
 
-def extract_metrics_from_files(file_paths: List[str]) -> None:
+def read_csv_sketch(file_path: str, relative_error: float = 0.01,
+                    chunk_size: int = 1_000_000) -> Tuple[LogHistogram, str]:
     """
-    Extract and display metrics from multiple CSV files.
+    Read the timing column of a CSV file chunk by chunk into a quantile sketch.
+    
+    Only the timing column is parsed and memory stays constant whatever the
+    file size. Files ending in .sketch.json are sketches saved by an earlier
+    run and are loaded as they are.
     
     Args:
-        file_paths: List of file paths to analyze
+        file_path: Path to the CSV (or saved sketch) file
+        relative_error: Relative error of the sketch quantiles
+        chunk_size: Number of rows parsed at a time
+    
+    Returns:
+        Tuple of (sketch, file_identifier)
     """
+    file_name = os.path.basename(file_path)
+    if file_path.endswith(SKETCH_SUFFIX):
+        return LogHistogram.load(file_path), file_name[:-len(SKETCH_SUFFIX)]
+    
+    sketch = LogHistogram(relative_error)
+    try:
+        col = find_timing_column(file_path)
+        if col is not None:
+            with open_input(file_path) as f:
+                for chunk in pd.read_csv(f, usecols=[col], chunksize=chunk_size):
+                    sketch.update(pd.to_numeric(chunk[col], errors='coerce').to_numpy(dtype=np.float64))
+    except Exception as e:
+        print(f"Error reading {file_path}: {str(e)}")
+    return sketch, file_name
+
+def print_file_statistics(file_name: str, stats: Dict[str, float]) -> None:
+    """Print the statistics block of one file."""
+    print(f"FILE: {file_name}")
+    print("-" * 50)
+    print(f"Number of packets/requests: {stats['count']:,}")
+    print(f"Minimum duration (s):       {stats['min']:.6f}")
+    print(f"Maximum duration (s):       {stats['max']:.6f}")
+    print(f"Average duration (s):       {stats['mean']:.6f}")
+    for key in list(stats)[4:]:
+        label = "Median duration (s):" if key == 'median' else f"{ordinal(key[1:])} percentile (s):"
+        print(f"{label:<28}{stats[key]:.6f}")
+    print()
+
+def print_comparison_table(all_results: List[Tuple[str, Dict[str, float]]]) -> None:
+    """Print the comparison summary table of several files."""
     print("=" * 80)
-    print("NETWORK PERFORMANCE METRICS EXTRACTION")
+    print("COMPARISON SUMMARY")
     print("=" * 80)
     print()
     
-    all_results = []
+    percentile_keys = list(all_results[0][1])[4:]
+    headers = ["Min (s)", "Max (s)", "Avg (s)"]
+    headers += ["Median (s)" if key == 'median' else f"P{key[1:]} (s)" for key in percentile_keys]
     
-    for file_path in file_paths:
+    # Print header
+    print(f"{'File':<25} {'Packets':<10} " + " ".join(f"{header:<12}" for header in headers))
+    print("-" * 25 + " " + "-" * 10 + "".join(" " + "-" * 12 for _ in headers))
+    
+    for file_name, stats in all_results:
+        values = [stats['min'], stats['max'], stats['mean']] + [stats[key] for key in percentile_keys]
+        print(f"{file_name:<25} {stats['count']:<10,} " + " ".join(f"{value:<12.6f}" for value in values))
+    
+    print()
+
+def analyze_file(file_path: str, engine: str, relative_error: float, chunk_size: int,
+                 sketch_dir: Optional[str], percentiles: Sequence[float],
+                 dtype=None) -> Tuple[str, str, Optional[Dict[str, float]], Optional[LogHistogram]]:
+    """
+    Compute the statistics of one file (runs in a worker process).
+    
+    Everything the analysis prints is captured and returned, so the parent
+    can print the reports of all files in their original order.
+    
+    Returns:
+        Tuple of (printed output, file_identifier, statistics or None, sketch or None)
+    """
+    output = io.StringIO()
+    stats = None
+    sketch = None
+    with contextlib.redirect_stdout(output):
+        file_name = os.path.basename(file_path)
         if not os.path.exists(file_path):
             print(f"File not found: {file_path}")
-            continue
+            return output.getvalue(), file_name, None, None
         
-        timing_data, file_name = read_csv_file(file_path)
+        with profiling.stage('load') as stage:
+            if engine == 'sketch':
+                sketch, file_name = read_csv_sketch(file_path, relative_error, chunk_size)
+                count = sketch.count
+            else:
+                timing_data, file_name = read_csv_file(file_path)
+                count = len(timing_data)
+            stage.rows = count
         
-        if timing_data:
-            stats = calculate_statistics(timing_data)
-            all_results.append((file_name, stats))
-            
-            print(f"FILE: {file_name}")
-            print("-" * 50)
-            print(f"Number of packets/requests: {stats['count']:,}")
-            print(f"Minimum duration (s):       {stats['min']:.6f}")
-            print(f"Maximum duration (s):       {stats['max']:.6f}")
-            print(f"Average duration (s):       {stats['mean']:.6f}")
-            print(f"Median duration (s):        {stats['median']:.6f}")
-            print(f"90th percentile (s):        {stats['p90']:.6f}")
-            print(f"95th percentile (s):        {stats['p95']:.6f}")
-            print()
+        if count > 0:
+            with profiling.stage('statistics', count):
+                if engine == 'sketch':
+                    stats = sketch_statistics(sketch, percentiles)
+                    if sketch_dir:
+                        os.makedirs(sketch_dir, exist_ok=True)
+                        sketch.save(os.path.join(sketch_dir, file_name + SKETCH_SUFFIX))
+                else:
+                    stats = calculate_statistics(timing_data, percentiles, dtype)
+            print_file_statistics(file_name, stats)
         else:
+            sketch = None
             print(f"No data extracted from: {file_name}")
             print()
+    return output.getvalue(), file_name, stats, sketch
+
+def extract_metrics_from_files(file_paths: List[str], engine: str = 'exact', relative_error: float = 0.01,
+                               chunk_size: int = 1_000_000, sketch_dir: Optional[str] = None,
+                               merge: bool = False, percentiles: Optional[Sequence[float]] = None,
+                               dtype=None, workers: Optional[int] = None) -> None:
+    """
+    Extract and display metrics from multiple CSV files.
+    
+    Args:
+        file_paths: List of file paths to analyze
+        engine: 'exact' loads the whole column, 'sketch' streams it into a
+            constant-memory quantile sketch
+        relative_error: Relative error of the sketch quantiles
+        chunk_size: Rows parsed at a time by the sketch engine
+        sketch_dir: Directory where the sketch of each file is saved
+        merge: Also report the statistics of all files merged (sketch engine)
+        percentiles: Percentiles to report (default depends on the engine)
+        dtype: Storage type of the values for the exact engine
+        workers: Files analyzed in parallel (default: one process per file,
+            up to the CPU count; 1 analyzes them in this process)
+    """
+    if percentiles is None:
+        percentiles = SKETCH_PERCENTILES if engine == 'sketch' else DEFAULT_PERCENTILES
+    print("=" * 80)
+    print("NETWORK PERFORMANCE METRICS EXTRACTION")
+    print("=" * 80)
+    print()
+    
+    all_results = []
+    sketches = []
+    
+    options = (engine, relative_error, chunk_size, sketch_dir, percentiles, dtype)
+    jobs = [(file_path,) + options for file_path in file_paths]
+    if workers is None:
+        workers = min(os.cpu_count() or 1, len(jobs))
+    
+    if workers > 1:
+        # map() yields in submission order, so the output does not depend on
+        # which file finishes first
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(analyze_file, *zip(*jobs)))
+    else:
+        results = (analyze_file(*job) for job in jobs)
+    
+    for output, file_name, stats, sketch in results:
+        print(output, end='')
+        if stats is not None:
+            all_results.append((file_name, stats))
+        if sketch is not None:
+            sketches.append(sketch)
+    
+    if merge and len(sketches) > 1:
+        merged_name = f"MERGED ({len(sketches)} files)"
+        stats = sketch_statistics(merge_sketches(sketches), percentiles)
+        all_results.append((merged_name, stats))
+        print_file_statistics(merged_name, stats)
     
     # Summary comparison table
     if len(all_results) > 1:
-        print("=" * 80)
-        print("COMPARISON SUMMARY")
-        print("=" * 80)
+        print_comparison_table(all_results)
+
+def print_bootstrap_comparison(file_paths: List[str], resamples: int = 10000, confidence: float = 0.95,
+                               statistics: Sequence[str] = DEFAULT_STATISTICS, seed: int = 0,
+                               memory_budget: int = 1 << 30, workers: Optional[int] = None) -> Dict:
+    """
+    Print bootstrap confidence intervals per file and for every pair of files.
+    
+    A difference whose interval excludes zero is marked with '*'.
+    
+    Args:
+        file_paths: CSV files to compare (read through the columnar cache)
+        resamples: Bootstrap resamples per file
+        confidence: Confidence level of the intervals
+        statistics: 'mean', 'median' or 'pXX' names
+        seed: Root seed of the resamples (same seed, same intervals)
+        memory_budget: Bytes the resample batches may use together
+        workers: Worker processes for the resamples (default: the CPU count)
+    
+    Returns:
+        The comparison computed by bootstrap.compare_samples
+    """
+    samples = {}
+    for file_path in file_paths:
+        if os.path.exists(file_path):
+            timing_data, file_name = read_csv_file(file_path)
+            if len(timing_data):
+                samples[file_name] = timing_data
+    if not samples:
+        return {}
+    
+    with profiling.stage('bootstrap', sum(len(values) for values in samples.values()) * resamples):
+        comparison = compare_samples(samples, resamples, statistics, confidence, seed, memory_budget, workers)
+    level = f"{confidence:.0%}"
+    print("=" * 80)
+    print(f"BOOTSTRAP CONFIDENCE INTERVALS ({resamples:,} resamples, {level})")
+    print("=" * 80)
+    print()
+    headers = [f"{name.capitalize() if name in ('mean', 'median') else name.upper()} (s)" for name in statistics]
+    print(f"{'File':<25} " + " ".join(f"{header:<32}" for header in headers))
+    print("-" * 25 + "".join(" " + "-" * 32 for _ in headers))
+    for file_name, intervals in comparison['samples'].items():
+        cells = [f"{value:.6f} [{low:.6f}, {high:.6f}]" for value, low, high in intervals.values()]
+        print(f"{file_name:<25} " + " ".join(f"{cell:<32}" for cell in cells))
+    print()
+    if comparison['differences']:
+        print(f"{'Difference':<51} " + " ".join(f"{header:<34}" for header in headers))
+        print("-" * 51 + "".join(" " + "-" * 34 for _ in headers))
+        for (first, second), intervals in comparison['differences'].items():
+            cells = [f"{value:+.6f} [{low:+.6f}, {high:+.6f}]{'*' if low > 0 or high < 0 else ''}"
+                     for value, low, high in intervals.values()]
+            print(f"{first + ' - ' + second:<51} " + " ".join(f"{cell:<34}" for cell in cells))
         print()
-        
-        # Create comparison table
-        headers = ["File", "Packets", "Min (s)", "Max (s)", "Avg (s)", "Median (s)", "P90 (s)", "P95 (s)"]
-        
-        # Print header
-        print(f"{'File':<25} {'Packets':<10} {'Min (s)':<12} {'Max (s)':<12} {'Avg (s)':<12} {'Median (s)':<12} {'P90 (s)':<12} {'P95 (s)':<12}")
-        print("-" * 25 + " " + "-" * 10 + " " + "-" * 12 + " " + "-" * 12 + " " + "-" * 12 + " " + "-" * 12 + " " + "-" * 12 + " " + "-" * 12)
-        
-        for file_name, stats in all_results:
-            print(f"{file_name:<25} {stats['count']:<10,} {stats['min']:<12.6f} {stats['max']:<12.6f} {stats['mean']:<12.6f} {stats['median']:<12.6f} {stats['p90']:<12.6f} {stats['p95']:<12.6f}")
-        
+        print("* interval excludes zero")
         print()
+    return comparison
+
+def follow_metrics(file_path: str, column: Optional[str] = None, interval: float = 10.0,
+                   relative_error: float = 0.01, percentiles: Sequence[float] = SKETCH_PERCENTILES,
+                   snapshot_file: Optional[str] = None, where: Optional[Tuple[str, str]] = None,
+                   scale: float = 1.0, idle_timeout: Optional[float] = None) -> LogHistogram:
+    """
+    Follow a growing CSV file (or a pipe) and report running statistics.
+    
+    Every batch of new rows is added to a quantile sketch, whose size
+    depends on the dynamic range of the data only, so the cost of an update
+    and of a snapshot does not grow with the history. A snapshot of the
+    running statistics, plus the rate of the last interval, is printed every
+    interval seconds and appended as a JSON line to snapshot_file.
+    
+    Args:
+        file_path: CSV file being written, or '-' for standard input
+        column: Timing column (default: the first of FOLLOW_COLUMNS in the header)
+        interval: Seconds between snapshots
+        relative_error: Relative error of the sketch percentiles
+        percentiles: Percentiles to report (0-100)
+        snapshot_file: JSON lines file the snapshots are appended to
+        where: Optional (column, value) row filter, e.g. ('metric_name', 'http_req_duration')
+        scale: Factor applied to the values (0.001 turns k6 milliseconds into seconds)
+        idle_timeout: Stop after this many seconds without new rows (default: never)
+    
+    Returns:
+        The sketch of everything read
+    """
+    sketch = LogHistogram(relative_error)
+    last_time = time.monotonic()
+    last_count = 0
+    
+    def snapshot(now):
+        nonlocal last_time, last_count
+        stats = sketch_statistics(sketch, percentiles)
+        rate = (sketch.count - last_count) / (now - last_time) if now > last_time else 0.0
+        last_time, last_count = now, sketch.count
+        print(f"[{time.strftime('%H:%M:%S')}] {stats['count']:,} requests ({rate:,.1f}/s)  "
+              f"min {stats['min']:.6f}  mean {stats['mean']:.6f}  max {stats['max']:.6f}  " +
+              "  ".join(f"{key} {stats[key]:.6f}" for key in list(stats)[4:]), flush=True)
+        if snapshot_file:
+            with open(snapshot_file, 'a') as f:
+                f.write(json.dumps(dict(stats, time=time.time(), rate=rate)) + '\n')
+    
+    try:
+        for values in follow_csv_column(file_path, column or FOLLOW_COLUMNS, idle_timeout=idle_timeout,
+                                        poll_interval=min(1.0, interval), where=where):
+            if len(values):
+                with profiling.stage('update', len(values)):
+                    sketch.update(values * scale if scale != 1 else values)
+            now = time.monotonic()
+            if now - last_time >= interval:
+                snapshot(now)
+    except KeyboardInterrupt:
+        pass
+    snapshot(time.monotonic())
+    return sketch
 
 def main():
     """Main function with command line argument parsing."""
@@ -134,8 +432,61 @@ def main():
     parser.add_argument('files', nargs='*', help='CSV files to analyze')
     parser.add_argument('--preset', choices=['24h', 'phase0', 'stress'], 
                        help='Use predefined file sets')
+    parser.add_argument('--engine', choices=['exact', 'sketch'], default='exact',
+                       help='exact: load all values; sketch: constant-memory quantile sketch (adds p99/p99.9)')
+    parser.add_argument('--percentiles', type=parse_percentiles,
+                       help='Comma-separated percentiles to report, e.g. 50,90,95,99,99.9,99.99 '
+                            '(default: 50,90,95 exact, 50,90,95,99,99.9 sketch)')
+    parser.add_argument('--float32', action='store_true',
+                       help='Hold values as float32 in the exact engine (half the memory, ~7 significant digits)')
+    parser.add_argument('--relative-error', type=float, default=0.01,
+                       help='Relative error of the sketch percentiles (default: 0.01)')
+    parser.add_argument('--chunk-size', type=int, default=1_000_000,
+                       help='Rows read at a time by the sketch engine')
+    parser.add_argument('--save-sketches', metavar='DIR',
+                       help='Save the sketch of each file to DIR/<file>.sketch.json for later merging')
+    parser.add_argument('--merge', action='store_true',
+                       help='Also report all inputs merged into one sketch (sketch engine)')
+    parser.add_argument('--workers', type=int,
+                       help='Files analyzed in parallel (default: one process per file, up to the CPU count)')
+    parser.add_argument('--follow', metavar='FILE',
+                       help='Follow a CSV file as it grows (or - for a pipe) and print running statistics')
+    parser.add_argument('--interval', type=float, default=10,
+                       help='Seconds between snapshots in follow mode (default: 10)')
+    parser.add_argument('--column', help='Timing column to follow (default: detected from the header)')
+    parser.add_argument('--where', metavar='COLUMN=VALUE',
+                       help='Only follow rows where COLUMN equals VALUE, e.g. metric_name=http_req_duration')
+    parser.add_argument('--scale', type=float, default=1.0,
+                       help='Factor applied to followed values, e.g. 0.001 for k6 milliseconds')
+    parser.add_argument('--snapshot-file', metavar='FILE',
+                       help='Append every follow-mode snapshot to FILE as a JSON line')
+    parser.add_argument('--follow-timeout', type=float,
+                       help='Stop following after this many seconds without new rows')
+    parser.add_argument('--bootstrap', type=int, metavar='N',
+                       help='Also report bootstrap confidence intervals of mean/median/p95/p99 and of their '
+                            'pairwise differences, from N resamples per file (e.g. 10000)')
+    parser.add_argument('--confidence', type=float, default=0.95,
+                       help='Confidence level of the bootstrap intervals (default: 0.95)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the bootstrap resamples (default: 0)')
+    parser.add_argument('--memory-budget', type=int, default=1024, metavar='MB',
+                       help='Memory the bootstrap resample batches may use together (default: 1024 MB)')
+    profiling.add_arguments(parser)
     
     args = parser.parse_args()
+    if profiling.configure(args) and args.workers is None:
+        args.workers = 1  # stages are measured in this process only
+    
+    if args.follow:
+        where = None
+        if args.where:
+            if '=' not in args.where:
+                parser.error('--where must be COLUMN=VALUE')
+            where = tuple(args.where.split('=', 1))
+        print(f"Following {'standard input' if args.follow == '-' else args.follow}; Ctrl-C to stop")
+        follow_metrics(args.follow, args.column, args.interval, args.relative_error,
+                       args.percentiles or SKETCH_PERCENTILES, args.snapshot_file, where,
+                       args.scale, args.follow_timeout)
+        return
     
     # Define preset file sets
     script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -155,6 +506,8 @@ def main():
             os.path.join(base_path, 'csv-data', 'stress-polka-3.csv')
         ]
     }
+    # Files only kept compressed are read from their .gz/.xz/.bz2/.zip copy
+    presets = {name: [find_input(path) for path in paths] for name, paths in presets.items()}
     
     # Determine which files to process
     if args.preset:
@@ -170,7 +523,16 @@ def main():
         print("No files specified. Using default 24h files.")
         print()
     
-    extract_metrics_from_files(file_paths)
+    if args.merge and args.engine != 'sketch':
+        parser.error('--merge requires --engine sketch')
+    
+    extract_metrics_from_files(file_paths, args.engine, args.relative_error, args.chunk_size,
+                               args.save_sketches, args.merge, args.percentiles,
+                               np.float32 if args.float32 else None, args.workers)
+    
+    if args.bootstrap:
+        print_bootstrap_comparison(file_paths, args.bootstrap, args.confidence, seed=args.seed,
+                                   memory_budget=args.memory_budget << 20, workers=args.workers)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
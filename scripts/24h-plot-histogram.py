@@ -1,12 +1,15 @@
 import matplotlib.pyplot as plt
 import matplotlib.ticker as ticker
 import seaborn as sns
-import numpy as np
-import pandas as pd
-import csv
+import argparse
 import os
 from matplotlib.patches import Patch
 
+import csv_index
+import profiling
+from compressed_io import find_input
+from log_histogram import log_histograms
+
 # File paths
 SET_FILES = {
     "IP: 17 Hops": "./csv-data/24h-ip.csv",
@@ -14,39 +17,26 @@ SET_FILES = {
     "PolKA 2: VIT-BHZ-SAO-MIA": "./csv-data/24h-polka-2.csv",
     "PolKA 3: VIT-BHZ-RIO-SAO-MIA": "./csv-data/24h-polka-3.csv",
 }
+# Read the compressed copy (.gz, .xz, .bz2, .zip) of a file that is only kept compressed
+SET_FILES = {label: find_input(path) for label, path in SET_FILES.items()}
 OUTPUT_FILE = "result-plots/24h-histogram.png"
 
-# Ensure output directory exists
-os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
-
-# Function to read all values from the first column of a CSV
-def read_times_from_csv(filepath):
-    with open(filepath, 'r') as csvfile:
-        reader = csv.reader(csvfile)
-        header = next(reader)  # skip header
-        times = [float(row[2])*1000 for row in reader if row[2] != '']
-    return times
+parser = argparse.ArgumentParser(description='Plot the density of the HTTP response times of every path')
+parser.add_argument('--output', default=OUTPUT_FILE, help=f'Output image (default: {OUTPUT_FILE})')
+csv_index.add_arguments(parser, 'the arrival time')
+profiling.add_arguments(parser)
+args = parser.parse_args()
+profiling.configure(args)
 
-# Read all datasets
-all_data = []
-for set_name, filepath in SET_FILES.items():
-    times = read_times_from_csv(filepath)
-    all_data.extend([(t, set_name) for t in times])
-
-# Convert to DataFrame
-df = pd.DataFrame(all_data, columns=["Time", "Path"])
-
-# Freedman–Diaconis rule for bin size
-def freedman_diaconis_bins(data):
-    q25, q75 = np.percentile(data, [25, 75])
-    iqr = q75 - q25
-    n = len(data)
-    bin_width = 2 * iqr / (n ** (1/3))
-    if bin_width <= 0:
-        return 100  # fallback
-    return max(10, int((max(data) - min(data)) / bin_width))
+# Ensure output directory exists
+os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
 
-bin_count = freedman_diaconis_bins(df["Time"])
+# Log-binned density of the HTTP times (ms) of every path, cached next to the data
+with profiling.stage('histogram'):
+    time_range = None
+    if args.range_from is not None or args.range_to is not None:
+        time_range = (args.range_from, args.range_to)
+    edges, densities = log_histograms(SET_FILES, "HTTP Request Time", scale=1000, time_range=time_range)
 
 # Plot
 
@@ -57,7 +47,10 @@ sns.set_context("notebook")
 fig, axes = plt.subplots(2, 2, figsize=(15, 10))
 
 # Add main title
-fig.suptitle("HTTP Response Time Density Curve per Path", fontsize=24, fontweight='bold')
+title = "HTTP Response Time Density Curve per Path"
+if time_range is not None:
+    title += f" ({args.range_from or 'start'} to {args.range_to or 'end'})"
+fig.suptitle(title, fontsize=24, fontweight='bold')
 
 # Define the subplot positions for each dataset
 # Top row: PolKA 1, PolKA 2
@@ -73,28 +66,17 @@ for idx, (set_name, pos) in enumerate(zip(subplot_order, positions)):
     row, col = pos
     ax = axes[row, col]
     
-    # Filter data for this specific dataset
-    subset_data = df[df["Path"] == set_name]
-    # Remove non-positive values antes de usar escala log
-    subset_data = subset_data[subset_data["Time"] > 0]
-    if subset_data.empty:
+    # Only positive values are binned (log scale)
+    density = densities[set_name]
+    if density is None:
         ax.set_title(set_name + " (no positive values)", fontsize=20, fontweight='bold')
         ax.set_xlabel("" if row == 0 else "Response Time (ms)")
         ax.set_ylabel("" if col != 0 else "Probability Density")
         continue
     
-    # Create histogram for this subset
-    sns.histplot(
-        data=subset_data,
-        x="Time",
-        element="step",
-        stat="density",
-        bins=bin_count,
-        fill=True,
-        alpha=0.7,
-        color=color_map[set_name],
-        ax=ax
-    )
+    # Draw the precomputed histogram as a filled step curve
+    ax.stairs(density, edges, fill=True, alpha=0.7, color=color_map[set_name])
+    ax.stairs(density, edges, color=color_map[set_name])
     
     # Set title to just the path name
     ax.set_title(set_name, fontsize=20, fontweight='bold')
@@ -128,5 +110,6 @@ for idx, (set_name, pos) in enumerate(zip(subplot_order, positions)):
 
 plt.tight_layout(rect=(0, 0.03, 1, 0.97))
 # Save plot
-plt.savefig(OUTPUT_FILE, dpi=300)
+with profiling.stage('render'):
+    plt.savefig(args.output, dpi=300)
 plt.close()
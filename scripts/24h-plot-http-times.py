@@ -1,9 +1,18 @@
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import numpy as np
-import csv
+import argparse
 import os
-from datetime import datetime, timedelta
+
+import csv_index
+import profiling
+from compressed_io import find_input
+from dataset import Dataset
+from decimate import decimate_figure
+from time_windows import TREND_PERCENTILES, csv_window_series, window_series
+
+NS_PER_HOUR = 3600 * 1_000_000_000
+NS_PER_DAY = 24 * NS_PER_HOUR
 
 # File paths
 SET_FILES = {
@@ -12,42 +21,53 @@ SET_FILES = {
     "PolKA 3: VIT-BHZ-RIO-SAO-MIA": "csv-data/24h-polka-3.csv",
     "IP: 17 Hops": "csv-data/24h-ip.csv",
 }
+# Read the compressed copy (.gz, .xz, .bz2, .zip) of a file that is only kept compressed
+SET_FILES = {label: find_input(path) for label, path in SET_FILES.items()}
 OUTPUT_FILE_REQ = "result-plots/24h-http-times.png"
+DPI = 300
+
+parser = argparse.ArgumentParser(description='Plot HTTP response times over the 24-hour period')
+parser.add_argument('--full-resolution', action='store_true',
+                    help='Draw every sample instead of the per-pixel decimated series')
+parser.add_argument('--decimation', choices=['minmax', 'lttb'], default='minmax',
+                    help='minmax: per-pixel min/max envelope (exact spikes); lttb: largest-triangle-three-buckets')
+parser.add_argument('--window', type=float, metavar='SECONDS',
+                    help='Plot the p50/p95/p99 trend over windows of this many seconds instead of every request '
+                         '(e.g. 300 for 5 minutes)')
+parser.add_argument('--engine', choices=['exact', 'sketch'], default='exact',
+                    help='Window percentiles: exact grouped sort, or chunked per-window sketches (with --window)')
+parser.add_argument('--output', default=OUTPUT_FILE_REQ, help=f'Output image (default: {OUTPUT_FILE_REQ})')
+csv_index.add_arguments(parser, 'the arrival time')
+profiling.add_arguments(parser)
+args = parser.parse_args()
+profiling.configure(args)
+if args.window is not None and args.window <= 0:
+    parser.error('--window must be positive')
+# With --from/--to only the rows of that time range are read (through the
+# block index next to each CSV) and the x axis spans the range instead of 24 hours
+ranged = args.range_from is not None or args.range_to is not None
 
 # Ensure output directory exists
-os.makedirs(os.path.dirname(OUTPUT_FILE_REQ), exist_ok=True)
+os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
 
-# Read CSV times and timestamps
-def read_times_and_timestamps_from_csv(filepath):
-    timestamps = []
-    http_times = []
-    
-    with open(filepath, 'r') as csvfile:
-        reader = csv.reader(csvfile)
-        next(reader)  # skip header
-        
-        for row in reader:
-            if len(row) >= 3 and row[2] != '':  # Check if HTTP time exists
-                try:
-                    # Parse the timestamp format: "Jun 11, 2025 18:07:49.728608000 UTC"
-                    timestamp_str = row[1].strip('"').replace(' UTC', '')
-                    
-                    # Handle nanoseconds - Python's strptime only handles microseconds (6 digits)
-                    # So we need to truncate the nanoseconds to microseconds
-                    if '.' in timestamp_str:
-                        date_part, fraction_part = timestamp_str.split('.')
-                        # Truncate to 6 digits (microseconds) and pad if necessary
-                        fraction_part = fraction_part[:6].ljust(6, '0')
-                        timestamp_str = f"{date_part}.{fraction_part}"
-                    
-                    timestamp = datetime.strptime(timestamp_str, "%b %d, %Y %H:%M:%S.%f")
-                    timestamps.append(timestamp)
-                    http_times.append(float(row[2]) * 1000)  # Convert to milliseconds
-                except (ValueError, IndexError) as e:
-                    print(f"Error parsing row: {row}, error: {e}")
-                    continue
-    
-    return timestamps, http_times
+# HTTP times (ms) and arrival timestamps (epoch ns) of every path, loaded once
+# into one compact dataset (12 bytes per request) unless the cached
+# per-window series are all that is drawn
+dataset = None
+if args.window is None or ranged:
+    available = {label: path for label, path in SET_FILES.items() if os.path.exists(path)}
+    with profiling.stage('load') as stage:
+        dataset = Dataset.from_csv(available, "HTTP Request Time", "UTC Arrival Time",
+                                   (args.range_from, args.range_to) if ranged else None, scale=1000)
+        stage.rows = len(dataset)
+
+def format_hour_minutes(hours, pos=None):
+    minutes = int(round(hours * 60))
+    return f"{minutes // 60 % 24:02d}:{minutes % 60:02d}"
+
+def format_hour_seconds(hours, pos=None):
+    seconds = int(round(hours * 3600))
+    return f"{seconds // 3600 % 24:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
 
 # Define consistent color palette
 colors = ['#ff7f0e', '#2ca02c', '#d62728', '#1f77b4']  # Reordered to keep IP blue in bottom-right
@@ -63,25 +83,53 @@ for i, (label, filepath) in enumerate(SET_FILES.items()):
         print(f"Warning: File {filepath} not found, skipping {label}")
         continue
         1
-    timestamps, http_times = read_times_and_timestamps_from_csv(filepath)
-    if not timestamps:
-        print(f"Warning: No data found in {filepath}, skipping {label}")
-        continue
-        
-    # Convert timestamps to hours of the day (0-24)
-    hours_of_day = []
-    sorted_http_times = []
-    
-    # Create pairs of (hour_of_day, http_time) and sort by hour
-    time_pairs = [(dt.hour + dt.minute/60 + dt.second/3600 + dt.microsecond/3600000000, ht) 
-                  for dt, ht in zip(timestamps, http_times)]
-    time_pairs.sort(key=lambda x: x[0])  # Sort by hour of day
-    
-    hours_of_day = [pair[0] for pair in time_pairs]
-    sorted_http_times = [pair[1] for pair in time_pairs]
-    
     ax = axes[i]
-    ax.plot(hours_of_day, sorted_http_times, color=color_dict[label], alpha=0.7, linewidth=0.8)
+    if args.window is not None:
+        window_ns = int(round(args.window * 1e9))
+        with profiling.stage('windows') as stage:
+            if ranged:
+                # Windows of the requested range only, in hours since its first midnight
+                view = dataset.path(label)
+                series = window_series(view.timestamps, view.values, window_ns, TREND_PERCENTILES,
+                                       engine=args.engine)
+                midnight = series['start_ns'][0] - series['start_ns'][0] % NS_PER_DAY if len(view) else 0
+            else:
+                # Per-window percentiles over the time of day, cached next to the data
+                series = csv_window_series(filepath, window_ns, TREND_PERCENTILES, fold_day=True,
+                                           engine=args.engine)
+                midnight = 0
+            stage.rows = int(series['count'].sum())
+        if len(series['count']) == 0:
+            print(f"Warning: No data found in {filepath}, skipping {label}")
+            continue
+        # One point per window, at its middle
+        hours = (series['start_ns'] - midnight + series['window_ns'] / 2) / NS_PER_HOUR
+        for column, (q, style) in enumerate(zip(series['percentiles'], ['-', '--', ':'])):
+            ax.plot(hours, series['quantiles'][:, column], color=color_dict[label], linestyle=style,
+                    linewidth=1.2, label=f"p{q:g}")
+        ax.legend(fontsize=14, loc='upper right')
+    else:
+        view = dataset.path(label)
+        if len(view) == 0:
+            print(f"Warning: No data found in {filepath}, skipping {label}")
+            continue
+
+        # Convert timestamps to hours of the day (0-24) and sort by hour; a
+        # range is drawn in hours since its first midnight so it may cross
+        # one, and is already in time order
+        with profiling.stage('sort', len(view)):
+            if ranged:
+                first = view.timestamps[0]
+                hours_of_day = (view.timestamps - (first - first % NS_PER_DAY)) / NS_PER_HOUR
+                sorted_http_times = view.values
+            else:
+                hours_of_day = (view.timestamps % NS_PER_DAY) / NS_PER_HOUR
+                order = np.argsort(hours_of_day, kind="stable")
+                hours_of_day = hours_of_day[order]
+                sorted_http_times = view.values[order]
+
+        ax.plot(hours_of_day, sorted_http_times, color=color_dict[label], alpha=0.7, linewidth=0.8)
+        hours = hours_of_day
     ax.set_title(label, fontsize=20, fontweight='bold')
     
     if i >= 2:  # Bottom row
@@ -93,18 +141,41 @@ for i, (label, filepath) in enumerate(SET_FILES.items()):
     ax.set_yticks(range(0, 1300, 200))
     ax.set_yticklabels([f"{int(y)}" for y in ax.get_yticks()], fontsize=18)
     ax.set_ylim(0, 1200)  # Set y-limit
-    ax.set_xlim(0, 24)  # 24-hour period
-    # Set x-axis ticks every 4 hours
-    ax.set_xticks(range(0, 25, 4))
-    ax.set_xticklabels([f"{h:02d}:00" for h in range(0, 25, 4)], fontsize=18)
+    if ranged:
+        # Span of the range, labelled with the time of day
+        if hours[-1] > hours[0]:
+            ax.set_xlim(hours[0], hours[-1])
+        ax.xaxis.set_major_formatter(plt.FuncFormatter(format_hour_seconds if hours[-1] - hours[0] < 0.25
+                                                       else format_hour_minutes))
+        ax.xaxis.set_major_locator(plt.MaxNLocator(5))
+        ax.tick_params(axis='x', labelsize=18)
+    else:
+        ax.set_xlim(0, 24)  # 24-hour period
+        # Set x-axis ticks every 4 hours
+        ax.set_xticks(range(0, 25, 4))
+        ax.set_xticklabels([f"{h:02d}:00" for h in range(0, 25, 4)], fontsize=18)
 
 # Remove unused axes if any
 for j in range(len(SET_FILES), len(axes)):
     fig.delaxes(axes[j])
 
-plt.suptitle("HTTP Response Time Over 24-Hour Period", fontsize=24, fontweight='bold')
+title = "HTTP Response Time Over 24-Hour Period"
+if args.window is not None:
+    if args.window % 60 == 0:
+        title = f"HTTP Response Time Percentiles per {args.window / 60:g}-Minute Window"
+    else:
+        title = f"HTTP Response Time Percentiles per {args.window:g}-Second Window"
+if ranged:
+    if args.window is None:
+        title = "HTTP Response Time"
+    title += f" ({args.range_from or 'start'} to {args.range_to or 'end'})"
+plt.suptitle(title, fontsize=24, fontweight='bold')
 plt.tight_layout(rect=(0, 0.03, 1, 0.97))  # Adjust rect to make room for suptitle
-plt.savefig(OUTPUT_FILE_REQ, dpi=300)
+if not args.full_resolution and args.window is None:
+    with profiling.stage('decimate'):
+        decimate_figure(fig, DPI, args.decimation)
+with profiling.stage('render'):
+    plt.savefig(args.output, dpi=DPI)
 plt.close()
 
-print(f"Plot saved to: {OUTPUT_FILE_REQ}")
+print(f"Plot saved to: {args.output}")
@@ -0,0 +1,307 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, '..'))
+DATA_DIR = os.path.join(REPO_ROOT, 'bench-data')
+# Tracked with the scripts (bench-data/ only holds the regenerated datasets)
+BASELINE_FILE = os.path.join(SCRIPT_DIR, 'benchmark-baseline.json')
+DEFAULT_REPEAT = 3
+RESULTS_VERSION = 1
+
+SIZES = {'1M': 1_000_000, '10M': 10_000_000, '100M': 100_000_000}
+CHUNK_SIZE = 1_000_000
+TIME_COLUMN = 'UTC Arrival Time'
+VALUE_COLUMN = 'HTTP Request Time'
+
+
+def dataset_path(rows: int, seed: int) -> str:
+    return os.path.join(DATA_DIR, f'synthetic-{rows}-seed{seed}.csv')
+
+
+def ensure_dataset(rows: int, seed: int) -> str:
+    """
+    Generate the synthetic CSV of a given size once and reuse it afterwards.
+
+    The run looks like a day-long test at 1000 req/s with a route swap half
+    way through, written in the exact format of html-time-parser.py.
+    """
+    from synthetic_data import write_http_times_csv
+
+    path = dataset_path(rows, seed)
+    if not os.path.exists(path):
+        os.makedirs(DATA_DIR, exist_ok=True)
+        print(f"Generating {rows:,} rows into {path}...", flush=True)
+        tmp_path = f'{path}.tmp-{os.getpid()}'
+        write_http_times_csv(tmp_path, rows, steps=[(0.5, 0.16)], seed=seed)
+        os.replace(tmp_path, path)
+    return path
+
+
+# === STAGES ===
+# Every stage returns the seconds spent in the measured work only; reading
+# the input of the stage (when it is not what is measured) is left out.
+
+def stage_load(path: str) -> float:
+    """CSV text parsing of both columns, chunk by chunk."""
+    import pandas as pd
+
+    start = time.perf_counter()
+    for chunk in pd.read_csv(path, usecols=[TIME_COLUMN, VALUE_COLUMN], chunksize=CHUNK_SIZE):
+        chunk[VALUE_COLUMN].to_numpy()
+    return time.perf_counter() - start
+
+
+def stage_timestamps(path: str) -> float:
+    """tshark frame.time_utc strings to epoch nanoseconds."""
+    import pandas as pd
+    from tshark_time import parse_frame_times
+
+    seconds = 0.0
+    for chunk in pd.read_csv(path, usecols=[TIME_COLUMN], chunksize=CHUNK_SIZE):
+        values = chunk[TIME_COLUMN].to_numpy()
+        start = time.perf_counter()
+        parse_frame_times(values)
+        seconds += time.perf_counter() - start
+    return seconds
+
+
+def stage_statistics(path: str) -> float:
+    """Exact count/min/max/mean and percentiles of the cached column."""
+    import numpy as np
+    from columnar_cache import load_columns
+    from percentiles import exact_quantiles
+
+    values = np.array(load_columns(path, [VALUE_COLUMN])[VALUE_COLUMN])
+    start = time.perf_counter()
+    exact_quantiles(values, [50, 90, 95, 99, 99.9], with_extremes=True)
+    np.mean(values)
+    return time.perf_counter() - start
+
+
+def stage_sketch(path: str) -> float:
+    """Constant-memory quantile sketch of the cached column."""
+    import numpy as np
+    from columnar_cache import load_columns
+    from quantile_sketch import LogHistogram
+
+    values = np.array(load_columns(path, [VALUE_COLUMN])[VALUE_COLUMN])
+    start = time.perf_counter()
+    sketch = LogHistogram()
+    for offset in range(0, len(values), CHUNK_SIZE):
+        sketch.update(values[offset:offset + CHUNK_SIZE])
+    sketch.quantiles([0.5, 0.9, 0.95, 0.99, 0.999])
+    return time.perf_counter() - start
+
+
+def stage_histogram(path: str) -> float:
+    """Log-binned density histogram, as for 24h-histogram.png."""
+    from columnar_cache import load_columns
+    from log_histogram import log_histograms
+
+    load_columns(path, [VALUE_COLUMN])
+    start = time.perf_counter()
+    log_histograms({'synthetic': path}, VALUE_COLUMN, scale=1000, use_cache=False)
+    return time.perf_counter() - start
+
+
+def stage_render(path: str) -> float:
+    """Decimated time-of-day line plot, as for 24h-http-times.png."""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import numpy as np
+    from columnar_cache import load_columns
+    from decimate import decimate_figure
+
+    columns = load_columns(path, [TIME_COLUMN, VALUE_COLUMN])
+    hours = (columns[TIME_COLUMN] % (86400 * 10 ** 9)) / (3600 * 10 ** 9)
+    order = np.argsort(hours, kind='stable')
+    hours, times = hours[order], columns[VALUE_COLUMN][order] * 1000
+    start = time.perf_counter()
+    fig, ax = plt.subplots(figsize=(7.5, 5))
+    ax.plot(hours, times, linewidth=0.8)
+    ax.set_xlim(0, 24)
+    decimate_figure(fig, 300, 'minmax')
+    with tempfile.TemporaryDirectory() as directory:
+        fig.savefig(os.path.join(directory, 'render.png'), dpi=300)
+    plt.close(fig)
+    return time.perf_counter() - start
+
+
+STAGES: Dict[str, Callable[[str], float]] = {
+    'load': stage_load,
+    'timestamps': stage_timestamps,
+    'statistics': stage_statistics,
+    'sketch': stage_sketch,
+    'histogram': stage_histogram,
+    'render': stage_render,
+}
+
+
+def run_stage(name: str, path: str) -> Dict:
+    """Run one stage (in a fresh worker process) and measure it."""
+    sys.path.insert(0, SCRIPT_DIR)
+    cpu_start = time.process_time()
+    try:
+        seconds = STAGES[name](path)
+    except Exception as e:
+        return {'error': f'{type(e).__name__}: {e}'}
+    return {'seconds': seconds, 'cpu_seconds': time.process_time() - cpu_start, 'peak_rss_mb': peak_rss_mb()}
+
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of this process in MB."""
+    # ru_maxrss survives exec on Linux, so a worker started from a large
+    # parent would report the parent's peak; VmHWM belongs to this process only
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_benchmarks(sizes: List[str], stages: List[str], seed: int = 0, repeat: int = DEFAULT_REPEAT) -> Dict:
+    """
+    Time every stage on the synthetic dataset of every size.
+
+    Each measurement runs in a new process, so the peak RSS of a stage is
+    not inflated by the stages before it. The fastest of repeat runs is kept
+    as 'seconds' (the least disturbed by other load on the machine), along
+    with the 'median_seconds' of the runs.
+
+    Returns:
+        Results dictionary, ready to be saved as JSON
+    """
+    from columnar_cache import load_columns
+
+    context = multiprocessing.get_context('spawn')
+    results = {
+        'version': RESULTS_VERSION,
+        'machine': {'platform': platform.platform(), 'python': platform.python_version(),
+                    'cpus': os.cpu_count()},
+        'seed': seed,
+        'runs': {},
+    }
+    for size in sizes:
+        rows = SIZES[size]
+        path = ensure_dataset(rows, seed)
+        load_columns(path, [TIME_COLUMN, VALUE_COLUMN])  # build the columnar cache outside the timings
+        results['runs'][size] = {}
+        for name in stages:
+            best = None
+            times = []
+            for _ in range(repeat):
+                with context.Pool(1) as pool:
+                    measured = pool.apply(run_stage, (name, path))
+                if 'error' in measured or best is None or measured['seconds'] < best['seconds']:
+                    best = measured
+                if 'error' in measured:
+                    break
+                times.append(measured['seconds'])
+            if 'error' not in best:
+                best['median_seconds'] = statistics.median(times)
+                best['runs'] = len(times)
+                best['rows_per_second'] = rows / best['seconds'] if best['seconds'] > 0 else None
+                print(f"{size:>5} {name:<11} {best['seconds']:9.3f} s  {best['rows_per_second']:>14,.0f} rows/s  "
+                      f"{best['peak_rss_mb']:9.1f} MB", flush=True)
+            else:
+                print(f"{size:>5} {name:<11} FAILED ({best['error']})", flush=True)
+            results['runs'][size][name] = best
+    return results
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """
+    Compare results with a baseline.
+
+    Times are compared on the fastest run of each side, which is far less
+    noisy than a single run; run with --repeat 3 or more on both sides.
+
+    Returns:
+        One message per stage whose time or peak RSS grew by more than tolerance
+    """
+    regressions = []
+    for size, stages in results['runs'].items():
+        for name, measured in stages.items():
+            reference = baseline.get('runs', {}).get(size, {}).get(name)
+            if reference is None or 'error' in reference:
+                continue
+            if 'error' in measured:
+                regressions.append(f"{size} {name}: failed ({measured['error']})")
+                continue
+            for key, unit in (('seconds', 's'), ('peak_rss_mb', 'MB')):
+                ratio = measured[key] / reference[key] if reference[key] else 1.0
+                if ratio > 1 + tolerance:
+                    regressions.append(f"{size} {name}: {key} {reference[key]:.3f} -> {measured[key]:.3f} {unit} "
+                                       f"({ratio - 1:+.0%})")
+    return regressions
+
+
+def main():
+    """Main function with command line argument parsing."""
+    parser = argparse.ArgumentParser(description='Benchmark the analysis pipeline on synthetic data')
+    parser.add_argument('--sizes', default='1M',
+                        help=f"Comma-separated dataset sizes: {', '.join(SIZES)} (default: 1M)")
+    parser.add_argument('--stages', default=','.join(STAGES),
+                        help=f"Comma-separated stages (default: {','.join(STAGES)})")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT,
+                        help=f'Runs per stage, the fastest is compared (default: {DEFAULT_REPEAT})')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the synthetic data')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help=f'Baseline results (default: {BASELINE_FILE})')
+    parser.add_argument('--save-baseline', action='store_true', help='Store these results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Slowdown or memory growth over the baseline reported as a regression (default: 0.25)')
+    args = parser.parse_args()
+
+    if args.repeat < 1:
+        parser.error('--repeat must be at least 1')
+    sizes = [size for size in args.sizes.split(',') if size]
+    stages = [stage for stage in args.stages.split(',') if stage]
+    unknown = [item for item in sizes if item not in SIZES] + [item for item in stages if item not in STAGES]
+    if unknown:
+        parser.error(f"unknown size(s)/stage(s): {', '.join(unknown)}")
+
+    results = run_benchmarks(sizes, stages, args.seed, args.repeat)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
+
+    baseline: Optional[Dict] = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=1)
+        print(f"Baseline saved to {args.baseline}")
+    elif baseline is not None:
+        if baseline.get('machine') != results['machine']:
+            print(f"Warning: {args.baseline} was measured on another machine ({baseline.get('machine')}); "
+                  f"save a local baseline with --save-baseline --baseline FILE")
+        regressions = compare(results, baseline, args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regression against {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
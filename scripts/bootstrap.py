@@ -0,0 +1,166 @@
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+DEFAULT_STATISTICS = ['mean', 'median', 'p95', 'p99']
+# Memory used by the index and value matrices of the batches in flight
+DEFAULT_MEMORY_BUDGET = 1 << 30
+
+_loaded: Dict[str, np.ndarray] = {}
+
+
+def statistic_percentile(name: str) -> Optional[float]:
+    """Percentile of a statistic name ('median' -> 50, 'p99.9' -> 99.9), None for 'mean'."""
+    if name == 'mean':
+        return None
+    if name == 'median':
+        return 50.0
+    if name.startswith('p'):
+        q = float(name[1:])
+        if 0 <= q <= 100:
+            return q
+    raise ValueError(f"Unknown statistic: {name}")
+
+
+def batch_statistics(samples: np.ndarray, statistics: Sequence[str]) -> np.ndarray:
+    """
+    Statistics of every row of a (resamples x n) matrix.
+
+    All percentiles of a row come from one np.partition with the union of
+    their order statistics, like percentiles.exact_quantiles.
+
+    Returns:
+        (resamples x statistics) matrix
+    """
+    n = samples.shape[1]
+    result = np.empty((samples.shape[0], len(statistics)))
+    quantile_columns = [(i, statistic_percentile(name)) for i, name in enumerate(statistics)
+                        if statistic_percentile(name) is not None]
+    for i, name in enumerate(statistics):
+        if name == 'mean':
+            result[:, i] = samples.mean(axis=1)
+    if quantile_columns:
+        positions = np.array([q for _, q in quantile_columns]) / 100 * (n - 1)
+        low = np.floor(positions).astype(np.int64)
+        high = np.ceil(positions).astype(np.int64)
+        ordered = np.partition(samples, np.unique(np.concatenate([low, high])), axis=1)
+        values = ordered[:, low] + (ordered[:, high] - ordered[:, low]) * (positions - low)
+        for column, (i, _) in enumerate(quantile_columns):
+            result[:, i] = values[:, column]
+    return result
+
+
+def _replicate_batch(values_path: str, seeds: List[np.random.SeedSequence],
+                     statistics: Sequence[str]) -> np.ndarray:
+    """
+    Statistics of one batch of resamples (runs in a worker process).
+
+    Every resample draws its indices from its own seed, so the replicates do
+    not depend on how resamples are split into batches or workers.
+    """
+    values = _loaded.get(values_path)
+    if values is None:
+        values = _loaded[values_path] = np.load(values_path, mmap_mode='r')
+    n = len(values)
+    index_type = np.int32 if n < 2 ** 31 else np.int64
+    indices = np.empty((len(seeds), n), dtype=index_type)
+    for row, seed in enumerate(seeds):
+        indices[row] = np.random.default_rng(seed).integers(0, n, n, dtype=index_type)
+    return batch_statistics(np.asarray(values)[indices], statistics)
+
+
+def batch_rows(n: int, memory_budget: int, workers: int) -> int:
+    """Resamples per batch so that the batches of all workers fit in the memory budget."""
+    bytes_per_row = n * (4 + 8) * 2  # indices, gathered values and the partitioned copy
+    return max(1, min(1000, memory_budget // max(1, workers) // bytes_per_row))
+
+
+def bootstrap_replicates(samples: Dict[str, np.ndarray], resamples: int = 10000,
+                         statistics: Sequence[str] = DEFAULT_STATISTICS, seed: int = 0,
+                         memory_budget: int = DEFAULT_MEMORY_BUDGET,
+                         workers: Optional[int] = None) -> Dict[str, np.ndarray]:
+    """
+    Bootstrap replicates of several statistics for every sample.
+
+    Resamples are drawn as batched index matrices sized to the memory
+    budget, and the batches of all samples are spread over a process pool.
+    Samples are handed to the workers as memory-mapped .npy files. Seeds
+    are spawned from seed per sample and per resample, so the result is
+    reproducible whatever the number of workers.
+
+    Args:
+        samples: Mapping of label to 1-D array of values (no NaNs)
+        resamples: Number of bootstrap resamples per sample
+        statistics: 'mean', 'median' or 'pXX' names
+        seed: Root seed
+        memory_budget: Bytes the batches in flight may use together
+        workers: Worker processes (default: the CPU count; 1 runs in this process)
+
+    Returns:
+        Mapping of label to a (resamples x statistics) matrix
+    """
+    workers = workers or os.cpu_count() or 1
+    replicates = {}
+    with tempfile.TemporaryDirectory(prefix='bootstrap-') as directory:
+        jobs = []
+        for number, (label, values) in enumerate(samples.items()):
+            path = os.path.join(directory, f'{number}.npy')
+            np.save(path, np.asarray(values, dtype=np.float64))
+            seeds = np.random.SeedSequence([seed, number]).spawn(resamples)
+            rows = batch_rows(len(values), memory_budget, workers)
+            jobs.extend((label, path, seeds[start:start + rows]) for start in range(0, resamples, rows))
+
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(_replicate_batch, [path for _, path, _ in jobs],
+                                            [seeds for _, _, seeds in jobs], [statistics] * len(jobs)))
+        else:
+            results = [_replicate_batch(path, seeds, statistics) for _, path, seeds in jobs]
+            _loaded.clear()
+
+    for (label, _, _), result in zip(jobs, results):
+        replicates.setdefault(label, []).append(result)
+    return {label: np.concatenate(parts) for label, parts in replicates.items()}
+
+
+def percentile_interval(replicates: np.ndarray, confidence: float = 0.95) -> Tuple[np.ndarray, np.ndarray]:
+    """Percentile bootstrap interval of every column of a replicate matrix."""
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.percentile(replicates, [tail, 100 - tail], axis=0)
+    return low, high
+
+
+def compare_samples(samples: Dict[str, np.ndarray], resamples: int = 10000,
+                    statistics: Sequence[str] = DEFAULT_STATISTICS, confidence: float = 0.95,
+                    seed: int = 0, memory_budget: int = DEFAULT_MEMORY_BUDGET,
+                    workers: Optional[int] = None) -> Dict:
+    """
+    Confidence intervals of statistics per sample and of their pairwise differences.
+
+    The samples are resampled independently, so the difference of replicate
+    r of two samples is a replicate of the difference of the statistic.
+
+    Returns:
+        Dictionary with 'statistics', 'samples' ({label: {statistic: (estimate, low, high)}})
+        and 'differences' ({(label_a, label_b): {statistic: (a - b, low, high)}})
+    """
+    replicates = bootstrap_replicates(samples, resamples, statistics, seed, memory_budget, workers)
+    estimates = {label: batch_statistics(np.asarray(values, dtype=np.float64)[None, :], statistics)[0]
+                 for label, values in samples.items()}
+
+    result = {'statistics': list(statistics), 'samples': {}, 'differences': {}}
+    for label in samples:
+        low, high = percentile_interval(replicates[label], confidence)
+        result['samples'][label] = {name: (float(estimates[label][i]), float(low[i]), float(high[i]))
+                                    for i, name in enumerate(statistics)}
+    labels = list(samples)
+    for i, first in enumerate(labels):
+        for second in labels[i + 1:]:
+            low, high = percentile_interval(replicates[first] - replicates[second], confidence)
+            difference = estimates[first] - estimates[second]
+            result['differences'][(first, second)] = {
+                name: (float(difference[j]), float(low[j]), float(high[j])) for j, name in enumerate(statistics)}
+    return result
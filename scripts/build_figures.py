@@ -0,0 +1,292 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import runpy
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Set
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.abspath(os.path.join(SCRIPT_DIR, '..'))
+MANIFEST_FILE = os.path.join(REPO_ROOT, 'result-plots', '.figures-manifest.json')
+MANIFEST_VERSION = 1
+
+# Every figure of the repository: the script drawing it, the data it reads,
+# the files it writes and the arguments it is run with (paths relative to
+# the repository root)
+FIGURES = {
+    '24h-histogram': {
+        'script': 'scripts/24h-plot-histogram.py',
+        'inputs': ['csv-data/24h-ip.csv', 'csv-data/24h-polka-1.csv',
+                   'csv-data/24h-polka-2.csv', 'csv-data/24h-polka-3.csv'],
+        'outputs': ['result-plots/24h-histogram.png'],
+        'args': [],
+    },
+    '24h-http-times': {
+        'script': 'scripts/24h-plot-http-times.py',
+        'inputs': ['csv-data/24h-polka-1.csv', 'csv-data/24h-polka-2.csv',
+                   'csv-data/24h-polka-3.csv', 'csv-data/24h-ip.csv'],
+        'outputs': ['result-plots/24h-http-times.png'],
+        'args': [],
+    },
+    '24h-http-times-trend': {
+        'script': 'scripts/24h-plot-http-times.py',
+        'inputs': ['csv-data/24h-polka-1.csv', 'csv-data/24h-polka-2.csv',
+                   'csv-data/24h-polka-3.csv', 'csv-data/24h-ip.csv'],
+        'outputs': ['result-plots/24h-http-times-trend.png'],
+        'args': ['--window', '300', '--output', 'result-plots/24h-http-times-trend.png'],
+    },
+    'route-swap': {
+        'script': 'scripts/route-swap-plot.py',
+        'inputs': ['csv-data/route-swap.csv'],
+        'outputs': ['result-plots/route-swap.png'],
+        'args': [],
+    },
+    'stress': {
+        'script': 'scripts/stress-plot.py',
+        'inputs': ['csv-data/stress-ip.csv', 'csv-data/stress-polka-1.csv',
+                   'csv-data/stress-polka-2.csv', 'csv-data/stress-polka-3.csv'],
+        'outputs': ['result-plots/stress.png'],
+        'args': [],
+    },
+}
+
+IMPORT_PATTERN = re.compile(r'^\s*(?:from\s+(\w+)\s+import|import\s+(\w+))', re.MULTILINE)
+
+
+def local_modules(script: str) -> List[str]:
+    """
+    Return the helper modules of scripts/ a script imports, directly or not.
+
+    Args:
+        script: Path of the script relative to the repository root
+
+    Returns:
+        Sorted relative paths of the helper modules
+    """
+    found: Set[str] = set()
+    pending = [script]
+    while pending:
+        with open(os.path.join(REPO_ROOT, pending.pop()), 'r') as f:
+            source = f.read()
+        for match in IMPORT_PATTERN.finditer(source):
+            module = f'scripts/{match.group(1) or match.group(2)}.py'
+            if module not in found and os.path.exists(os.path.join(REPO_ROOT, module)):
+                found.add(module)
+                pending.append(module)
+    return sorted(found)
+
+
+class FileHashes:
+    """
+    Content hashes of files, remembered across builds.
+
+    A file whose size and modification time match the previous build is not
+    read again; otherwise it is hashed and the new hash recorded.
+    """
+
+    def __init__(self, known: Optional[Dict[str, list]] = None):
+        self.known = known or {}
+
+    def digest(self, path: str) -> Optional[str]:
+        """Return the SHA-256 of a file relative to the repository root (None if missing)."""
+        try:
+            stat = os.stat(os.path.join(REPO_ROOT, path))
+        except FileNotFoundError:
+            return None
+        entry = self.known.get(path)
+        if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+            return entry[2]
+        digest = hashlib.sha256()
+        with open(os.path.join(REPO_ROOT, path), 'rb') as f:
+            for block in iter(lambda: f.read(1 << 22), b''):
+                digest.update(block)
+        self.known[path] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+        return self.known[path][2]
+
+
+def input_path(path: str) -> str:
+    """An input relative to the repository root, or its compressed copy (.gz, .xz, .bz2, .zip) if only that exists."""
+    from compressed_io import find_input
+    return os.path.relpath(find_input(os.path.join(REPO_ROOT, path)), REPO_ROOT)
+
+
+def figure_key(figure: Dict, hashes: FileHashes) -> Optional[str]:
+    """
+    Hash everything a figure depends on: inputs, script, helpers and arguments.
+
+    Returns:
+        Hex digest, or None when an input is missing
+    """
+    sources = [figure['script']] + local_modules(figure['script'])
+    record = {'inputs': {}, 'sources': {}, 'args': figure['args']}
+    for path in figure['inputs']:
+        record['inputs'][path] = hashes.digest(input_path(path))
+        if record['inputs'][path] is None:
+            return None
+    for path in sources:
+        record['sources'][path] = hashes.digest(path)
+    return hashlib.sha256(json.dumps(record, sort_keys=True).encode()).hexdigest()
+
+
+def load_manifest() -> Dict:
+    try:
+        with open(MANIFEST_FILE, 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {'version': MANIFEST_VERSION, 'figures': {}, 'files': {}}
+    if manifest.get('version') != MANIFEST_VERSION:
+        return {'version': MANIFEST_VERSION, 'figures': {}, 'files': {}}
+    return manifest
+
+
+def save_manifest(manifest: Dict) -> None:
+    os.makedirs(os.path.dirname(MANIFEST_FILE), exist_ok=True)
+    tmp_path = f'{MANIFEST_FILE}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, MANIFEST_FILE)
+
+
+def is_up_to_date(name: str, key: str, manifest: Dict, hashes: FileHashes) -> bool:
+    """Check that a figure was built from the same key and its outputs are untouched."""
+    entry = manifest['figures'].get(name)
+    if entry is None or entry['key'] != key:
+        return False
+    return all(hashes.digest(path) == digest for path, digest in entry['outputs'].items())
+
+
+def render_figure(name: str) -> float:
+    """
+    Run the script of a figure in this (worker) process.
+
+    Matplotlib and seaborn stay imported between figures rendered by the
+    same worker; the style settings are reset before every script.
+
+    Returns:
+        Seconds spent rendering
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    figure = FIGURES[name]
+    start = time.perf_counter()
+    matplotlib.rcdefaults()
+    os.chdir(REPO_ROOT)
+    argv, path = sys.argv, list(sys.path)
+    sys.argv = [figure['script']] + figure['args']
+    sys.path.insert(0, SCRIPT_DIR)
+    try:
+        runpy.run_path(os.path.join(REPO_ROOT, figure['script']), run_name='__main__')
+    finally:
+        sys.argv, sys.path[:] = argv, path
+        plt.close('all')
+    return time.perf_counter() - start
+
+
+def warm_caches(names: List[str]) -> None:
+    """
+    Build the columnar caches of the inputs shared by several figures, one file at a time.
+
+    Figures rendered concurrently would otherwise all parse the same cold
+    CSV and wait on each other's cache lock.
+    """
+    from columnar_cache import load_columns
+
+    counts: Dict[str, int] = {}
+    for name in names:
+        for path in map(input_path, FIGURES[name]['inputs']):
+            counts[path] = counts.get(path, 0) + 1
+    for path, count in counts.items():
+        if count > 1:
+            load_columns(os.path.join(REPO_ROOT, path))
+
+
+def build(names: List[str], force: bool = False, workers: Optional[int] = None, dry_run: bool = False) -> int:
+    """
+    Render the stale figures among names in a process pool.
+
+    Args:
+        names: Figures to consider
+        force: Render them even when they are up to date
+        workers: Worker processes (default: one per stale figure, up to the CPU count)
+        dry_run: Only report what would be rendered
+
+    Returns:
+        Number of figures that failed to render
+    """
+    manifest = load_manifest()
+    hashes = FileHashes(manifest.get('files'))
+    stale = {}
+    for name in names:
+        key = figure_key(FIGURES[name], hashes)
+        if key is None:
+            missing = [path for path in FIGURES[name]['inputs'] if hashes.digest(input_path(path)) is None]
+            print(f"{name}: skipped, missing input {', '.join(missing)}")
+        elif force or not is_up_to_date(name, key, manifest, hashes):
+            stale[name] = key
+        else:
+            print(f"{name}: up to date")
+
+    if dry_run or not stale:
+        for name in stale:
+            print(f"{name}: would be rendered")
+        if not dry_run:
+            manifest['files'] = hashes.known  # remember hashes of touched files
+            save_manifest(manifest)
+        return 0
+
+    failures = 0
+    workers = workers or min(os.cpu_count() or 1, len(stale))
+    if workers > 1:
+        warm_caches(list(stale))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {name: executor.submit(render_figure, name) for name in stale}
+        for name, future in futures.items():
+            try:
+                seconds = future.result()
+            except (Exception, SystemExit) as e:  # SystemExit from a script's argparse or sys.exit
+                print(f"{name}: FAILED ({type(e).__name__}: {e})")
+                manifest['figures'].pop(name, None)
+                failures += 1
+                continue
+            outputs = {path: hashes.digest(path) for path in FIGURES[name]['outputs']}
+            manifest['figures'][name] = {'key': stale[name], 'outputs': outputs}
+            print(f"{name}: rendered in {seconds:.1f} s")
+
+    manifest['files'] = hashes.known
+    save_manifest(manifest)
+    return failures
+
+
+def main():
+    """Main function with command line argument parsing."""
+    parser = argparse.ArgumentParser(description='Render the figures whose inputs, scripts or parameters changed')
+    parser.add_argument('figures', nargs='*', help=f"Figures to build: {', '.join(FIGURES)} (default: all)")
+    parser.add_argument('--force', action='store_true', help='Render even the up-to-date figures')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: one per stale figure, up to the CPU count)')
+    parser.add_argument('--dry-run', action='store_true', help='Only report which figures are stale')
+    parser.add_argument('--list', action='store_true', help='List the figures with their inputs and outputs')
+    args = parser.parse_args()
+
+    if args.list:
+        for name, figure in FIGURES.items():
+            print(f"{name}: {figure['script']} {' '.join(figure['args'])}".rstrip())
+            print(f"  inputs:  {', '.join(figure['inputs'])}")
+            print(f"  outputs: {', '.join(figure['outputs'])}")
+        return
+
+    unknown = [name for name in args.figures if name not in FIGURES]
+    if unknown:
+        parser.error(f"unknown figure(s): {', '.join(unknown)}")
+
+    failures = build(args.figures or list(FIGURES), args.force, args.workers, args.dry_run)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
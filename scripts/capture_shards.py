@@ -0,0 +1,135 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from pcap_reader import (CaptureBuffer, HttpMatcher, find_record_boundary, interface_changes, iter_records,
+                         layout_at, read_layout)
+
+
+def _process_shard(data_path: str, start: int, end: int, changes: List[tuple]) -> Dict:
+    """
+    Match HTTP requests and responses in the records starting within [start, end).
+
+    Both ends are snapped to the next record boundary, so neighbouring shards
+    agree on where one stops and the other begins. The pcapng interfaces
+    described before the shard come from changes (see interface_changes).
+
+    Returns:
+        Dictionary with the local matches ('arrivals', 'http_times'), the
+        'orphans' that need requests from earlier shards and the requests
+        still 'pending' at the end of the shard
+    """
+    with CaptureBuffer(data_path) as capture:
+        buf = capture.buf
+        layout = read_layout(buf)
+        first = find_record_boundary(buf, layout_at(layout, changes, start), start)
+        last = find_record_boundary(buf, layout_at(layout, changes, end), end) if end < len(buf) else len(buf)
+        matcher = HttpMatcher()
+        for ts_ns, linktype, offset, caplen in iter_records(buf, first, last, layout_at(layout, changes, first)):
+            matcher.feed(buf, ts_ns, linktype, offset, caplen)
+
+    return {
+        'arrivals': np.array(matcher.arrivals, dtype=np.int64),
+        'http_times': np.array(matcher.http_times, dtype=np.int64),
+        'orphans': matcher.orphans,
+        'pending': {key: list(queue) for key, queue in matcher.pending.items() if queue},
+    }
+
+
+def reconcile_shards(results: List[Dict]) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Resolve requests that cross shard boundaries.
+
+    Requests still pending at the end of a shard are carried over, per TCP
+    connection and in order, to the following shards, where they are matched
+    with the orphan responses (and updated by the orphan continuation
+    segments) found there.
+
+    This gives the pairs of a serial pass as long as a connection has at most
+    one request in flight, as with k6 virtual users. Pipelined requests that
+    straddle a shard boundary are not: a response is matched locally with a
+    later request of its shard before the carried requests are seen, so
+    pipelined captures should be read with a single shard.
+
+    Args:
+        results: Output of _process_shard for every shard, in capture order
+
+    Returns:
+        List of (arrival_ns, http_time_ns) per shard, each sorted by arrival time
+    """
+    carried: Dict[tuple, deque] = {}
+    shards = []
+    for result in results:
+        extra_arrivals = []
+        extra_times = []
+        for ts_ns, kind, key in result['orphans']:
+            queue = carried.get(key)
+            if not queue:
+                continue  # request sent before the capture started
+            if kind == 'continuation':
+                queue[-1] = ts_ns
+            else:
+                extra_arrivals.append(ts_ns)
+                extra_times.append(ts_ns - queue.popleft())
+        for key, requests in result['pending'].items():
+            carried.setdefault(key, deque()).extend(requests)
+
+        arrivals = np.concatenate([result['arrivals'], np.array(extra_arrivals, dtype=np.int64)])
+        http_times = np.concatenate([result['http_times'], np.array(extra_times, dtype=np.int64)])
+        order = np.argsort(arrivals, kind='stable')
+        shards.append((arrivals[order], http_times[order]))
+    return shards
+
+
+def merge_shards(shards: List[Tuple[np.ndarray, np.ndarray]]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    K-way merge per-shard outputs into a single arrival-ordered sequence.
+
+    Each shard is already sorted, so the stable sort (timsort) below only has
+    to merge the k pre-sorted runs; ties keep shard order.
+
+    Returns:
+        Tuple of (arrival_ns, http_time_ns), where row i is request number i + 1
+    """
+    if not shards:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    arrivals = np.concatenate([a for a, _ in shards])
+    http_times = np.concatenate([t for _, t in shards])
+    order = np.argsort(arrivals, kind='stable')
+    return arrivals[order], http_times[order]
+
+
+def extract_http_times_sharded(path: str, shards: int = None,
+                               workers: int = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Compute HTTP response times of one capture with a pool of worker processes.
+
+    The capture is split into byte ranges of roughly equal size; each worker
+    re-synchronises on the first record of its range, so no serial pass over
+    the packet records is needed before the work is distributed. Only the
+    block headers of a pcapng capture are walked first, for the interfaces
+    the workers need.
+
+    Args:
+        path: pcap or pcapng capture, possibly compressed (.gz, .xz, .bz2, .zip)
+        shards: Number of byte ranges (default: the number of workers)
+        workers: Worker processes (default: os.cpu_count())
+
+    Returns:
+        Tuple of (arrival_ns, http_time_ns) int64 arrays sorted by arrival time
+    """
+    workers = workers or os.cpu_count() or 1
+    shards = max(1, shards or workers)
+    with CaptureBuffer(path) as capture:
+        size = len(capture.buf)
+        layout = read_layout(capture.buf)
+        first = layout['first_record']
+        bounds = [first + (size - first) * i // shards for i in range(shards + 1)]
+        changes = interface_changes(capture.buf, layout, bounds[-2])
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_process_shard, [capture.data_path] * shards,
+                                        bounds[:-1], bounds[1:], [changes] * shards))
+    return merge_shards(reconcile_shards(results))
@@ -0,0 +1,314 @@
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from percentiles import exact_quantiles
+
+# Scale factor turning a median absolute deviation into a normal sigma
+MAD_TO_SIGMA = 1.4826
+REPORT_PERCENTILES = [50, 90, 99, 99.9]
+
+
+def block_medians(values: np.ndarray, block: int) -> np.ndarray:
+    """
+    Median of every run of block consecutive values (the last partial run included).
+
+    Medians are insensitive to the isolated retransmission spikes of the
+    raw series, which would otherwise look like changes to a mean-shift
+    detector. This is a single O(n) pass.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    full = len(values) // block * block
+    medians = np.median(values[:full].reshape(-1, block), axis=1) if full else np.empty(0)
+    if full < len(values):
+        medians = np.append(medians, np.median(values[full:]))
+    return medians
+
+
+def robust_sigma(values: np.ndarray) -> float:
+    """Noise level of a series, from the MAD of its first differences."""
+    if len(values) < 3:
+        return 0.0
+    diffs = np.diff(values)
+    return float(MAD_TO_SIGMA * np.median(np.abs(diffs - np.median(diffs))) / np.sqrt(2))
+
+
+def cusum(values: np.ndarray, target: float, slack: float, start: float = 0.0) -> np.ndarray:
+    """
+    Upper CUSUM statistic S_t = max(0, S_(t-1) + x_t - target - slack), vectorized.
+
+    With C_t the cumulative sum of x - target - slack, the recursion solves to
+    S_t = C_t - min(-start, min_(j<=t) C_j), so the statistic is two cumsums
+    instead of a Python loop. Use -values and -target for the lower side.
+
+    Args:
+        values: Observations
+        target: Reference level
+        slack: Allowed drift before evidence accumulates (k)
+        start: Statistic carried over from a previous batch
+
+    Returns:
+        The statistic after every observation
+    """
+    cumulative = np.cumsum(np.asarray(values, dtype=np.float64) - target - slack)
+    return cumulative - np.minimum(np.minimum.accumulate(cumulative), -start)
+
+
+def pelt(values: np.ndarray, penalty: float, min_size: int = 2) -> List[int]:
+    """
+    Optimal mean-shift segmentation with PELT (pruned exact linear time).
+
+    Minimizes the total within-segment squared error plus penalty per change.
+    Segment costs come from cumulative sums in O(1), and candidates that can
+    no longer start the last segment of an optimal solution are pruned, which
+    keeps the expected cost linear in the number of values.
+
+    Args:
+        values: Series to segment
+        penalty: Cost of one additional change point
+        min_size: Minimum segment length
+
+    Returns:
+        Sorted indices where a new segment starts (0 and len(values) excluded)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if n < 2 * min_size:
+        return []
+    sums = np.concatenate([[0.0], np.cumsum(values)])
+    squares = np.concatenate([[0.0], np.cumsum(values ** 2)])
+
+    def cost(starts: np.ndarray, end: int) -> np.ndarray:
+        length = end - starts
+        total = sums[end] - sums[starts]
+        return squares[end] - squares[starts] - total * total / length
+
+    best = np.full(n + 1, np.inf)
+    best[0] = -penalty
+    previous = np.zeros(n + 1, dtype=np.int64)
+    candidates = np.zeros(0, dtype=np.int64)
+    for end in range(min_size, n + 1):
+        start = end - min_size
+        if start == 0 or start >= min_size:
+            candidates = np.append(candidates, start)
+        totals = best[candidates] + cost(candidates, end)
+        choice = int(np.argmin(totals))
+        best[end] = totals[choice] + penalty
+        previous[end] = candidates[choice]
+        candidates = candidates[totals <= best[end]]
+
+    changes = []
+    end = n
+    while previous[end] > 0:
+        end = int(previous[end])
+        changes.append(end)
+    return changes[::-1]
+
+
+def distribution(values: np.ndarray) -> Dict[str, float]:
+    """Count, mean and REPORT_PERCENTILES of a latency sample."""
+    values = np.asarray(values, dtype=np.float64)
+    values = values[~np.isnan(values)]
+    stats = {'count': len(values), 'mean': float(values.mean()) if len(values) else 0.0}
+    quantiles = exact_quantiles(values, REPORT_PERCENTILES) if len(values) else [0.0] * len(REPORT_PERCENTILES)
+    for q, value in zip(REPORT_PERCENTILES, quantiles):
+        stats[f'p{q:g}'] = float(value)
+    return stats
+
+
+def _convergence_block(medians: np.ndarray, onset: int, end: int, level: float, tolerance: float) -> int:
+    """First block from which every median up to end stays within tolerance of level."""
+    outside = np.flatnonzero(np.abs(medians[onset:end] - level) > tolerance)
+    return onset + int(outside[-1]) + 1 if len(outside) else onset
+
+
+def analyze_shifts(values: np.ndarray, block: int, min_shift: float = 0.01, settle: int = 30,
+                   penalty: Optional[float] = None) -> Dict:
+    """
+    Find the level shifts of a latency series and the disruption around each.
+
+    The series is reduced to block medians, segmented with PELT and the
+    segments are classified: those lasting at least settle blocks are stable
+    levels, shorter ones are transients. Neighbouring levels closer than
+    min_shift (relative) are one level; transients between them are reported
+    as instabilities. Between two different levels, the disruption window
+    runs from the first transient block to the block from which the medians
+    stay within tolerance of the new level (the convergence point).
+
+    Args:
+        values: Latencies in request order
+        block: Requests per block (e.g. the request rate for one-second blocks)
+        min_shift: Smallest relative level change reported as a shift
+        settle: Blocks a level must last to count as stable
+        penalty: PELT penalty (default: BIC-like 2 * sigma^2 * log(n))
+
+    Returns:
+        Dictionary with 'levels' (list of (start, end) request ranges and their
+        distribution), 'shifts' and 'instabilities' (request indices)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    medians = block_medians(values, block)
+    n_blocks = len(medians)
+    sigma = max(robust_sigma(medians), 1e-9 * (abs(float(np.median(medians))) + 1)) if n_blocks else 0.0
+    if penalty is None:
+        penalty = 2 * sigma ** 2 * np.log(max(n_blocks, 2))
+    bounds = [0] + pelt(medians, penalty) + [n_blocks]
+
+    # Stable levels, as [start_block, end_block) with the blocks in between transient
+    levels: List[List[int]] = []
+    instabilities = []
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        if end - start < settle:
+            continue
+        if levels:
+            previous_start, previous_end = levels[-1]
+            before = float(np.median(medians[previous_start:previous_end]))
+            after = float(np.median(medians[start:end]))
+            if abs(after - before) < min_shift * abs(before):
+                if start > previous_end:
+                    instabilities.append((previous_end, start))
+                levels[-1][1] = end
+                continue
+        levels.append([start, end])
+
+    shifts = []
+    for (pre_start, pre_end), (post_start, post_end) in zip(levels[:-1], levels[1:]):
+        pre_level = float(np.median(medians[pre_start:pre_end]))
+        post_level = float(np.median(medians[post_start:post_end]))
+        tolerance = max(4 * robust_sigma(medians[post_start:post_end]), min_shift * abs(post_level) / 2)
+        converged = _convergence_block(medians, pre_end, post_end, post_level, tolerance)
+        shifts.append({
+            'onset': pre_end * block,
+            'converged': min(converged * block, len(values)),
+            'pre': distribution(values[pre_start * block:pre_end * block]),
+            'post': distribution(values[converged * block:post_end * block]),
+            'pre_level': pre_level,
+            'post_level': post_level,
+        })
+
+    return {
+        'block': block,
+        'levels': [(start * block, min(end * block, len(values)),
+                    distribution(values[start * block:end * block])) for start, end in levels],
+        'shifts': shifts,
+        'instabilities': [(start * block, end * block) for start, end in instabilities],
+    }
+
+
+class OnlineCusum:
+    """
+    Streaming level-shift detector over block medians.
+
+    The reference level and noise are learned from the first warmup blocks.
+    Two one-sided CUSUMs with slack min_shift / 2 (relative to the level)
+    then accumulate the evidence of a shift; an alarm is raised when one
+    exceeds decision_blocks times the slack, i.e. a shift of min_shift is
+    reported after about decision_blocks blocks. After an alarm the detector
+    waits for settle consecutive blocks within tolerance of each other,
+    reports the new level with the convergence time and starts over.
+
+    Every batch costs O(batch) with vectorized CUSUMs, so the detector keeps
+    up with a growing file at any realistic request rate.
+    """
+
+    def __init__(self, block: int, warmup: int = 30, min_shift: float = 0.01,
+                 decision_blocks: float = 10, settle: int = 30):
+        self.block = block
+        self.warmup = warmup
+        self.min_shift = min_shift
+        self.decision_blocks = decision_blocks
+        self.settle = settle
+        self.buffer = np.empty(0)
+        # Block medians still needed (warmup or settling), history[0] is block history_start
+        self.history = np.empty(0)
+        self.history_start = 0
+        self.blocks_seen = 0
+        self._reset(0)
+
+    def _reset(self, first_block: int) -> None:
+        self.reference_start = first_block
+        self.level = None
+        self.upper = 0.0
+        self.lower = 0.0
+        self.alarm: Optional[Dict] = None
+
+    def _medians(self, start: int, end: int) -> np.ndarray:
+        return self.history[start - self.history_start:end - self.history_start]
+
+    def update(self, values: np.ndarray) -> List[Dict]:
+        """
+        Feed new latencies; returns the events they complete.
+
+        Events are dictionaries with 'event' set to 'level' (a reference level
+        was learned), 'shift' (alarm: level changed, with the estimated onset
+        request) or 'converged' (the new level after a shift, with the
+        convergence request).
+        """
+        values = np.asarray(values, dtype=np.float64)
+        self.buffer = np.concatenate([self.buffer, values[~np.isnan(values)]])
+        full = len(self.buffer) // self.block * self.block
+        if not full:
+            return []
+        new = np.median(self.buffer[:full].reshape(-1, self.block), axis=1)
+        self.buffer = self.buffer[full:]
+        self.history = np.concatenate([self.history, new])
+        index = self.blocks_seen
+        self.blocks_seen += len(new)
+
+        # Block by block while warming up or settling; whole batches otherwise
+        events = []
+        while index < self.blocks_seen:
+            index = self._step(index, events)
+
+        # Forget the medians no later step can look at
+        if self.alarm is not None:
+            keep = self.alarm['onset_block']
+        elif self.level is None:
+            keep = self.reference_start
+        else:
+            keep = self.blocks_seen
+        self.history = self.history[keep - self.history_start:]
+        self.history_start = keep
+        return events
+
+    def _step(self, index: int, events: List[Dict]) -> int:
+        """Advance from block index; returns the next block to process."""
+        if self.alarm is not None:
+            return self._settle(index, events)
+        if self.level is None:
+            if index + 1 - self.reference_start >= self.warmup:
+                self.level = float(np.median(self._medians(self.reference_start, index + 1)))
+                events.append({'event': 'level', 'request': (index + 1) * self.block, 'level': self.level})
+            return index + 1
+
+        slack = self.min_shift * abs(self.level) / 2
+        threshold = self.decision_blocks * slack
+        batch = self._medians(index, self.blocks_seen)
+        upper = cusum(batch, self.level, slack, self.upper)
+        lower = cusum(-batch, -self.level, slack, self.lower)
+        crossed = np.flatnonzero((upper > threshold) | (lower > threshold))
+        if not len(crossed):
+            self.upper, self.lower = float(upper[-1]), float(lower[-1])
+            return self.blocks_seen
+        alarm = int(crossed[0])
+        statistic = upper if upper[alarm] > threshold else lower
+        # The shift started after the last block where the statistic was zero
+        zeros = np.flatnonzero(statistic[:alarm + 1] == 0)
+        onset = index + (int(zeros[-1]) + 1 if len(zeros) else 0)
+        self.alarm = {'event': 'shift', 'request': (index + alarm + 1) * self.block,
+                      'onset': onset * self.block, 'before': self.level, 'onset_block': onset}
+        events.append({key: value for key, value in self.alarm.items() if key != 'onset_block'})
+        return index + alarm + 1
+
+    def _settle(self, index: int, events: List[Dict]) -> int:
+        """Look for settle consecutive blocks agreeing on a new level."""
+        first = index + 1 - self.settle
+        if first >= self.alarm['onset_block']:
+            window = self._medians(first, index + 1)
+            level = float(np.median(window))
+            if np.all(np.abs(window - level) <= self.min_shift * abs(level) / 2):
+                events.append({'event': 'converged', 'request': first * self.block,
+                               'onset': self.alarm['onset'], 'before': self.alarm['before'], 'level': level})
+                self._reset(first)
+                self.level = level
+        return index + 1
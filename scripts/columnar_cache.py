@@ -0,0 +1,335 @@
+import contextlib
+import errno
+import hashlib
+import json
+import os
+import shutil
+import threading
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # not on Windows: writers are then not serialized
+    fcntl = None
+
+import numpy as np
+
+from compressed_io import open_input
+from tshark_time import NAT, describe_bad_rows, parse_frame_times
+
+CACHE_DIR_NAME = '.columnar-cache'
+CACHE_VERSION = 2
+
+# Lock files held by the current thread, so nested directory_lock calls do not deadlock
+_held = threading.local()
+
+
+def cache_dir_for(csv_path: str) -> str:
+    """Return the sidecar directory holding the cached columns of a CSV file."""
+    directory, name = os.path.split(os.path.abspath(csv_path))
+    return os.path.join(directory, CACHE_DIR_NAME, name)
+
+
+def file_digest(path: str) -> str:
+    """Return the SHA-256 of a file, read in large blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 22), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@contextlib.contextmanager
+def directory_lock(directory: str):
+    """
+    Hold an exclusive lock on a sidecar directory while it is rebuilt and replaced.
+
+    The lock is an flock on directory + '.lock', so writers in other
+    processes (and other threads) wait for each other; nested calls from
+    the thread that already holds it return at once.
+    """
+    lock_path = directory.rstrip(os.sep) + '.lock'
+    held = _held.__dict__.setdefault('paths', set())
+    if fcntl is None or lock_path in held:
+        yield
+        return
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    with open(lock_path, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        held.add(lock_path)
+        try:
+            yield
+        finally:
+            held.discard(lock_path)
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def publish_directory(tmp_dir: str, directory: str) -> bool:
+    """
+    Move a freshly written tmp_dir into place as directory, replacing the old one.
+
+    Callers hold directory_lock(directory). The old directory is renamed
+    aside before it is deleted, so readers only miss it between two
+    renames. Should a writer that does not take the lock have published in
+    between, its directory is kept and tmp_dir is removed.
+
+    Returns:
+        True if tmp_dir was published, False if another writer's directory won
+    """
+    old_dir = f'{directory.rstrip(os.sep)}.old-{os.getpid()}'
+    try:
+        os.replace(directory, old_dir)
+    except FileNotFoundError:
+        old_dir = None
+    try:
+        os.replace(tmp_dir, directory)
+    except OSError as e:
+        if e.errno not in (errno.ENOTEMPTY, errno.EEXIST):
+            raise
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return False
+    finally:
+        if old_dir:
+            shutil.rmtree(old_dir, ignore_errors=True)
+    return True
+
+
+def _read_meta(cache_dir: str) -> Optional[Dict]:
+    try:
+        with open(os.path.join(cache_dir, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get('version') == CACHE_VERSION else None
+
+
+def _write_meta(cache_dir: str, meta: Dict) -> None:
+    tmp_path = os.path.join(cache_dir, f'meta.json.tmp-{os.getpid()}-{threading.get_ident()}')
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f, indent=1)
+    os.replace(tmp_path, os.path.join(cache_dir, 'meta.json'))
+
+
+def is_fresh(csv_path: str, meta: Optional[Dict], verify_hash: bool = False) -> bool:
+    """
+    Check whether cached columns still describe the CSV file.
+
+    The size and modification time are compared first. When only the
+    modification time differs (e.g. after a fresh git checkout) the content
+    hash decides, and the cache metadata is refreshed if the content is
+    unchanged.
+
+    Args:
+        csv_path: Source CSV file
+        meta: Cache metadata, or None when there is no cache
+        verify_hash: Always compare the content hash, even when size and mtime match
+
+    Returns:
+        True if the cache can be used
+    """
+    if meta is None:
+        return False
+    stat = os.stat(csv_path)
+    if meta['source_size'] != stat.st_size:
+        return False
+    if meta['source_mtime_ns'] == stat.st_mtime_ns and not verify_hash:
+        return True
+    if file_digest(csv_path) != meta['source_sha256']:
+        return False
+    if meta['source_mtime_ns'] != stat.st_mtime_ns:
+        meta['source_mtime_ns'] = stat.st_mtime_ns
+        _write_meta(cache_dir_for(csv_path), meta)
+    return True
+
+
+def convert_column(series) -> Tuple[Optional[str], Optional[np.ndarray]]:
+    """
+    Convert a parsed CSV column (or chunk of it) to its columnar representation.
+
+    Numeric columns become float64 (int64 when they hold integers only) and
+    tshark frame.time_utc strings become int64 epoch nanoseconds.
+
+    Returns:
+        Tuple of (kind, array) with kind 'int', 'float' or 'time', or
+        (None, None) for a column that is neither (or entirely empty)
+    """
+    import pandas as pd
+
+    if series.dtype.kind in 'iu':
+        return 'int', series.to_numpy(dtype=np.int64)
+    if series.dtype.kind in 'fb':
+        kind = 'float' if series.notna().any() else None
+        return kind, series.to_numpy(dtype=np.float64)
+
+    values = series.to_numpy()
+    timestamps, bad = parse_frame_times(values)
+    if not bad.all():
+        # Empty cells are missing values, anything else that failed is reported
+        unexpected = bad & series.notna().to_numpy()
+        if unexpected.any():
+            print(f"Warning: column '{series.name}': {describe_bad_rows(values, unexpected)}")
+        return 'time', timestamps
+    numbers = pd.to_numeric(series, errors='coerce')
+    if numbers.notna().any():
+        return 'float', numbers.to_numpy(dtype=np.float64)
+    return None, None
+
+
+def _combine_chunks(chunks: List[Tuple[Optional[str], Optional[np.ndarray]]], lengths: List[int]) -> Optional[np.ndarray]:
+    """Concatenate the converted chunks of one column, unifying their kinds."""
+    kinds = {kind for kind, _ in chunks if kind is not None}
+    if not kinds:
+        return None
+    if 'time' in kinds:
+        parts = [array if kind == 'time' else np.full(length, NAT, dtype=np.int64)
+                 for (kind, array), length in zip(chunks, lengths)]
+    elif kinds == {'int'}:
+        parts = [array for _, array in chunks]
+    else:
+        parts = [array.astype(np.float64) if array is not None else np.full(length, np.nan)
+                 for (_, array), length in zip(chunks, lengths)]
+    return np.concatenate(parts)
+
+
+def build_cache(csv_path: str, columns: Optional[List[str]] = None, chunk_size: int = 1_000_000) -> Dict:
+    """
+    Parse a CSV file once and store each usable column as a .npy file.
+
+    Only the requested columns are parsed (all of them by default), chunk by
+    chunk. Compressed files (.gz, .xz, .bz2, .zip) are read directly. The
+    cache is written to a temporary directory and moved into place, so
+    readers never see a half-written cache.
+
+    Args:
+        csv_path: Source CSV file
+        columns: Names of the columns to parse and cache (default: all)
+        chunk_size: Rows parsed at a time
+
+    Returns:
+        The cache metadata
+    """
+    import pandas as pd
+
+    cache_dir = cache_dir_for(csv_path)
+    with directory_lock(cache_dir):
+        tmp_dir = f'{cache_dir}.tmp-{os.getpid()}'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        stat = os.stat(csv_path)
+        with open_input(csv_path) as f:
+            header = list(pd.read_csv(f, nrows=0).columns)
+        wanted = [name for name in header if columns is None or name in columns]
+        converted = {name: [] for name in wanted}
+        lengths = []
+        if wanted:
+            # Compressed files are inflated by a background thread while pandas parses
+            with open_input(csv_path) as f:
+                for chunk in pd.read_csv(f, usecols=wanted, chunksize=chunk_size):
+                    lengths.append(len(chunk))
+                    for name in wanted:
+                        converted[name].append(convert_column(chunk[name]))
+
+        cached = []
+        for name in wanted:
+            array = _combine_chunks(converted.pop(name), lengths)
+            if array is None:
+                continue
+            file_name = f'{header.index(name):03d}.npy'
+            np.save(os.path.join(tmp_dir, file_name), array)
+            cached.append({'name': name, 'file': file_name, 'dtype': str(array.dtype)})
+
+        return install_cache(csv_path, tmp_dir, header, wanted, cached, sum(lengths), stat)
+
+
+def install_cache(csv_path: str, tmp_dir: str, header: List[str], parsed: List[str], cached: List[Dict],
+                  rows: int, stat: Optional[os.stat_result] = None, sha256: Optional[str] = None) -> Dict:
+    """
+    Describe the column files written to tmp_dir and move them into place as the cache of a CSV file.
+
+    Writers that produce a CSV and its columns together (instead of parsing
+    the CSV afterwards) use this to publish the columns the same way as
+    build_cache. The swap happens under directory_lock, so concurrent
+    builders of one cache wait for each other instead of failing with
+    ENOTEMPTY, and readers only find a missing cache for an instant.
+
+    Args:
+        csv_path: Source CSV file
+        tmp_dir: Directory holding the .npy column files
+        header: Every column of the CSV, in order
+        parsed: Columns that were considered for caching
+        cached: {'name', 'file', 'dtype'} of every column file
+        rows: Number of data rows
+        stat: os.stat of the CSV the columns describe (default: stat it now)
+        sha256: Content hash of the CSV, when already known
+
+    Returns:
+        The cache metadata (that of the other writer's cache if one was published meanwhile)
+    """
+    stat = stat or os.stat(csv_path)
+    meta = {
+        'version': CACHE_VERSION,
+        'source_size': stat.st_size,
+        'source_mtime_ns': stat.st_mtime_ns,
+        'source_sha256': sha256 or file_digest(csv_path),
+        'rows': rows,
+        'header': header,
+        'parsed': parsed,
+        'columns': cached,
+    }
+    _write_meta(tmp_dir, meta)
+
+    cache_dir = cache_dir_for(csv_path)
+    with directory_lock(cache_dir):
+        if not publish_directory(tmp_dir, cache_dir):
+            return _read_meta(cache_dir) or meta
+    return meta
+
+
+def _columns_to_build(csv_path: str, meta: Optional[Dict], columns: Optional[List[str]],
+                      verify_hash: bool) -> Tuple[bool, Optional[List[str]]]:
+    """Whether the cache must be (re)built for a request, and the columns to parse if so."""
+    if not is_fresh(csv_path, meta, verify_hash):
+        return True, columns
+    if columns is None and meta['parsed'] != meta['header']:
+        return True, None
+    if columns is not None and not set(columns) & set(meta['header']) <= set(meta['parsed']):
+        return True, list(set(meta['parsed']) | set(columns))
+    return False, None
+
+
+def load_columns(csv_path: str, columns: Optional[List[str]] = None,
+                 verify_hash: bool = False) -> Dict[str, np.ndarray]:
+    """
+    Load the columns of a CSV file through its columnar cache.
+
+    The first call parses the CSV and writes the cache; later calls
+    memory-map the cached arrays (read-only, zero-copy) until the CSV changes.
+    When specific columns are requested only those are parsed; asking for
+    other columns later extends the cache.
+
+    Args:
+        csv_path: Source CSV file
+        columns: Names of the columns to load (default: every cached column)
+        verify_hash: Check the content hash even when size and mtime match
+
+    Returns:
+        Dictionary mapping column names to arrays, in CSV column order
+    """
+    cache_dir = cache_dir_for(csv_path)
+    meta = _read_meta(cache_dir)
+    for attempt in range(2):
+        if attempt or _columns_to_build(csv_path, meta, columns, verify_hash)[0]:
+            # Decide again under the lock: another process may have built it meanwhile
+            with directory_lock(cache_dir):
+                meta = _read_meta(cache_dir)
+                build, wanted = _columns_to_build(csv_path, meta, columns, verify_hash)
+                if build:
+                    meta = build_cache(csv_path, wanted)
+        try:
+            return {column['name']: np.load(os.path.join(cache_dir, column['file']), mmap_mode='r')
+                    for column in meta['columns'] if columns is None or column['name'] in columns}
+        except FileNotFoundError:
+            if attempt:
+                raise
+            # The cache was replaced between reading its metadata and its columns
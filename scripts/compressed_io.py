@@ -0,0 +1,243 @@
+import bz2
+import gzip
+import io
+import lzma
+import os
+import queue
+import threading
+import time
+import zipfile
+from typing import BinaryIO, List, Optional, Sequence, Tuple
+
+# Compressed containers recognised by their file extension
+COMPRESSED_SUFFIXES = ('.gz', '.xz', '.bz2', '.zip')
+BLOCK_SIZE = 1 << 22
+PREFETCH_BLOCKS = 4
+# Separates a zip archive from one of its members: 'packet-captures.zip::24h/ip.pcap'
+ZIP_MEMBER_SEPARATOR = '::'
+
+
+def split_zip_member(path: str) -> Tuple[str, Optional[str]]:
+    """Split 'archive.zip::member' into (archive, member); other paths give (path, None)."""
+    archive, separator, member = path.partition(ZIP_MEMBER_SEPARATOR)
+    if separator and archive.lower().endswith('.zip'):
+        return archive, member
+    return path, None
+
+
+def is_compressed(path: str) -> bool:
+    return split_zip_member(path)[1] is not None or path.lower().endswith(COMPRESSED_SUFFIXES)
+
+
+def find_input(path: str) -> str:
+    """
+    Return path, or its compressed variant (path.gz, .xz, .bz2, .zip) when only that exists.
+
+    A path found in neither form is returned unchanged, so callers report it as missing.
+    """
+    if os.path.exists(path):
+        return path
+    for suffix in COMPRESSED_SUFFIXES:
+        if os.path.exists(path + suffix):
+            return path + suffix
+    return path
+
+
+def zip_members(path: str) -> List[str]:
+    """Names of the file members of a zip archive, sorted."""
+    with zipfile.ZipFile(path) as archive:
+        return sorted(info.filename for info in archive.infolist() if not info.is_dir())
+
+
+def expand_zip(path: str, extensions: Optional[Sequence[str]] = None) -> List[str]:
+    """
+    Expand a zip archive holding several files into one input per member.
+
+    Members are named 'archive.zip::member' (see open_input); an archive
+    with a single file, and any other path, is returned as it is.
+
+    Args:
+        path: Input file
+        extensions: Only keep members whose name ends with one of these (case-insensitive)
+
+    Returns:
+        List of inputs
+    """
+    if not path.lower().endswith('.zip') or split_zip_member(path)[1] is not None:
+        return [path]
+    members = zip_members(path)
+    if len(members) == 1:
+        return [path]
+    if extensions is not None:
+        members = [name for name in members if name.lower().endswith(tuple(extensions))]
+    return [f'{path}{ZIP_MEMBER_SEPARATOR}{name}' for name in members]
+
+
+def input_stat(path: str) -> os.stat_result:
+    """os.stat of an input (of its archive for a zip member)."""
+    return os.stat(split_zip_member(path)[0])
+
+
+def input_mtime(path: str) -> float:
+    """Modification time of an input (the one recorded in the archive for a zip member)."""
+    archive, member = split_zip_member(path)
+    if member is None:
+        return os.path.getmtime(path)
+    with zipfile.ZipFile(archive) as zf:
+        return time.mktime(zf.getinfo(member).date_time + (0, 0, -1))
+
+
+def strip_compression_suffix(name: str) -> str:
+    """Return a file name without its compression extension ('x.csv.gz' -> 'x.csv')."""
+    for suffix in COMPRESSED_SUFFIXES:
+        if name.lower().endswith(suffix):
+            return name[:-len(suffix)]
+    return name
+
+
+def _zip_member(archive: zipfile.ZipFile, path: str, name: Optional[str] = None) -> zipfile.ZipInfo:
+    """The file of a zip archive that is read: the named member, or the archive's only file."""
+    if name is not None:
+        try:
+            return archive.getinfo(name)
+        except KeyError:
+            raise ValueError(f"{path} has no member '{name}'") from None
+    members = sorted((info for info in archive.infolist() if not info.is_dir()), key=lambda info: info.filename)
+    if not members:
+        raise ValueError(f"{path} contains no file")
+    if len(members) > 1:
+        raise ValueError(f"{path} holds {len(members)} files ({', '.join(info.filename for info in members[:3])}"
+                         f"{', ...' if len(members) > 3 else ''}); read one as "
+                         f"{path}{ZIP_MEMBER_SEPARATOR}MEMBER")
+    return members[0]
+
+
+def _open_decompressor(path: str) -> BinaryIO:
+    archive_path, name = split_zip_member(path)
+    lower = archive_path.lower()
+    if lower.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    if lower.endswith('.xz'):
+        return lzma.open(path, 'rb')
+    if lower.endswith('.bz2'):
+        return bz2.open(path, 'rb')
+    if lower.endswith('.zip'):
+        archive = zipfile.ZipFile(archive_path)
+        try:
+            member = archive.open(_zip_member(archive, archive_path, name))
+        except ValueError:
+            archive.close()
+            raise
+        member._archive = archive  # keep the archive open as long as the member
+        return member
+    raise ValueError(f"Not a compressed file: {path}")
+
+
+class PrefetchReader(io.RawIOBase):
+    """
+    Read a decompressing stream ahead of its consumer in a background thread.
+
+    The thread fills a bounded queue with large decompressed blocks while the
+    consumer parses the previous ones; zlib, lzma and bz2 release the GIL, so
+    decompression and parsing run at the same time instead of back to back.
+    Memory is bounded by prefetch blocks of block_size bytes.
+    """
+
+    def __init__(self, source: BinaryIO, block_size: int = BLOCK_SIZE, prefetch: int = PREFETCH_BLOCKS):
+        super().__init__()
+        self.source = source
+        self.block_size = block_size
+        self.blocks: queue.Queue = queue.Queue(maxsize=max(1, prefetch))
+        self.current = memoryview(b'')
+        self.finished = False
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self._fill, name='prefetch', daemon=True)
+        self.thread.start()
+
+    def _fill(self) -> None:
+        try:
+            while not self.stop.is_set():
+                block = self.source.read(self.block_size)
+                self._put(block)
+                if not block:
+                    return
+        except BaseException as e:  # handed to the consumer
+            self._put(e)
+
+    def _put(self, item) -> None:
+        while not self.stop.is_set():
+            try:
+                self.blocks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not len(self.current):
+            if self.finished:
+                return 0
+            block = self.blocks.get()
+            if isinstance(block, BaseException):
+                self.finished = True
+                raise block
+            if not block:
+                self.finished = True
+                return 0
+            self.current = memoryview(block)
+        size = min(len(buffer), len(self.current))
+        buffer[:size] = self.current[:size]
+        self.current = self.current[size:]
+        return size
+
+    def close(self) -> None:
+        if not self.closed:
+            self.stop.set()
+            self.thread.join()
+            self.source.close()
+            archive = getattr(self.source, '_archive', None)
+            if archive is not None:
+                archive.close()
+        super().close()
+
+
+def open_input(path: str, block_size: int = BLOCK_SIZE, prefetch: int = PREFETCH_BLOCKS) -> BinaryIO:
+    """
+    Open a data file for binary reading, decompressing it on the fly.
+
+    Plain files are opened as they are. .gz, .xz, .bz2 files and zip
+    archives are decompressed in a background thread that keeps up to
+    prefetch blocks ahead of the reader. A zip archive must hold a single
+    file, or the member is named as 'archive.zip::member' (see expand_zip).
+
+    Args:
+        path: File to read
+        block_size: Bytes decompressed at a time
+        prefetch: Decompressed blocks buffered ahead of the reader
+
+    Returns:
+        Buffered binary file object
+    """
+    if not is_compressed(path):
+        return open(path, 'rb', buffering=block_size)
+    return io.BufferedReader(PrefetchReader(_open_decompressor(path), block_size, prefetch), buffer_size=block_size)
+
+
+def copy_decompressed(path: str, target: BinaryIO, block_size: int = BLOCK_SIZE) -> int:
+    """
+    Write the decompressed content of a file to an open binary file.
+
+    Returns:
+        Number of bytes written
+    """
+    written = 0
+    with open_input(path, block_size) as source:
+        while True:
+            block = source.read(block_size)
+            if not block:
+                return written
+            target.write(block)
+            written += len(block)
+
@@ -0,0 +1,432 @@
+import argparse
+import io
+import json
+import os
+import re
+import sys
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from columnar_cache import CACHE_DIR_NAME, convert_column, file_digest, load_columns
+from compressed_io import is_compressed, open_input
+from tshark_time import NAT, NS_PER_SECOND
+
+INDEX_VERSION = 1
+DEFAULT_BLOCK_ROWS = 4096
+SCAN_BLOCK = 1 << 22
+NS_PER_DAY = 86400 * NS_PER_SECOND
+UNIT_NS = {'s': NS_PER_SECOND, 'm': 60 * NS_PER_SECOND, 'h': 3600 * NS_PER_SECOND, 'd': NS_PER_DAY}
+
+Bound = Union[str, float, int, None]
+
+
+def index_path_for(csv_path: str) -> str:
+    """Return the sidecar block index of a CSV file (next to its columnar cache)."""
+    directory, name = os.path.split(os.path.abspath(csv_path))
+    return os.path.join(directory, CACHE_DIR_NAME, f'{name}.index.npz')
+
+
+def row_offsets(csv_path: str, block_rows: int = DEFAULT_BLOCK_ROWS) -> Tuple[bytes, np.ndarray, int]:
+    """
+    Byte offset of every block_rows-th data row of a CSV file.
+
+    Lines are found with a vectorized newline search over large blocks, so
+    quoted fields must not contain line breaks (true of every CSV written
+    by these scripts, k6 and tshark).
+
+    Returns:
+        Tuple of (header line, offsets of rows 0, block_rows, 2 * block_rows...
+        followed by the end of the data, number of data rows)
+    """
+    size = os.path.getsize(csv_path)
+    with open(csv_path, 'rb') as f:
+        header = f.readline()
+        position = len(header)
+        picked = [np.array([position], dtype=np.int64)] if position < size else []
+        newlines = 0
+        last = b'\n'
+        while True:
+            block = f.read(SCAN_BLOCK)
+            if not block:
+                break
+            # Row r + 1 starts after the r-th newline of the data
+            starts = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == 10) + (position + 1)
+            numbers = np.arange(newlines + 1, newlines + 1 + len(starts))
+            picked.append(starts[(numbers % block_rows == 0) & (starts < size)])
+            newlines += len(starts)
+            position += len(block)
+            last = block[-1:]
+    rows = newlines + (last != b'\n')
+    return header, np.concatenate(picked + [np.array([size], dtype=np.int64)]), rows
+
+
+def _sample_kinds(csv_path: str, sample_rows: int = 1000) -> Dict[str, Optional[str]]:
+    """Kind ('time', 'int', 'float' or None) of every column, judged on the first rows."""
+    import pandas as pd
+
+    with open_input(csv_path, block_size=1 << 16, prefetch=1) as f:
+        sample = pd.read_csv(f, nrows=sample_rows)
+    return {name: convert_column(sample[name])[0] for name in sample.columns}
+
+
+def _block_extremes(values: np.ndarray, kind: str, block_rows: int,
+                    chunk_blocks: int = 256) -> Tuple[np.ndarray, np.ndarray]:
+    """Smallest and largest value of every block of rows, missing values left out."""
+    minima, maxima = [], []
+    step = block_rows * chunk_blocks
+    for start in range(0, len(values), step):
+        chunk = np.asarray(values[start:start + step])
+        starts = np.arange(0, len(chunk), block_rows)
+        if kind == 'float':
+            minima.append(np.fmin.reduceat(chunk, starts))
+            maxima.append(np.fmax.reduceat(chunk, starts))
+        else:
+            # NAT is the smallest int64: it never wins a maximum, and is
+            # replaced by the largest one for the minimum
+            minima.append(np.minimum.reduceat(np.where(chunk == NAT, np.iinfo(np.int64).max, chunk), starts))
+            maxima.append(np.maximum.reduceat(chunk, starts))
+    dtype = np.float64 if kind == 'float' else np.int64
+    if not minima:
+        return np.empty(0, dtype=dtype), np.empty(0, dtype=dtype)
+    return np.concatenate(minima).astype(dtype), np.concatenate(maxima).astype(dtype)
+
+
+def _save_index(path: str, index: Dict) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    arrays = {'offsets': index['offsets'], 'header': np.frombuffer(index['header'], dtype=np.uint8)}
+    for i, name in enumerate(index['meta']['indexed']):
+        arrays[f'min_{i}'] = index['minima'][name]
+        arrays[f'max_{i}'] = index['maxima'][name]
+    tmp_path = f'{path}.tmp-{os.getpid()}.npz'
+    np.savez(tmp_path, meta=np.array(json.dumps(index['meta'])), **arrays)
+    os.replace(tmp_path, path)
+
+
+def build_index(csv_path: str, columns: List[str], block_rows: int = DEFAULT_BLOCK_ROWS) -> Dict:
+    """
+    Write the block index of a CSV file.
+
+    The index holds the byte offset of every block_rows-th row and, for
+    every indexed column, the smallest and largest value of each block. It
+    does not assume the column is sorted: a range query reads every block
+    whose [min, max] overlaps the range, which for sorted timestamps or
+    request numbers is one contiguous run. The column values come from the
+    columnar cache, which is built on the way if needed.
+
+    Args:
+        csv_path: Plain (uncompressed, seekable) CSV file
+        columns: Columns to index, e.g. ['UTC Arrival Time'] or ['time']
+        block_rows: Rows per block; smaller blocks mean less over-read per query
+
+    Returns:
+        The index dictionary (see load_index)
+    """
+    if is_compressed(csv_path):
+        raise ValueError(f"{csv_path}: compressed files cannot be read by byte offset, decompress it to index it")
+    stat = os.stat(csv_path)
+    header, offsets, rows = row_offsets(csv_path, block_rows)
+    kinds = _sample_kinds(csv_path)
+    arrays = load_columns(csv_path, columns)
+    minima, maxima = {}, {}
+    indexed = []
+    for name in columns:
+        if name not in arrays or kinds.get(name) is None:
+            raise ValueError(f"{csv_path}: column '{name}' has no numeric or timestamp values to index")
+        if len(arrays[name]) != rows:
+            raise ValueError(f"{csv_path}: {len(arrays[name]):,} parsed rows but {rows:,} lines "
+                             "(quoted line breaks are not supported)")
+        minima[name], maxima[name] = _block_extremes(arrays[name], kinds[name], block_rows)
+        indexed.append(name)
+
+    index = {
+        'meta': {
+            'version': INDEX_VERSION,
+            'source_size': stat.st_size,
+            'source_mtime_ns': stat.st_mtime_ns,
+            'source_sha256': file_digest(csv_path),
+            'rows': rows,
+            'block_rows': block_rows,
+            'kinds': kinds,
+            'indexed': indexed,
+        },
+        'header': header,
+        'offsets': offsets,
+        'minima': minima,
+        'maxima': maxima,
+    }
+    _save_index(index_path_for(csv_path), index)
+    return index
+
+
+def _read_index(path: str) -> Optional[Dict]:
+    try:
+        with np.load(path) as stored:
+            meta = json.loads(str(stored['meta']))
+            if meta.get('version') != INDEX_VERSION:
+                return None
+            return {
+                'meta': meta,
+                'header': stored['header'].tobytes(),
+                'offsets': stored['offsets'],
+                'minima': {name: stored[f'min_{i}'] for i, name in enumerate(meta['indexed'])},
+                'maxima': {name: stored[f'max_{i}'] for i, name in enumerate(meta['indexed'])},
+            }
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def load_index(csv_path: str, columns: List[str], block_rows: int = DEFAULT_BLOCK_ROWS) -> Dict:
+    """
+    Load the block index of a CSV file, building or extending it when needed.
+
+    Like the columnar cache, the index is trusted while the size and
+    modification time of the CSV match; when only the modification time
+    differs the content hash decides.
+
+    Returns:
+        Dictionary with 'meta' (rows, block_rows, column kinds...), the raw
+        'header' line, block 'offsets' (one more than the blocks: the last
+        is the end of the file) and per-column block 'minima' and 'maxima'
+    """
+    path = index_path_for(csv_path)
+    index = _read_index(path)
+    if index is not None:
+        meta = index['meta']
+        stat = os.stat(csv_path)
+        if meta['source_size'] != stat.st_size or meta['block_rows'] != block_rows:
+            index = None
+        elif meta['source_mtime_ns'] != stat.st_mtime_ns:
+            if file_digest(csv_path) != meta['source_sha256']:
+                index = None
+            else:
+                meta['source_mtime_ns'] = stat.st_mtime_ns
+                _save_index(path, index)
+    if index is None:
+        return build_index(csv_path, list(columns), block_rows)
+    missing = [name for name in columns if name not in index['meta']['indexed']]
+    if missing:
+        return build_index(csv_path, index['meta']['indexed'] + missing, block_rows)
+    return index
+
+
+def parse_bound(text: Bound, kind: str, origin: Optional[int] = None) -> Union[int, float, None]:
+    """
+    Turn a --from/--to value into a value of the column.
+
+    Numeric columns take numbers. Timestamp columns take an ISO date and
+    time in UTC ('2025-06-11T18:00', '2025-06-11 18:00:30.5'), a time of day
+    ('18:00', '18:00:30') meaning its first occurrence from origin on, or an
+    offset from origin ('+90s', '+10m', '+2.5h', '+1d').
+
+    Args:
+        text: Bound given by the user (numbers are used as they are)
+        kind: Kind of the column: 'time', 'int' or 'float'
+        origin: First timestamp of the data (epoch ns), for times of day and offsets
+    """
+    if text is None or not isinstance(text, str):
+        return text
+    text = text.strip()
+    if kind != 'time':
+        return float(text)
+    offset = re.fullmatch(r'\+(\d+(?:\.\d*)?)([smhd])', text)
+    if offset and origin is not None:
+        return origin + int(round(float(offset.group(1)) * UNIT_NS[offset.group(2)]))
+    time_of_day = re.fullmatch(r'(\d{1,2}):(\d{2})(?::(\d{2}(?:\.\d+)?))?', text)
+    if time_of_day and origin is not None:
+        hours, minutes, seconds = time_of_day.groups()
+        since_midnight = (int(hours) * 3600 + int(minutes) * 60) * NS_PER_SECOND
+        since_midnight += int(round(float(seconds or 0) * NS_PER_SECOND))
+        value = origin - origin % NS_PER_DAY + since_midnight
+        return value if value >= origin else value + NS_PER_DAY
+    try:
+        return int(np.datetime64(text.replace(' ', 'T'), 'ns').astype(np.int64))
+    except ValueError:
+        raise ValueError(f"Invalid time bound '{text}': use 2025-06-11T18:00, 18:00[:SS] or +10m") from None
+
+
+def column_origin(index: Dict, column: str) -> Optional[int]:
+    """First (smallest) value of an indexed timestamp column, None when it has none."""
+    minima = index['minima'][column]
+    minima = minima[minima != np.iinfo(np.int64).max]
+    return int(minima.min()) if len(minima) else None
+
+
+def resolve_range(kind: str, origin: Optional[int], start: Bound = None, end: Bound = None) -> Tuple:
+    """
+    Parse the bounds of a range query (see parse_bound).
+
+    An end time of day earlier than the start is taken on the next day, so
+    '23:50' to '00:10' spans midnight.
+
+    Returns:
+        Tuple of (low, high), None for an open end
+    """
+    low, high = parse_bound(start, kind, origin), parse_bound(end, kind, origin)
+    if (kind == 'time' and low is not None and high is not None and high < low
+            and re.fullmatch(r'[\d:.]+', str(end).strip())):
+        high += NS_PER_DAY
+    return low, high
+
+
+def select_blocks(index: Dict, column: str, low=None, high=None) -> np.ndarray:
+    """Numbers of the blocks that may hold rows with low <= column <= high."""
+    keep = np.ones(len(index['minima'][column]), dtype=bool)
+    if low is not None:
+        keep &= index['maxima'][column] >= low
+    if high is not None:
+        keep &= index['minima'][column] <= high
+    return np.flatnonzero(keep)
+
+
+def read_blocks(csv_path: str, index: Dict, blocks: np.ndarray) -> bytes:
+    """Raw text of the given blocks (runs of neighbouring blocks are read with one seek each)."""
+    if len(blocks) == 0:
+        return b''
+    offsets = index['offsets']
+    breaks = np.flatnonzero(np.diff(blocks) != 1) + 1
+    parts = []
+    with open(csv_path, 'rb') as f:
+        for run in np.split(blocks, breaks):
+            f.seek(int(offsets[run[0]]))
+            parts.append(f.read(int(offsets[run[-1] + 1] - offsets[run[0]])))
+    if parts[-1] and not parts[-1].endswith(b'\n'):
+        parts[-1] += b'\n'
+    return b''.join(parts)
+
+
+def _typed_empty(kind: Optional[str], length: int) -> np.ndarray:
+    if kind in ('time', 'int'):
+        return np.full(length, NAT if kind == 'time' else 0, dtype=np.int64)
+    return np.full(length, np.nan)
+
+
+def _parse_blocks(index: Dict, data: bytes, wanted: List[str]) -> Dict[str, np.ndarray]:
+    """Convert the rows of raw blocks like the columnar cache does, typed as in the whole file."""
+    import pandas as pd
+
+    frame = pd.read_csv(io.BytesIO(index['header'] + data), usecols=wanted)
+    kinds = index['meta']['kinds']
+    arrays = {}
+    for name in wanted:
+        kind, array = convert_column(frame[name])
+        if kind is None or (kinds[name] == 'time') != (kind == 'time'):
+            array = _typed_empty(kinds[name], len(frame))
+        elif kinds[name] == 'float':
+            array = array.astype(np.float64)
+        arrays[name] = array
+    return arrays
+
+
+def read_range(csv_path: str, column: str, start: Bound = None, end: Bound = None,
+               columns: Optional[List[str]] = None, block_rows: int = DEFAULT_BLOCK_ROWS) -> Dict[str, np.ndarray]:
+    """
+    Load the rows of a CSV file with start <= column <= end, parsing only those.
+
+    The block index tells which byte ranges can hold matching rows; only
+    they are read and parsed, and rows outside the range are then dropped.
+    Compressed files cannot be read by offset: they are loaded through the
+    columnar cache and filtered instead.
+
+    Args:
+        csv_path: Source CSV file
+        column: Indexed column, e.g. 'UTC Arrival Time', 'Request Number' or 'time'
+        start: Lowest value kept, None for no lower bound (see parse_bound for time formats)
+        end: Highest value kept, None for no upper bound
+        columns: Columns to return (default: every column of the file); the
+            range column is always returned
+        block_rows: Rows per index block
+
+    Returns:
+        Dictionary mapping column names to arrays, in CSV column order,
+        converted like load_columns (tshark timestamps to epoch ns)
+    """
+    if is_compressed(csv_path):
+        kinds = _sample_kinds(csv_path)
+        wanted = [name for name in kinds if columns is None or name in columns or name == column]
+        arrays = load_columns(csv_path, wanted)
+        values = arrays[column]
+        origin = None
+        if kinds[column] == 'time' and np.any(values != NAT):
+            origin = int(values[values != NAT].min())
+        low, high = resolve_range(kinds[column], origin, start, end)
+        keep = _in_range(values, kinds[column], low, high)
+        return {name: np.asarray(array)[keep] for name, array in arrays.items()}
+
+    index = load_index(csv_path, [column], block_rows)
+    kinds = index['meta']['kinds']
+    wanted = [name for name in kinds if (columns is None or name in columns or name == column)
+              and kinds[name] is not None]
+    low, high = resolve_range(kinds[column], column_origin(index, column), start, end)
+    data = read_blocks(csv_path, index, select_blocks(index, column, low, high))
+    arrays = _parse_blocks(index, data, wanted)
+    keep = _in_range(arrays[column], kinds[column], low, high)
+    return {name: array[keep] for name, array in arrays.items()}
+
+
+def _in_range(values: np.ndarray, kind: str, low, high) -> np.ndarray:
+    """Rows whose value lies in [low, high], missing values excluded."""
+    keep = values != NAT if kind == 'time' else ~np.isnan(values) if kind == 'float' else np.ones(len(values), bool)
+    if low is not None:
+        keep &= values >= low
+    if high is not None:
+        keep &= values <= high
+    return keep
+
+
+def add_arguments(parser, column: str) -> None:
+    """Add --from/--to range options to an argument parser."""
+    parser.add_argument('--from', dest='range_from', metavar='START',
+                        help=f"Only read rows with {column} >= START: a UTC date and time "
+                             "(2025-06-11T18:00), a time of day (18:00) or an offset from the first row (+2h)")
+    parser.add_argument('--to', dest='range_to', metavar='END',
+                        help=f"Only read rows with {column} <= END (same formats as --from)")
+
+
+def main():
+    """Main function with command line argument parsing."""
+    import time
+
+    parser = argparse.ArgumentParser(description='Index CSV files for range queries, or query them')
+    parser.add_argument('files', nargs='+', help='CSV files')
+    parser.add_argument('--column', default='UTC Arrival Time',
+                        help="Column to index and query (default: 'UTC Arrival Time')")
+    parser.add_argument('--block-rows', type=int, default=DEFAULT_BLOCK_ROWS,
+                        help=f'Rows per index block (default: {DEFAULT_BLOCK_ROWS})')
+    parser.add_argument('--output', metavar='FILE',
+                        help="Write the rows in range to FILE as CSV ('-' for standard output)")
+    add_arguments(parser, 'the column')
+    args = parser.parse_args()
+    if args.block_rows <= 0:
+        parser.error('--block-rows must be positive')
+
+    for csv_path in args.files:
+        started = time.perf_counter()
+        index = load_index(csv_path, [args.column], args.block_rows)
+        blocks = len(index['offsets']) - 1
+        if args.range_from is None and args.range_to is None and not args.output:
+            print(f"{csv_path}: {index['meta']['rows']:,} rows in {blocks:,} blocks indexed on "
+                  f"'{args.column}' ({index_path_for(csv_path)})")
+            continue
+        kind = index['meta']['kinds'][args.column]
+        low, high = resolve_range(kind, column_origin(index, args.column), args.range_from, args.range_to)
+        selected = select_blocks(index, args.column, low, high)
+        data = read_blocks(csv_path, index, selected)
+        values = _parse_blocks(index, data, [args.column])[args.column]
+        keep = _in_range(values, kind, low, high)
+        elapsed = time.perf_counter() - started
+        print(f"{csv_path}: {np.count_nonzero(keep):,} rows in range, {len(selected):,}/{blocks:,} blocks "
+              f"({len(data):,} bytes) read in {elapsed * 1000:.1f} ms", file=sys.stderr)
+        if args.output:
+            lines = data.split(b'\n')[:-1]
+            out = sys.stdout.buffer if args.output == '-' else open(args.output, 'wb')
+            try:
+                out.write(index['header'])
+                out.writelines(line + b'\n' for line, kept in zip(lines, keep.tolist()) if kept)
+            finally:
+                if out is not sys.stdout.buffer:
+                    out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+import io
+import os
+import sys
+import time
+from typing import BinaryIO, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+READ_SIZE = 1 << 20
+
+
+def _split_header(line: bytes) -> Tuple[List[str], str]:
+    """Split a header line on tabs (tshark -T fields -E header=y) or commas; return (names, delimiter)."""
+    text = line.decode().rstrip('\r')
+    delimiter = '\t' if '\t' in text else ','
+    return [name.strip().strip('"') for name in text.split(delimiter)], delimiter
+
+
+def parse_rows(data: bytes, header: List[str], column: str,
+               where: Optional[Tuple[str, str]] = None, delimiter: str = ',') -> np.ndarray:
+    """
+    Parse one column of complete CSV lines (without header) in one call.
+
+    Only the needed columns are read by pandas' C parser, so the cost is
+    proportional to the new bytes. Cells that are not numbers become NaN.
+
+    Args:
+        data: Complete lines, each ending with a newline
+        header: Column names of the file
+        column: Column to return
+        where: Optional (column, value) pair; only rows where column == value are kept
+        delimiter: Field separator of the lines
+
+    Returns:
+        float64 array with the values of the rows
+    """
+    import pandas as pd
+
+    usecols = [column] if where is None else sorted({column, where[0]}, key=header.index)
+    frame = pd.read_csv(io.BytesIO(data), sep=delimiter, header=None, names=header, usecols=usecols,
+                        dtype=str, skip_blank_lines=True, on_bad_lines='skip')
+    if where is not None:
+        frame = frame[frame[where[0]].str.strip('"') == where[1]]
+    return pd.to_numeric(frame[column], errors='coerce').to_numpy(dtype=np.float64)
+
+
+def _open(path: str, poll_interval: float) -> BinaryIO:
+    if path == '-':
+        return os.fdopen(os.dup(sys.stdin.fileno()), 'rb')
+    while not os.path.exists(path):
+        time.sleep(poll_interval)
+    return open(path, 'rb')
+
+
+def follow_csv_column(path: str, column: Union[str, Sequence[str]], poll_interval: float = 1.0,
+                      idle_timeout: Optional[float] = None,
+                      where: Optional[Tuple[str, str]] = None) -> Iterator[np.ndarray]:
+    """
+    Yield the values of one column of a CSV file as it grows.
+
+    Rows already in the file are yielded first, then every poll picks up the
+    complete lines appended since the previous one (a partially written last
+    line waits for the next poll). Only the new bytes are parsed, so the cost
+    of a poll does not depend on how long the file already is. A path of '-'
+    reads a pipe on standard input (e.g. tshark or k6 output) until it closes;
+    an unterminated last line is parsed when the input ends. Comma- and
+    tab-separated input (tshark -T fields -E header=y) are both accepted,
+    told apart by the header line. Cells that are not numbers become NaN.
+
+    Args:
+        path: CSV file, possibly still being written, or '-' for standard input
+        column: Name of the column to read, or candidate names (the first one
+            found in the header is read)
+        poll_interval: Seconds between checks for new data
+        idle_timeout: Stop after this many seconds without new data (default: never)
+        where: Optional (column, value) filter, e.g. ('metric_name', 'http_req_duration')
+
+    Returns:
+        Iterator of float64 arrays, one per batch of new rows (empty when a
+        poll found nothing, so callers can act on time while the file is idle)
+    """
+    with _open(path, poll_interval) as f:
+        header = None
+        delimiter = ','
+        pending = b''
+        idle_since = time.monotonic()
+        while True:
+            data = f.read1(READ_SIZE)
+            if not data:
+                finished = path == '-' or (idle_timeout is not None
+                                           and time.monotonic() - idle_since > idle_timeout)
+                if not finished:
+                    time.sleep(poll_interval)
+                    yield np.empty(0)
+                    continue
+                if not pending:
+                    return  # the writer closed the pipe, or went idle
+                data = b'\n'  # complete the last line, which has no newline
+            else:
+                idle_since = time.monotonic()
+            pending += data
+            end = pending.rfind(b'\n') + 1  # the rest is incomplete until its newline arrives
+            if not end:
+                continue
+            lines, pending = pending[:end], pending[end:]
+            if header is None:
+                first = lines.index(b'\n')
+                header, delimiter = _split_header(lines[:first])
+                candidates = [column] if isinstance(column, str) else list(column)
+                found = [name for name in candidates if name in header]
+                if not found:
+                    raise ValueError(f"Column '{'/'.join(candidates)}' not found in {path} (columns: {header})")
+                column = found[0]
+                if where is not None and where[0] not in header:
+                    raise ValueError(f"Column '{where[0]}' not found in {path} (columns: {header})")
+                lines = lines[first + 1:]
+            if lines.strip():
+                yield parse_rows(lines, header, column, where, delimiter)
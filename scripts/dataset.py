@@ -0,0 +1,179 @@
+import json
+import os
+import shutil
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from columnar_cache import directory_lock, load_columns, publish_directory
+from csv_index import read_range
+from tshark_time import NAT
+
+DATASET_VERSION = 1
+TIME_COLUMN = 'UTC Arrival Time'
+VALUE_COLUMN = 'HTTP Request Time'
+
+
+class PathView:
+    """
+    Requests of one path of a Dataset: zero-copy views of its arrays.
+
+    Timestamps are sorted, so time slices are views too.
+    """
+
+    def __init__(self, label: str, timestamps: Optional[np.ndarray], values: np.ndarray):
+        self.label = label
+        self.timestamps = timestamps
+        self.values = values
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def between(self, start_ns: Optional[int] = None, end_ns: Optional[int] = None) -> 'PathView':
+        """Requests with start_ns <= timestamp < end_ns (None for an open end)."""
+        if self.timestamps is None:
+            raise ValueError(f"Path '{self.label}' has no timestamps")
+        first = 0 if start_ns is None else int(np.searchsorted(self.timestamps, start_ns, side='left'))
+        last = len(self) if end_ns is None else int(np.searchsorted(self.timestamps, end_ns, side='left'))
+        return PathView(self.label, self.timestamps[first:last], self.values[first:last])
+
+
+class Dataset:
+    """
+    Requests of several paths held in two contiguous arrays.
+
+    Rows are grouped by path (the categorical path code of a row is implied
+    by its position, see codes) and sorted by arrival time within each path.
+    Timestamps are int64 epoch nanoseconds and values float32, so a request
+    costs 12 bytes; per-path views and time slices share that memory.
+
+    Args:
+        labels: Path labels, in row order
+        counts: Requests of every path
+        timestamps: int64 epoch ns of all rows, or None when the data has no time column
+        values: Values of all rows (float32 unless another dtype was asked for)
+    """
+
+    def __init__(self, labels: List[str], counts: np.ndarray, timestamps: Optional[np.ndarray],
+                 values: np.ndarray):
+        self.labels = list(labels)
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(self.counts)])
+        self.timestamps = timestamps
+        self.values = values
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __iter__(self):
+        return (self.path(label) for label in self.labels)
+
+    @property
+    def codes(self) -> np.ndarray:
+        """Path code (index in labels) of every row, materialized on demand."""
+        dtype = np.uint8 if len(self.labels) <= 256 else np.int32
+        return np.repeat(np.arange(len(self.labels), dtype=dtype), self.counts)
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes + (self.timestamps.nbytes if self.timestamps is not None else 0)
+
+    def path(self, label: str) -> PathView:
+        """Zero-copy view of the requests of one path."""
+        i = self.labels.index(label)
+        rows = slice(self.offsets[i], self.offsets[i + 1])
+        timestamps = self.timestamps[rows] if self.timestamps is not None else None
+        return PathView(label, timestamps, self.values[rows])
+
+    def as_dict(self) -> Dict[str, np.ndarray]:
+        """Mapping of label to value view, the shape the sketch/histogram helpers take."""
+        return {view.label: view.values for view in self}
+
+    @classmethod
+    def from_csv(cls, csv_paths: Dict[str, str], value_column: str = VALUE_COLUMN,
+                 time_column: Optional[str] = TIME_COLUMN, time_range: Optional[Tuple] = None,
+                 scale: float = 1.0, dtype=np.float32) -> 'Dataset':
+        """
+        Build a dataset from CSV files, one path per file.
+
+        Columns come memory-mapped from the columnar cache (or, with a time
+        range, from the rows in range only, see csv_index.read_range). Rows
+        without a value or timestamp are dropped, then every path is copied
+        once into the shared arrays, sorted by time.
+
+        Args:
+            csv_paths: Mapping of path label to CSV file
+            value_column: Column holding the values
+            time_column: Column holding the tshark timestamps, None to keep values only
+            time_range: (start, end) bounds on time_column (see csv_index.parse_bound)
+            scale: Factor applied to the values (1000 turns seconds into ms)
+            dtype: Storage type of the values
+
+        Returns:
+            The dataset
+        """
+        wanted = [value_column] + ([time_column] if time_column else [])
+        loaded = []
+        for label, csv_path in csv_paths.items():
+            if time_range is not None:
+                columns = read_range(csv_path, time_column, *time_range, columns=wanted)
+            else:
+                columns = load_columns(csv_path, wanted)
+            values = columns.get(value_column, np.empty(0))
+            valid = ~np.isnan(values)
+            timestamps = None
+            if time_column:
+                timestamps = columns.get(time_column, np.full(len(values), NAT, dtype=np.int64))
+                valid &= timestamps != NAT
+            skipped = len(valid) - np.count_nonzero(valid)
+            if skipped:
+                print(f"Warning: skipped {skipped:,} rows without a valid timestamp or value in {csv_path}")
+            loaded.append((label, timestamps, values, valid))
+
+        counts = np.array([np.count_nonzero(valid) for _, _, _, valid in loaded], dtype=np.int64)
+        total = int(counts.sum())
+        all_values = np.empty(total, dtype=dtype)
+        all_timestamps = np.empty(total, dtype=np.int64) if time_column else None
+        start = 0
+        for (label, timestamps, values, valid), count in zip(loaded, counts):
+            rows = slice(start, start + count)
+            if time_column:
+                kept = timestamps[valid]
+                order = np.argsort(kept, kind='stable')
+                all_timestamps[rows] = kept[order]
+                all_values[rows] = values[valid][order] * scale
+            else:
+                all_values[rows] = values[valid] * scale
+            start += count
+        return cls(list(csv_paths), counts, all_timestamps, all_values)
+
+    def save(self, directory: str) -> None:
+        """
+        Write the dataset as .npy arrays plus a JSON description (replaced atomically).
+
+        Concurrent writers of one directory are serialized by its lock file;
+        if another writer's copy got published anyway, it is kept.
+        """
+        with directory_lock(directory):
+            tmp_dir = f'{directory.rstrip(os.sep)}.tmp-{os.getpid()}'
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            os.makedirs(tmp_dir)
+            np.save(os.path.join(tmp_dir, 'values.npy'), self.values)
+            if self.timestamps is not None:
+                np.save(os.path.join(tmp_dir, 'timestamps.npy'), self.timestamps)
+            with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+                json.dump({'version': DATASET_VERSION, 'labels': self.labels, 'counts': self.counts.tolist(),
+                           'timestamps': self.timestamps is not None}, f, indent=1)
+            publish_directory(tmp_dir, directory)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> 'Dataset':
+        """Read a saved dataset, memory-mapped (read-only, zero-copy) by default."""
+        with open(os.path.join(directory, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        if meta.get('version') != DATASET_VERSION:
+            raise ValueError(f"{directory}: unsupported dataset version {meta.get('version')}")
+        mode = 'r' if mmap else None
+        values = np.load(os.path.join(directory, 'values.npy'), mmap_mode=mode)
+        timestamps = np.load(os.path.join(directory, 'timestamps.npy'), mmap_mode=mode) if meta['timestamps'] else None
+        return cls(meta['labels'], np.array(meta['counts']), timestamps, values)
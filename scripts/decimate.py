@@ -0,0 +1,142 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+# Points kept per pixel column by the envelope: first, min, max and last
+POINTS_PER_PIXEL = 4
+
+
+def axes_pixel_width(ax, dpi: float) -> int:
+    """Return the width of an axes in pixels once the figure is saved at dpi."""
+    return max(1, int(np.ceil(ax.figure.get_figwidth() * dpi * ax.get_position().width)))
+
+
+def minmax_envelope(x: np.ndarray, y: np.ndarray, n_bins: int,
+                    x_range: Optional[Tuple[float, float]] = None) -> np.ndarray:
+    """
+    Select the points that draw the same line as the full series.
+
+    The x range is split into one bin per pixel column and the first, last,
+    minimum and maximum point of every bin are kept (the M4 aggregation), so
+    every spike and the connection between neighbouring columns survive.
+
+    Args:
+        x: Sorted x values
+        y: y values (no NaNs)
+        n_bins: Number of pixel columns
+        x_range: Visible x range (default: the range of x)
+
+    Returns:
+        Sorted indices of the points to keep
+    """
+    n = len(x)
+    if n <= POINTS_PER_PIXEL * n_bins:
+        return np.arange(n)
+    low, high = x_range if x_range is not None else (x[0], x[-1])
+    span = (high - low) or 1
+    bins = np.clip(((x - low) / span * n_bins).astype(np.int64), 0, n_bins - 1)
+
+    # x is sorted, so every bin is a contiguous run of rows
+    starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+    ends = np.r_[starts[1:], n] - 1
+    run = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, n]))
+    row = np.arange(n)
+
+    # The lowest index per run reaching the run's min (max) is picked by a
+    # reduceat over a sentinel-masked index array
+    run_min = np.minimum.reduceat(y, starts)
+    run_max = np.maximum.reduceat(y, starts)
+    first_min = np.minimum.reduceat(np.where(y == run_min[run], row, n), starts)
+    first_max = np.minimum.reduceat(np.where(y == run_max[run], row, n), starts)
+    return np.unique(np.concatenate([starts, ends, first_min, first_max]))
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    The first and last points are kept; from each of the n_out - 2 buckets in
+    between, the point forming the largest triangle with the previously
+    selected point and the average of the next bucket is kept. This keeps
+    the visual shape of the series with a fixed number of points.
+
+    Args:
+        x: Sorted x values
+        y: y values (no NaNs)
+        n_out: Number of points to keep
+
+    Returns:
+        Sorted indices of the points to keep
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = 1 + ((n - 2) * np.arange(n_out - 1) // (n_out - 2))
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 2 < n_out - 1:
+            next_x = x[end:edges[i + 2]].mean()
+            next_y = y[end:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        area = np.abs((x[previous] - next_x) * (y[start:end] - y[previous])
+                      - (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(area))
+        selected[i + 1] = previous
+    return selected
+
+
+def decimate(x: np.ndarray, y: np.ndarray, n_pixels: int, method: str = 'minmax',
+             x_range: Optional[Tuple[float, float]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Reduce a line series to what can be seen at a given width.
+
+    Args:
+        x: Sorted x values
+        y: y values (no NaNs)
+        n_pixels: Width of the plotting area in pixels
+        method: 'minmax' keeps the per-pixel envelope (exact spikes),
+            'lttb' keeps POINTS_PER_PIXEL points per pixel with LTTB
+        x_range: Visible x range for the envelope bins (default: the range of x)
+
+    Returns:
+        Tuple of (x, y) with the kept points
+    """
+    if method == 'minmax':
+        keep = minmax_envelope(x, y, n_pixels, x_range)
+    elif method == 'lttb':
+        keep = lttb(x, y, POINTS_PER_PIXEL * n_pixels)
+    else:
+        raise ValueError(f"Unknown decimation method: {method}")
+    return x[keep], y[keep]
+
+
+def decimate_figure(fig, dpi: float, method: str = 'minmax') -> None:
+    """
+    Decimate every line of a figure for its final layout.
+
+    Call this right before saving, after tight_layout(): each line is cut
+    down to the pixel columns of its axes at the saved dpi and within the
+    current x limits, so the bins match what ends up on screen. Lines whose
+    x values are not sorted are left untouched.
+
+    Args:
+        fig: Figure about to be saved
+        dpi: Resolution the figure is saved at
+        method: 'minmax' or 'lttb' (see decimate)
+    """
+    for ax in fig.axes:
+        n_pixels = axes_pixel_width(ax, dpi)
+        for line in ax.get_lines():
+            x = np.asarray(line.get_xdata())
+            y = np.asarray(line.get_ydata())
+            if len(x) <= POINTS_PER_PIXEL * n_pixels or np.any(np.diff(x) < 0):
+                continue
+            line.set_data(*decimate(x, y, n_pixels, method, ax.get_xlim()))
@@ -2,6 +2,20 @@ import subprocess
 import csv
 import os
 import glob
+import json
+import argparse
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Dict
+
+import capture_shards
+import latency_split
+import pcap_reader
+import profiling
+from compressed_io import (COMPRESSED_SUFFIXES, expand_zip, input_mtime, input_stat, is_compressed, open_input,
+                           split_zip_member, strip_compression_suffix)
+from tshark_time import format_frame_times
 
 
 script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -12,49 +26,419 @@ search_dirs = [
     os.path.join(script_dir, '..', '..', 'packet-captures'),
 ]
 
-found_files = []
-for d in search_dirs:
-    if os.path.isdir(d):
-        for pattern in ('*.pcap', '*.pcapng', '*.cap', '*.pcap.gz'):
-            found_files.extend(glob.glob(os.path.join(d, pattern)))
-
-# If none found in the common locations, search recursively from script_dir
-if not found_files:
-    for pattern in ('*.pcap', '*.pcapng', '*.cap', '*.pcap.gz'):
-        found_files.extend(glob.glob(os.path.join(script_dir, '**', pattern), recursive=True))
-
-if not found_files:
-    raise SystemExit("No packet capture file found in any 'packet-captures' directory under the script path.")
-
-# pick the most recently modified capture file
-capture_file = max(found_files, key=os.path.getmtime)
-print(f"Using capture file: {capture_file}")
-
-tshark_cmd = [
-    "tshark",
-    "-r", capture_file,
-    "-Y", "http.time",
-    "-T", "fields",
-    "-e", "frame.time_utc",
-    "-e", "http.time"
-]
+CAPTURE_EXTENSIONS = ('.pcap', '.pcapng', '.cap')
+CAPTURE_PATTERNS = tuple(f'*{extension}{suffix}' for extension in CAPTURE_EXTENSIONS
+                         for suffix in ('',) + COMPRESSED_SUFFIXES)
+# Compressed captures tshark reads by itself; others are piped to it
+TSHARK_NATIVE_SUFFIXES = ('.gz',)
+DEFAULT_OUTPUT = 'data/24h/24h-bh-rj.csv'
+CSV_HEADER = ['Request Number', 'UTC Arrival Time', 'HTTP Request Time']
+# Extra columns written with --decompose (durations in seconds, empty when unknown)
+DECOMPOSE_HEADER = ['TCP Stream', 'Handshake RTT', 'ACK RTT', 'Network RTT', 'Server Time']
+
+
+def find_capture_files() -> List[str]:
+    """
+    Look for packet captures in the usual 'packet-captures' directories.
+
+    A 'packet-captures.zip' archive next to those directories counts as one
+    too; zip archives holding several captures are expanded into one input
+    per capture ('archive.zip::member').
+
+    Returns:
+        List of capture file paths (may be empty)
+    """
+    found_files = []
+    for d in search_dirs:
+        if os.path.isdir(d):
+            for pattern in CAPTURE_PATTERNS:
+                found_files.extend(glob.glob(os.path.join(d, pattern)))
+        if os.path.isfile(d + '.zip'):
+            found_files.append(d + '.zip')
+
+    # If none found in the common locations, search recursively from script_dir
+    if not found_files:
+        for pattern in CAPTURE_PATTERNS:
+            found_files.extend(glob.glob(os.path.join(script_dir, '**', pattern), recursive=True))
+
+    # The search dirs may overlap, keep each capture only once
+    unique_files = []
+    seen = set()
+    for path in found_files:
+        real_path = os.path.realpath(path)
+        if real_path in seen:
+            continue
+        seen.add(real_path)
+        try:
+            unique_files.extend(expand_zip(path, [extension + suffix for extension in CAPTURE_EXTENSIONS
+                                                  for suffix in ('',) + COMPRESSED_SUFFIXES]))
+        except zipfile.BadZipFile:
+            print(f"Warning: skipping {path}, not a zip archive (a Git LFS pointer not pulled yet?)")
+    return unique_files
+
+
+def capture_stem(capture_file: str) -> str:
+    """Return the capture file name without its (possibly compressed) extension."""
+    archive, member = split_zip_member(capture_file)
+    return os.path.splitext(strip_compression_suffix(os.path.basename(member or archive)))[0]
+
+
+def load_checkpoint(checkpoint_path: str, capture_file: str) -> Dict:
+    """
+    Load the checkpoint of a previous interrupted run, if it belongs to this capture.
+
+    Args:
+        checkpoint_path: Path of the checkpoint JSON file
+        capture_file: Capture file being processed
+
+    Returns:
+        Checkpoint dictionary, or an empty dictionary when there is nothing to resume
+    """
+    if not os.path.exists(checkpoint_path):
+        return {}
+    try:
+        with open(checkpoint_path, 'r') as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    stat = input_stat(capture_file)
+    if (checkpoint.get('capture') != os.path.abspath(capture_file)
+            or checkpoint.get('capture_size') != stat.st_size
+            or checkpoint.get('capture_mtime') != stat.st_mtime):
+        # The capture changed since the checkpoint was written, start over
+        return {}
+    return checkpoint
+
+
+def save_checkpoint(checkpoint_path: str, checkpoint: Dict) -> None:
+    """Atomically replace the checkpoint file so a crash never leaves it half written."""
+    tmp_path = checkpoint_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, checkpoint_path)
+
+
+def feed_capture(capture_file: str, pipe) -> None:
+    """Decompress a capture into a pipe (runs in a thread next to the tshark reader)."""
+    try:
+        with open_input(capture_file) as source:
+            while True:
+                block = source.read(1 << 22)
+                if not block:
+                    break
+                pipe.write(block)
+    except BrokenPipeError:
+        pass  # tshark stopped reading, its exit code tells why
+    finally:
+        try:
+            pipe.close()
+        except BrokenPipeError:
+            pass
+
+
+def extract_http_times(capture_file: str, output_file: str, batch_size: int = 50000,
+                       resume: bool = True) -> int:
+    """
+    Stream tshark output for one capture into a CSV file.
+
+    Rows are written in batches and a checkpoint with the last frame number
+    processed is kept next to the output, so an interrupted run continues
+    from where it stopped instead of starting from scratch.
+
+    Args:
+        capture_file: Packet capture to dissect
+        output_file: CSV file to write
+        batch_size: Number of rows buffered before each write
+        resume: Continue from an existing checkpoint if possible
+
+    Returns:
+        Total number of rows in the output file
+    """
+    checkpoint_path = output_file + '.ckpt'
+    checkpoint = load_checkpoint(checkpoint_path, capture_file) if resume else {}
+    if checkpoint and not os.path.exists(output_file):
+        checkpoint = {}
+
+    stat = input_stat(capture_file)
+    last_frame = checkpoint.get('last_frame', 0)
+    rows_written = checkpoint.get('rows', 0)
+
+    output_dir = os.path.dirname(output_file)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    if checkpoint:
+        print(f"Resuming {capture_file} after frame {last_frame} ({rows_written:,} rows already written)")
+        csvfile = open(output_file, 'r+', newline='')
+        # Drop anything written after the last checkpoint
+        csvfile.truncate(checkpoint['csv_bytes'])
+        csvfile.seek(checkpoint['csv_bytes'])
+    else:
+        csvfile = open(output_file, 'w', newline='')
+
+    display_filter = "http.time"
+    if last_frame:
+        display_filter = f"http.time && frame.number > {last_frame}"
+
+    # tshark inflates gzip itself; other compressed captures are decompressed
+    # here and piped to it
+    piped = is_compressed(capture_file) and (split_zip_member(capture_file)[1] is not None
+                                             or not capture_file.lower().endswith(TSHARK_NATIVE_SUFFIXES))
+    tshark_cmd = [
+        "tshark",
+        "-r", "-" if piped else capture_file,
+        "-Y", display_filter,
+        "-T", "fields",
+        "-e", "frame.number",
+        "-e", "frame.time_utc",
+        "-e", "http.time"
+    ]
+
+    with csvfile:
+        csv_writer = csv.writer(csvfile)
+        if not checkpoint:
+            csv_writer.writerow(CSV_HEADER)
+
+        process = subprocess.Popen(tshark_cmd, stdout=subprocess.PIPE, text=True, bufsize=1 << 20,
+                                   stdin=subprocess.PIPE if piped else None)
+        feeder = None
+        if piped:
+            feeder = threading.Thread(target=feed_capture, args=(capture_file, process.stdin), daemon=True)
+            feeder.start()
+        batch = []
+
+        def flush_batch():
+            csv_writer.writerows(batch)
+            batch.clear()
+            csvfile.flush()
+            os.fsync(csvfile.fileno())
+            save_checkpoint(checkpoint_path, {
+                'capture': os.path.abspath(capture_file),
+                'capture_size': stat.st_size,
+                'capture_mtime': stat.st_mtime,
+                'last_frame': last_frame,
+                'rows': rows_written,
+                'csv_bytes': csvfile.tell(),
+            })
+
+        completed = False
+        try:
+            for line in process.stdout:
+                line = line.rstrip('\n')
+                if not line.strip():  # skip empty lines
+                    continue
+                fields = line.split('\t')  # tshark separates fields with tabs
+                last_frame = int(fields[0])
+                if len(fields) >= 3:
+                    rows_written += 1
+                    batch.append([rows_written, fields[1], fields[2]])
+                elif len(fields) == 2 and fields[1]:
+                    # In case there's only one field, it might be just the frame time
+                    rows_written += 1
+                    batch.append([rows_written, fields[1], ''])
+                else:
+                    continue
+                if len(batch) >= batch_size:
+                    flush_batch()
+            completed = True
+        finally:
+            if not completed:
+                # Nobody reads tshark's output any more: it would block on the full pipe
+                process.kill()
+            process.stdout.close()
+            return_code = process.wait()
+            if feeder is not None:
+                feeder.join()
+
+        if return_code != 0:
+            flush_batch()
+            raise RuntimeError(f"tshark exited with code {return_code} while reading {capture_file}")
+        flush_batch()
+
+    # The run completed, the checkpoint is no longer needed
+    os.remove(checkpoint_path)
+    return rows_written
+
+
+def extract_http_times_native(capture_file: str, output_file: str, batch_size: int = 50000,
+                              resume: bool = True, shards: int = 1) -> int:
+    """
+    Compute HTTP response times with the built-in capture reader instead of tshark.
+
+    Args:
+        capture_file: pcap, pcapng or .pcap.gz capture
+        output_file: CSV file to write
+        batch_size: Number of rows buffered before each write
+        resume: Unused, the native reader is fast enough to always start over
+        shards: Split the capture across this many worker processes; rows are
+            then sorted by arrival time
+
+    Returns:
+        Total number of rows in the output file
+    """
+    with profiling.stage('dissect') as stage:
+        if shards > 1:
+            arrivals, http_times = capture_shards.extract_http_times_sharded(capture_file, shards, shards)
+        else:
+            arrivals, http_times = pcap_reader.extract_http_times(capture_file)
+        stage.rows = len(arrivals)
+
+    output_dir = os.path.dirname(output_file)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    with open(output_file, 'w', newline='') as csvfile, profiling.stage('write', len(arrivals)):
+        csv_writer = csv.writer(csvfile)
+        csv_writer.writerow(CSV_HEADER)
+        for start in range(0, len(arrivals), batch_size):
+            frame_times = format_frame_times(arrivals[start:start + batch_size])
+            csv_writer.writerows(
+                [start + idx + 1, frame_time, pcap_reader.format_seconds(http_time)]
+                for idx, (frame_time, http_time) in enumerate(zip(frame_times.tolist(),
+                                                                  http_times[start:start + batch_size].tolist())))
+    return len(arrivals)
+
+
+def extract_latency_split(capture_file: str, output_file: str, batch_size: int = 50000,
+                          engine: str = 'native', shards: int = 1) -> int:
+    """
+    Write HTTP response times split into network round trip and server time.
+
+    The rows are those of the other extractors (one per response, by
+    arrival time) followed by the DECOMPOSE_HEADER columns; see
+    latency_split.decompose for how each part is measured.
+
+    Args:
+        capture_file: pcap or pcapng capture, possibly compressed
+        output_file: CSV file to write
+        batch_size: Number of rows formatted at a time
+        engine: 'native' or 'tshark', which reads the TCP headers
+        shards: Worker processes reading the capture (native engine only)
+
+    Returns:
+        Total number of rows in the output file
+    """
+    with profiling.stage('frames') as stage:
+        if engine == 'tshark':
+            frames = latency_split.tshark_frames(capture_file)
+        else:
+            frames = latency_split.native_frames(capture_file, shards)
+        stage.rows = len(frames['ts_ns'])
+    with profiling.stage('decompose') as stage:
+        result = latency_split.decompose(frames)
+        stage.rows = len(result['arrival_ns'])
+    del frames
+    medians = latency_split.summary(result)
+    if medians is not None:
+        print(f"{capture_file}: medians: HTTP time {medians['http_time'] * 1000:.3f} ms, network RTT "
+              f"{medians['network_rtt'] * 1000:.3f} ms, server time {medians['server_time'] * 1000:.3f} ms")
+
+    output_dir = os.path.dirname(output_file)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    durations = ['http_time_ns', 'handshake_rtt_ns', 'ack_rtt_ns', 'network_rtt_ns', 'server_time_ns']
+    rows = len(result['arrival_ns'])
+    with open(output_file, 'w', newline='') as csvfile, profiling.stage('write', rows):
+        csv_writer = csv.writer(csvfile)
+        csv_writer.writerow(CSV_HEADER + DECOMPOSE_HEADER)
+        for start in range(0, rows, batch_size):
+            window = slice(start, start + batch_size)
+            frame_times = format_frame_times(result['arrival_ns'][window]).tolist()
+            http_times, handshake, ack, network, server = (latency_split.format_durations(result[name][window])
+                                                           for name in durations)
+            csv_writer.writerows(zip(range(start + 1, start + len(frame_times) + 1), frame_times, http_times,
+                                     result['stream'][window].tolist(), handshake, ack, network, server))
+    return rows
+
+
+EXTRACTORS = {
+    'tshark': extract_http_times,
+    'native': extract_http_times_native,
+}
+
+
+def main():
+    """Main function with command line argument parsing."""
+    parser = argparse.ArgumentParser(description='Extract HTTP response times from packet captures')
+    parser.add_argument('--engine', choices=sorted(EXTRACTORS), default='tshark',
+                        help='Dissect captures with tshark or with the built-in pcap/pcapng reader')
+    parser.add_argument('--all', action='store_true',
+                        help='Process every capture found instead of only the most recent one')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT,
+                        help='Output CSV when processing a single capture')
+    parser.add_argument('--output-dir', default='data/24h',
+                        help='Output directory when processing every capture (one CSV per capture)')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='Maximum number of captures processed concurrently')
+    parser.add_argument('--shards', type=int, default=1,
+                        help='Split each capture across this many worker processes (native engine only; '
+                             'keep 1 for captures with pipelined HTTP requests)')
+    parser.add_argument('--batch-size', type=int, default=50000,
+                        help='Rows buffered before each write/checkpoint')
+    parser.add_argument('--no-resume', action='store_true',
+                        help='Ignore existing checkpoints and start from scratch')
+    parser.add_argument('--decompose', action='store_true',
+                        help='Also split every response time into network RTT and server time '
+                             '(adds ' + ', '.join(DECOMPOSE_HEADER) + ' columns)')
+    profiling.add_arguments(parser)
+
+    args = parser.parse_args()
+    profiler = profiling.configure(args)
+
+    found_files = find_capture_files()
+    if not found_files:
+        raise SystemExit("No packet capture file found in any 'packet-captures' directory under the script path.")
+
+    if args.all:
+        stems = [capture_stem(f) for f in sorted(found_files)]
+        jobs = []
+        for f, stem in zip(sorted(found_files), stems):
+            if stems.count(stem) > 1:
+                # e.g. both x.pcap and x.pcapng exist, keep the extension in the name
+                stem = os.path.basename(f).replace('.', '-')
+            jobs.append((f, os.path.join(args.output_dir, stem + '.csv')))
+    else:
+        # pick the most recently modified capture file
+        capture_file = max(found_files, key=input_mtime)
+        jobs = [(capture_file, args.output)]
+
+    for capture_file, output_file in jobs:
+        print(f"Using capture file: {capture_file} -> {output_file}")
 
-result = subprocess.run(tshark_cmd, capture_output=True, text=True)
-lines = result.stdout.strip().split('\n')
+    if args.decompose:
+        # One frame table per capture, processed one after the other
+        for capture_file, output_file in jobs:
+            with profiling.stage('extract') as stage:
+                rows = extract_latency_split(capture_file, output_file, args.batch_size, args.engine, args.shards)
+                stage.rows = rows
+            print(f"{capture_file}: {rows:,} rows written to {output_file}")
+        return
 
-with open('data/24h/24h-bh-rj.csv', 'w', newline='') as csvfile:
-    csv_writer = csv.writer(csvfile)
-    csv_writer.writerow(['Request Number', 'UTC Arrival Time', 'HTTP Request Time'])
-    for idx, line in enumerate(lines):
-        if line.strip():  # skip empty lines
-            fields = line.split('\t')  # tshark separates fields with tabs
-            if len(fields) >= 2:
-                utc_time = fields[0]
-                http_time = fields[1]
-                csv_writer.writerow([idx + 1, utc_time, http_time])
-            elif len(fields) == 1 and fields[0]:
-                # In case there's only one field, it might be just the frame time
-                csv_writer.writerow([idx + 1, fields[0], ''])
+    if profiler is not None or (args.engine == 'native' and args.shards > 1):
+        # Each capture already uses a pool of its own (or stages are measured
+        # in this process), process them one after the other
+        for capture_file, output_file in jobs:
+            with profiling.stage('extract') as stage:
+                if args.engine == 'native':
+                    rows = extract_http_times_native(capture_file, output_file, args.batch_size, shards=args.shards)
+                else:
+                    rows = extract_http_times(capture_file, output_file, args.batch_size, not args.no_resume)
+                stage.rows = rows
+            print(f"{capture_file}: {rows:,} rows written to {output_file}")
+        return
 
+    # tshark jobs spend their time waiting on their own process, so threads are enough
+    executor_class = ThreadPoolExecutor if args.engine == 'tshark' else ProcessPoolExecutor
+    with executor_class(max_workers=max(1, args.workers)) as executor:
+        futures = [executor.submit(EXTRACTORS[args.engine], capture_file, output_file,
+                                   args.batch_size, not args.no_resume)
+                   for capture_file, output_file in jobs]
+        for (capture_file, output_file), future in zip(jobs, futures):
+            rows = future.result()
+            print(f"{capture_file}: {rows:,} rows written to {output_file}")
 
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,502 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import profiling
+from columnar_cache import cache_dir_for, install_cache
+from compressed_io import is_compressed, open_input, strip_compression_suffix
+from tshark_time import NAT, NS_PER_SECOND, days_from_civil, days_in_month, format_frame_times
+
+# Same first columns as the tshark-derived CSVs, so the extractor and the plots read both alike
+CSV_HEADER = ['Request Number', 'UTC Arrival Time', 'HTTP Request Time', 'HTTP Waiting Time',
+              'VU', 'Scenario', 'Status']
+DURATION_METRIC = b'"http_req_duration"'
+WAITING_METRIC = b'"http_req_waiting"'
+BLOCK_SIZE = 32 << 20
+WRITE_ROWS = 1_000_000
+# Spilled per-row columns of a shard: int64 ns (NAT when missing) or codes (-1 when missing)
+SPILL_COLUMNS = ('time', 'duration', 'waiting', 'vu', 'status', 'scenario')
+MISSING = -1
+RFC3339_WIDTH = 40
+
+
+def parse_rfc3339(values: Sequence) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Parse RFC 3339 timestamps, as k6 writes them, into epoch nanoseconds (vectorized).
+
+    Accepts "2025-06-11T15:07:49.728608123-03:00" with 0 to 9 fraction
+    digits and a Z or +HH:MM/-HH:MM offset.
+
+    Returns:
+        Tuple of (int64 epoch nanoseconds with NAT for bad rows, boolean mask of bad rows)
+    """
+    n = len(values)
+    if n == 0:
+        return np.empty(0, dtype=np.int64), np.zeros(0, dtype=bool)
+    raw = np.asarray(values).astype(f'S{RFC3339_WIDTH}')
+    m = np.frombuffer(raw.tobytes(), dtype=np.uint8).reshape(n, RFC3339_WIDTH).astype(np.int64)
+    rows = np.arange(n)
+    bad = np.zeros(n, dtype=bool)
+
+    def number(start, width):
+        digits = m[:, start:start + width] - ord('0')
+        bad[:] |= ((digits < 0) | (digits > 9)).any(axis=1)
+        return digits @ 10 ** np.arange(width - 1, -1, -1)
+
+    year = number(0, 4)
+    month = number(5, 2)
+    day = number(8, 2)
+    hour = number(11, 2)
+    minute = number(14, 2)
+    second = number(17, 2)
+    for position, separator in ((4, b'-'), (7, b'-'), (13, b':'), (16, b':')):
+        bad |= m[:, position] != ord(separator)
+    bad |= (m[:, 10] != ord('T')) & (m[:, 10] != ord(' '))
+
+    # Fraction: up to nine digits after the dot, scaled to nanoseconds
+    fraction = np.zeros(n, dtype=np.int64)
+    digits = np.zeros(n, dtype=np.int64)
+    active = m[:, 19] == ord('.')
+    for k in range(9):
+        c = m[:, 20 + k]
+        active = active & (c >= ord('0')) & (c <= ord('9'))
+        fraction += np.where(active, (c - ord('0')) * 10 ** (8 - k), 0)
+        digits += active
+    zone = np.where(m[:, 19] == ord('.'), 20 + digits, 19)
+    bad |= (m[:, 19] == ord('.')) & (digits == 0)
+
+    sign_char = m[rows, zone]
+    utc = sign_char == ord('Z')
+    sign = np.where(sign_char == ord('+'), 1, np.where(sign_char == ord('-'), -1, 0))
+    bad |= ~utc & (sign == 0)
+    offset_digits = m[rows[:, None], zone[:, None] + np.array([1, 2, 4, 5])[None, :]] - ord('0')
+    with_offset = sign != 0
+    bad |= with_offset & (((offset_digits < 0) | (offset_digits > 9)).any(axis=1) | (m[rows, zone + 3] != ord(':')))
+    offset = sign * ((offset_digits[:, 0] * 10 + offset_digits[:, 1]) * 3600 + (offset_digits[:, 2] * 10 + offset_digits[:, 3]) * 60)
+
+    bad |= (month < 1) | (month > 12) | (day < 1) | (day > days_in_month(year, month)) | (hour > 23) | (minute > 59) | (second > 60)
+    seconds = days_from_civil(year, month, day) * 86400 + hour * 3600 + minute * 60 + second - offset
+    ns = seconds * NS_PER_SECOND + fraction
+    ns[bad] = NAT
+    return ns, bad
+
+
+def _metric_lines(data: bytes, metric: bytes) -> List[bytes]:
+    """Return the lines of a block that mention a metric name, in order."""
+    lines = []
+    position = 0
+    while True:
+        found = data.find(metric, position)
+        if found < 0:
+            return lines
+        start = data.rfind(b'\n', 0, found) + 1
+        end = data.find(b'\n', found)
+        end = len(data) if end < 0 else end
+        lines.append(data[start:end])
+        position = end
+
+
+def _decode(lines: List[bytes], metric: str, stats: Dict) -> List[Dict]:
+    """Decode the JSON lines of one metric and keep its points."""
+    if not lines:
+        return []
+    try:
+        records = json.loads(b'[' + b','.join(lines) + b']')
+    except ValueError:
+        # A truncated or corrupt line: decode one by one to drop only that line
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                stats['bad_lines'] += 1
+    return [record['data'] for record in records
+            if record.get('type') == 'Point' and record.get('metric') == metric]
+
+
+def _read_blocks(path: str, start: int, end: Optional[int], block_size: int):
+    """
+    Yield blocks of whole lines of an NDJSON file, for the lines starting in [start, end).
+
+    The start is moved to the beginning of the next line (unless it is one
+    already), so neighbouring ranges agree on which of them owns a line.
+    Compressed files are read as a whole (start 0, end None).
+    """
+    with open_input(path) as f:
+        if start > 0:
+            f.seek(start - 1)
+            f.readline()
+        while end is None or f.tell() < end:
+            data = f.read(block_size if end is None else min(block_size, end - f.tell()))
+            if not data:
+                return
+            if not data.endswith(b'\n'):
+                data += f.readline()
+            yield data
+
+
+def _tags(data: Dict) -> Tuple[Optional[str], str, Optional[str], Optional[str]]:
+    """(vu, scenario, status, name) of a point; recent k6 versions put vu under metadata."""
+    tags = data.get('tags') or {}
+    vu = tags.get('vu')
+    if vu is None:
+        vu = (data.get('metadata') or {}).get('vu')
+    return vu, tags.get('scenario') or '', tags.get('status'), tags.get('name') or tags.get('url')
+
+
+def _to_code(value: Optional[str]) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return MISSING
+
+
+def _parse_shard(path: str, start: int, end: Optional[int], spill_prefix: str,
+                 block_size: int = BLOCK_SIZE) -> Dict:
+    """
+    Extract the http_req_duration points of a byte range with their http_req_waiting.
+
+    Only lines mentioning one of the two metrics are decoded. Every
+    duration point becomes a row, spilled block by block to one binary file
+    per column, so memory stays bounded by the block size. k6 writes all
+    the points of a request together and with the same time and tags, so a
+    waiting point is paired with the duration point sharing its (time, VU,
+    scenario, name) key; points still unpaired two blocks later are given
+    up, and those at the ends of the range are returned for the neighbouring
+    ranges.
+
+    Returns:
+        Dictionary with the row count, the scenario labels (index = code),
+        the unpaired 'durations' (key -> local rows) and 'waitings'
+        (key -> ns) and counters for the report
+    """
+    files = {name: open(f'{spill_prefix}.{name}', 'w+b') for name in SPILL_COLUMNS}
+    scenarios: Dict[str, int] = {}
+    durations: Dict[tuple, deque] = {}  # key -> (block, row) waiting for their waiting point
+    waitings: Dict[tuple, deque] = {}  # key -> (block, ns) waiting for their duration point
+    stats = {'bad_lines': 0, 'bad_times': 0, 'dropped_waitings': 0, 'unpaired_durations': 0}
+    rows = 0
+    try:
+        for block, data in enumerate(_read_blocks(path, start, end, block_size)):
+            columns = {name: [] for name in SPILL_COLUMNS}
+            patches = []
+            for point in _decode(_metric_lines(data, DURATION_METRIC), 'http_req_duration', stats):
+                vu, scenario, status, name = _tags(point)
+                key = (point['time'], vu, scenario, name)
+                columns['time'].append(point['time'])
+                columns['duration'].append(round(point['value'] * 1e6))
+                columns['vu'].append(_to_code(vu))
+                columns['status'].append(_to_code(status))
+                columns['scenario'].append(scenarios.setdefault(scenario, len(scenarios)))
+                queued = waitings.get(key)
+                if queued:
+                    columns['waiting'].append(queued.popleft()[1])
+                    if not queued:
+                        del waitings[key]
+                else:
+                    columns['waiting'].append(NAT)
+                    durations.setdefault(key, deque()).append((block, rows + len(columns['time']) - 1))
+            for point in _decode(_metric_lines(data, WAITING_METRIC), 'http_req_waiting', stats):
+                vu, scenario, _, name = _tags(point)
+                key = (point['time'], vu, scenario, name)
+                value = round(point['value'] * 1e6)
+                queued = durations.get(key)
+                if queued:
+                    row = queued.popleft()[1]
+                    if not queued:
+                        del durations[key]
+                    if row >= rows:
+                        columns['waiting'][row - rows] = value
+                    else:
+                        patches.append((row, value))
+                else:
+                    waitings.setdefault(key, deque()).append((block, value))
+
+            times, bad = parse_rfc3339(columns['time'])
+            stats['bad_times'] += int(bad.sum())
+            columns['time'] = times
+            for name in SPILL_COLUMNS:
+                np.asarray(columns[name], dtype=np.int32 if name == 'scenario' else np.int64).tofile(files[name])
+            if patches:
+                spill = files['waiting']
+                for row, value in patches:
+                    spill.seek(row * 8)
+                    spill.write(np.int64(value).tobytes())
+                spill.seek(0, os.SEEK_END)
+            rows += len(times)
+
+            # Give up on points whose partner did not show up within the next
+            # block; those of the first block may pair with the previous range
+            for pending, counter in ((durations, 'unpaired_durations'), (waitings, 'dropped_waitings')):
+                for key in [key for key, queued in pending.items()
+                            if any(0 < item[0] < block - 1 for item in queued)]:
+                    kept = deque(item for item in pending[key] if item[0] == 0 or item[0] >= block - 1)
+                    stats[counter] += len(pending[key]) - len(kept)
+                    if kept:
+                        pending[key] = kept
+                    else:
+                        del pending[key]
+    finally:
+        for f in files.values():
+            f.close()
+
+    return dict(stats, rows=rows, scenarios=list(scenarios),
+                durations={key: [row for _, row in queued] for key, queued in durations.items()},
+                waitings={key: [value for _, value in queued] for key, queued in waitings.items()})
+
+
+def pair_across_shards(results: List[Dict], offsets: List[int]) -> Tuple[Dict[int, int], int, int]:
+    """
+    Pair the durations and waitings left unpaired at the ends of the shards.
+
+    Returns:
+        Tuple of ({global row: waiting ns}, unpaired durations, unpaired waitings)
+    """
+    durations: Dict[tuple, deque] = {}
+    for result, offset in zip(results, offsets):
+        for key, rows in result['durations'].items():
+            durations.setdefault(key, deque()).extend(offset + row for row in rows)
+    patches = {}
+    dropped = 0
+    for result in results:
+        for key, values in result['waitings'].items():
+            for value in values:
+                queued = durations.get(key)
+                if queued:
+                    patches[queued.popleft()] = value
+                else:
+                    dropped += 1
+    return patches, sum(len(queued) for queued in durations.values()), dropped
+
+
+def _format_seconds(ns: np.ndarray) -> List[str]:
+    """Nanosecond durations as seconds with nine decimals (empty for NAT), like pcap_reader.format_seconds."""
+    seconds, fraction = np.divmod(ns, NS_PER_SECOND)
+    missing = ns == NAT
+    return ['' if skip else f'{s}.{f:09d}' for s, f, skip in zip(seconds.tolist(), fraction.tolist(),
+                                                                  missing.tolist())]
+
+
+def _csv_field(label: str) -> str:
+    if any(c in label for c in ',"\n\r'):
+        return '"' + label.replace('"', '""') + '"'
+    return label
+
+
+def _write_shard(spill_prefix: str, first_row: int, rows: int, labels: List[str], column_files: Dict[str, str],
+                 part_path: str, chunk_rows: int = WRITE_ROWS) -> None:
+    """
+    Write the rows of one shard as CSV text and into the shared column files.
+
+    Every shard owns the slice [first_row, first_row + rows) of the .npy
+    column files, which are opened as writable memory maps.
+    """
+    spills = {name: open(f'{spill_prefix}.{name}', 'rb') for name in SPILL_COLUMNS}
+    targets = {name: np.load(file, mmap_mode='r+') for name, file in column_files.items()}
+    fields = [_csv_field(label) for label in labels]
+    try:
+        with open(part_path, 'w', newline='') as part:
+            for start in range(0, rows, chunk_rows):
+                n = min(chunk_rows, rows - start)
+                chunk = {name: np.fromfile(spills[name], dtype=np.int32 if name == 'scenario' else np.int64, count=n)
+                         for name in SPILL_COLUMNS}
+                times, vus, statuses = chunk['time'], chunk['vu'], chunk['status']
+                columns = {
+                    'Request Number': np.arange(first_row + start + 1, first_row + start + n + 1, dtype=np.int64),
+                    'UTC Arrival Time': times,
+                    'HTTP Request Time': chunk['duration'] / NS_PER_SECOND,
+                    'HTTP Waiting Time': np.where(chunk['waiting'] == NAT, np.nan, chunk['waiting'] / NS_PER_SECOND),
+                    'VU': np.where(vus == MISSING, np.nan, vus),
+                    'Status': np.where(statuses == MISSING, np.nan, statuses),
+                }
+                rows_slice = slice(first_row + start, first_row + start + n)
+                for name, target in targets.items():
+                    target[rows_slice] = columns[name]
+
+                frame_times = ['' if time == NAT else f'"{text}"'
+                               for text, time in zip(format_frame_times(times).tolist(), times.tolist())]
+                text = [f'{number},{frame_time},{duration},{waiting},{vu},{scenario},{status}\n'
+                        for number, frame_time, duration, waiting, vu, scenario, status in zip(
+                            columns['Request Number'].tolist(), frame_times,
+                            _format_seconds(chunk['duration']), _format_seconds(chunk['waiting']),
+                            ['' if vu == MISSING else vu for vu in vus.tolist()],
+                            [fields[code] for code in chunk['scenario'].tolist()],
+                            ['' if status == MISSING else status for status in statuses.tolist()])]
+                part.write(''.join(text))
+    finally:
+        for f in spills.values():
+            f.close()
+        for target in targets.values():
+            target.flush()
+
+
+def ingest_k6_json(json_path: str, output_file: str, workers: Optional[int] = None,
+                   block_size: int = BLOCK_SIZE) -> int:
+    """
+    Convert k6 --out json results into an HTTP times CSV and its columnar cache.
+
+    The NDJSON file is split into byte ranges parsed by a pool of worker
+    processes (compressed files are parsed by one process). Each request
+    becomes a row with its http_req_duration (HTTP Request Time, in seconds
+    like tshark's http.time), its http_req_waiting (time to first byte), the
+    VU, scenario (e.g. slowRoute, fastRoute) and status tags, and the time
+    k6 stamped the point with (when the response completed, like the
+    arrival time of a captured response). Rows keep the order of the file.
+
+    Workers spill their rows to disk and then write their slice of the CSV
+    and of the cached columns, so memory stays bounded however long the
+    run was; the extractor and the plots then memory-map the columns
+    without parsing the CSV.
+
+    Args:
+        json_path: k6 NDJSON results, possibly compressed (.gz, .xz, .bz2, .zip)
+        output_file: CSV file to write
+        workers: Worker processes (default: os.cpu_count())
+        block_size: Bytes of NDJSON parsed at a time by each worker
+
+    Returns:
+        Number of rows written
+    """
+    workers = max(1, workers or os.cpu_count() or 1)
+    output_dir = os.path.dirname(os.path.abspath(output_file))
+    os.makedirs(output_dir, exist_ok=True)
+    spill_dir = tempfile.mkdtemp(prefix='.k6-ingest-', dir=output_dir)
+    cache_dir = cache_dir_for(output_file)
+    tmp_cache = f'{cache_dir}.tmp-{os.getpid()}'
+    tmp_csv = f'{output_file}.tmp-{os.getpid()}'
+    try:
+        with profiling.stage('parse') as stage:
+            if is_compressed(json_path):
+                ranges = [(0, None)]
+            else:
+                size = os.path.getsize(json_path)
+                shards = max(1, min(workers, size // block_size + 1))
+                bounds = [size * i // shards for i in range(shards + 1)]
+                ranges = list(zip(bounds[:-1], bounds[1:]))
+            prefixes = [os.path.join(spill_dir, f'shard-{i}') for i in range(len(ranges))]
+            with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as executor:
+                results = list(executor.map(_parse_shard, [json_path] * len(ranges), [start for start, _ in ranges],
+                                            [end for _, end in ranges], prefixes, [block_size] * len(ranges)))
+            stage.rows = sum(result['rows'] for result in results)
+
+        counts = [result['rows'] for result in results]
+        offsets = list(np.cumsum([0] + counts)[:-1])
+        total = int(sum(counts))
+        patches, unpaired, dropped = pair_across_shards(results, offsets)
+        for (row, value) in patches.items():
+            shard = int(np.searchsorted(offsets, row, side='right')) - 1
+            with open(f'{prefixes[shard]}.waiting', 'r+b') as spill:
+                spill.seek((row - offsets[shard]) * 8)
+                spill.write(np.int64(value).tobytes())
+        unpaired += sum(result['unpaired_durations'] for result in results)
+        dropped += sum(result['dropped_waitings'] for result in results)
+        for counter, message in (('bad_lines', 'unreadable JSON lines'), ('bad_times', 'points with a bad time')):
+            if sum(result[counter] for result in results):
+                print(f"Warning: {json_path}: skipped {sum(result[counter] for result in results):,} {message}")
+        if unpaired:
+            print(f"Warning: {json_path}: {unpaired:,} requests have no http_req_waiting point")
+        if dropped:
+            print(f"Warning: {json_path}: {dropped:,} http_req_waiting points have no http_req_duration point")
+
+        # Scenario codes are per shard, map them to one list of labels
+        labels = []
+        for result in results:
+            labels.extend(label for label in result['scenarios'] if label not in labels)
+
+        # Columns as build_cache would cache them from the CSV: int64 unless a
+        # cell is empty (float64 with NaN), left out when no cell has a value
+        kinds = {'Request Number': np.int64, 'UTC Arrival Time': np.int64, 'HTTP Request Time': np.float64}
+        if unpaired < total:
+            kinds['HTTP Waiting Time'] = np.float64
+        for name, spill in (('VU', 'vu'), ('Status', 'status')):
+            missing = sum(np.count_nonzero(np.fromfile(f'{prefix}.{spill}', dtype=np.int64) == MISSING)
+                          for prefix in prefixes) if total else 0
+            if missing < total:
+                kinds[name] = np.int64 if missing == 0 else np.float64
+        shutil.rmtree(tmp_cache, ignore_errors=True)
+        os.makedirs(tmp_cache)
+        cached = []
+        column_files = {}
+        for name, dtype in kinds.items():
+            file_name = f'{CSV_HEADER.index(name):03d}.npy'
+            path = os.path.join(tmp_cache, file_name)
+            if total:
+                np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=(total,)).flush()
+                column_files[name] = path
+            else:
+                np.save(path, np.empty(0, dtype=dtype))
+            cached.append({'name': name, 'file': file_name, 'dtype': np.dtype(dtype).name})
+
+        parts = [f'{prefix}.csv' for prefix in prefixes]
+        with profiling.stage('write', total):
+            with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as executor:
+                shard_labels = [[labels.index(label) for label in result['scenarios']] for result in results]
+                list(executor.map(_write_shard, prefixes, offsets, counts,
+                                  [[labels[code] for code in codes] for codes in shard_labels],
+                                  [column_files] * len(ranges), parts))
+            digest = hashlib.sha256()
+            with open(tmp_csv, 'wb') as out:
+                header = (','.join(CSV_HEADER) + '\n').encode()
+                out.write(header)
+                digest.update(header)
+                for part_path in parts:
+                    with open(part_path, 'rb') as part:
+                        for block in iter(lambda: part.read(1 << 22), b''):
+                            out.write(block)
+                            digest.update(block)
+                    os.remove(part_path)
+            os.replace(tmp_csv, output_file)
+        install_cache(output_file, tmp_cache, CSV_HEADER, CSV_HEADER, cached, total, sha256=digest.hexdigest())
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+        shutil.rmtree(tmp_cache, ignore_errors=True)
+        if os.path.exists(tmp_csv):
+            os.remove(tmp_csv)
+    return total
+
+
+def default_output(json_path: str) -> str:
+    """results.json(.gz) -> results.csv, next to the input."""
+    stem = strip_compression_suffix(json_path)
+    for suffix in ('.json', '.ndjson', '.jsonl'):
+        if stem.lower().endswith(suffix):
+            stem = stem[:-len(suffix)]
+            break
+    return stem + '.csv'
+
+
+def main():
+    """Main function with command line argument parsing."""
+    parser = argparse.ArgumentParser(description='Convert k6 --out json results into HTTP times CSVs')
+    parser.add_argument('files', nargs='+', help='k6 NDJSON result files (possibly compressed)')
+    parser.add_argument('--output', help='Output CSV (single input only; default: the input name with .csv)')
+    parser.add_argument('--output-dir', help='Directory for the output CSVs (default: next to each input)')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--block-size', type=int, default=BLOCK_SIZE >> 20,
+                        help=f'MiB of NDJSON parsed at a time per worker (default: {BLOCK_SIZE >> 20})')
+    profiling.add_arguments(parser)
+    args = parser.parse_args()
+    profiling.configure(args)
+
+    if args.output and len(args.files) > 1:
+        parser.error('--output takes a single input file')
+    for json_path in args.files:
+        output_file = args.output or default_output(json_path)
+        if args.output_dir:
+            output_file = os.path.join(args.output_dir, os.path.basename(output_file))
+        with profiling.stage('ingest') as stage:
+            rows = ingest_k6_json(json_path, output_file, args.workers, args.block_size << 20)
+            stage.rows = rows
+        print(f"{json_path}: {rows:,} requests written to {output_file}")
+
+
+if __name__ == "__main__":
+    main()
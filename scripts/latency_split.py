@@ -0,0 +1,381 @@
+import hashlib
+import subprocess
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from compressed_io import copy_decompressed, is_compressed, split_zip_member
+from pcap_reader import (HTTP_METHODS, CaptureBuffer, find_record_boundary, interface_changes, iter_records, layout_at,
+                         parse_tcp, read_layout)
+from tshark_time import NAT
+
+TCP_FIN = 0x01
+TCP_SYN = 0x02
+TCP_RST = 0x04
+TCP_ACK = 0x10
+
+# Frame kinds
+OTHER = 0
+REQUEST = 1   # first segment of an HTTP request
+RESPONSE = 2  # segment with a final (non-1xx) status line
+INTERIM = 3   # 1xx status line
+
+FRAME_COLUMNS = ['ts_ns', 'pair', 'from_low', 'flags', 'seq', 'ack', 'length', 'kind']
+SEQ_MASK = 0xFFFFFFFF
+CHUNK_ROWS = 1_000_000
+
+
+def _pair_key(a: bytes, b: bytes) -> int:
+    """Direction-independent 63-bit key of a TCP endpoint pair (stable across processes)."""
+    return int.from_bytes(hashlib.blake2b(a + b'|' + b, digest_size=8).digest(), 'little') >> 1
+
+
+def _empty_frames() -> Dict[str, np.ndarray]:
+    return {name: np.empty(0, dtype=np.int64) for name in FRAME_COLUMNS}
+
+
+def tcp_frames(buf, records) -> Dict[str, np.ndarray]:
+    """
+    Per-frame TCP header table of the records of a capture.
+
+    Each frame is reduced to its timestamp, the key of its endpoint pair,
+    its direction, flags, sequence and acknowledgement numbers, payload
+    length and HTTP kind; everything else happens on these arrays.
+
+    Args:
+        buf: Capture buffer
+        records: Iterable of (ts_ns, linktype, offset, caplen) from iter_records
+
+    Returns:
+        Frame table: dictionary of int64 arrays named after FRAME_COLUMNS
+    """
+    pairs: Dict[tuple, tuple] = {}
+    columns = {name: [] for name in FRAME_COLUMNS}
+    for ts_ns, linktype, offset, caplen in records:
+        segment = parse_tcp(buf, linktype, offset, caplen)
+        if segment is None:
+            continue
+        src, sport, dst, dport, seq, ack, flags, payload, payload_end = segment
+        endpoints = (src, sport, dst, dport)
+        pair = pairs.get(endpoints)
+        if pair is None:
+            low, high = sorted([src + sport.to_bytes(2, 'big'), dst + dport.to_bytes(2, 'big')])
+            pair = (_pair_key(low, high), src + sport.to_bytes(2, 'big') == low)
+            pairs[endpoints] = pair
+        kind = OTHER
+        if payload_end > payload:
+            head = bytes(buf[payload:min(payload + 12, payload_end)])
+            if head.startswith(b'HTTP/'):
+                kind = INTERIM if head[9:10] == b'1' else RESPONSE
+            elif head.startswith(HTTP_METHODS):
+                kind = REQUEST
+        columns['ts_ns'].append(ts_ns)
+        columns['pair'].append(pair[0])
+        columns['from_low'].append(pair[1])
+        columns['flags'].append(flags)
+        columns['seq'].append(seq)
+        columns['ack'].append(ack)
+        columns['length'].append(payload_end - payload)
+        columns['kind'].append(kind)
+    return {name: np.array(values, dtype=np.int64) for name, values in columns.items()}
+
+
+def _shard_frames(data_path: str, start: int, end: int, changes: List[tuple]) -> Dict[str, np.ndarray]:
+    """Frame table of the records starting within [start, end) (runs in a worker process)."""
+    with CaptureBuffer(data_path) as capture:
+        buf = capture.buf
+        layout = read_layout(buf)
+        first = find_record_boundary(buf, layout_at(layout, changes, start), start)
+        last = find_record_boundary(buf, layout_at(layout, changes, end), end) if end < len(buf) else len(buf)
+        return tcp_frames(buf, iter_records(buf, first, last, layout_at(layout, changes, first)))
+
+
+def native_frames(path: str, shards: int = 1) -> Dict[str, np.ndarray]:
+    """
+    Frame table of a capture, read with the built-in pcap/pcapng reader.
+
+    With several shards the capture is split into byte ranges read by
+    worker processes; the endpoint keys do not depend on the shard, so the
+    tables are simply concatenated.
+    """
+    with CaptureBuffer(path) as capture:
+        if shards <= 1:
+            return tcp_frames(capture.buf, iter_records(capture.buf))
+        size = len(capture.buf)
+        layout = read_layout(capture.buf)
+        first = layout['first_record']
+        bounds = [first + (size - first) * i // shards for i in range(shards + 1)]
+        changes = interface_changes(capture.buf, layout, bounds[-2])
+        with ProcessPoolExecutor(max_workers=shards) as executor:
+            tables = list(executor.map(_shard_frames, [capture.data_path] * shards, bounds[:-1], bounds[1:],
+                                       [changes] * shards))
+    return {name: np.concatenate([table[name] for table in tables]) for name in FRAME_COLUMNS}
+
+
+TSHARK_FIELDS = ['frame.time_epoch', 'ip.src', 'ipv6.src', 'tcp.srcport', 'ip.dst', 'ipv6.dst', 'tcp.dstport',
+                 'tcp.flags', 'tcp.seq_raw', 'tcp.ack_raw', 'tcp.len', 'http.request', 'http.response.code']
+
+
+def _epoch_to_ns(values) -> np.ndarray:
+    """Parse frame.time_epoch strings ('1749665269.728608000') to int64 ns without float rounding."""
+    parts = values.str.partition('.')
+    fraction = parts[2].str.pad(9, side='right', fillchar='0').str[:9]
+    return parts[0].astype(np.int64).to_numpy() * 1_000_000_000 + fraction.astype(np.int64).to_numpy()
+
+
+def _feed(path: str, pipe) -> None:
+    """Decompress a capture into tshark's standard input."""
+    try:
+        copy_decompressed(path, pipe)
+    except BrokenPipeError:
+        pass  # tshark stopped reading, its exit code tells why
+    finally:
+        try:
+            pipe.close()
+        except BrokenPipeError:
+            pass
+
+
+def tshark_frames(path: str, chunk_rows: int = CHUNK_ROWS) -> Dict[str, np.ndarray]:
+    """
+    Frame table of a capture, dissected by tshark.
+
+    TCP reassembly is turned off so HTTP requests and responses are flagged
+    on their first segment, like the built-in reader does. tshark's output
+    is parsed chunk by chunk with pandas as it is produced.
+    """
+    import pandas as pd
+
+    # tshark reads gzip by itself, other compressed captures are piped to it
+    piped = is_compressed(path) and (split_zip_member(path)[1] is not None or not path.lower().endswith('.gz'))
+    command = ['tshark', '-r', '-' if piped else path, '-Y', 'tcp', '-o', 'tcp.desegment_tcp_streams:FALSE', '-T', 'fields',
+               '-E', 'separator=\t', '-E', 'occurrence=f']
+    for field in TSHARK_FIELDS:
+        command += ['-e', field]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stdin=subprocess.PIPE if piped else None)
+    if piped:
+        threading.Thread(target=_feed, args=(path, process.stdin), daemon=True).start()
+    tables = []
+    try:
+        for chunk in pd.read_csv(process.stdout, sep='\t', header=None, names=TSHARK_FIELDS, dtype=str,
+                                 keep_default_na=False, chunksize=chunk_rows):
+            source = (chunk['ip.src'] + chunk['ipv6.src'] + '|' + chunk['tcp.srcport']).to_numpy()
+            target = (chunk['ip.dst'] + chunk['ipv6.dst'] + '|' + chunk['tcp.dstport']).to_numpy()
+            from_low = source <= target
+            low = np.where(from_low, source, target)
+            high = np.where(from_low, target, source)
+            pair = np.array([_pair_key(a.encode(), b.encode()) for a, b in zip(low.tolist(), high.tolist())],
+                            dtype=np.int64)
+            codes = pd.to_numeric(chunk['http.response.code'], errors='coerce').to_numpy()
+            kind = np.full(len(chunk), OTHER, dtype=np.int64)
+            kind[chunk['http.request'].to_numpy() != ''] = REQUEST
+            kind[codes >= 200] = RESPONSE
+            kind[(codes >= 100) & (codes < 200)] = INTERIM
+            tables.append({
+                'ts_ns': _epoch_to_ns(chunk['frame.time_epoch']),
+                'pair': pair,
+                'from_low': from_low.astype(np.int64),
+                'flags': np.array([int(value, 16) for value in chunk['tcp.flags'].tolist()], dtype=np.int64),
+                'seq': pd.to_numeric(chunk['tcp.seq_raw']).to_numpy(dtype=np.int64),
+                'ack': pd.to_numeric(chunk['tcp.ack_raw']).to_numpy(dtype=np.int64),
+                'length': pd.to_numeric(chunk['tcp.len']).to_numpy(dtype=np.int64),
+                'kind': kind,
+            })
+    finally:
+        return_code = process.wait()
+    if return_code != 0:
+        raise RuntimeError(f"tshark exited with code {return_code} while reading {path}")
+    if not tables:
+        return _empty_frames()
+    return {name: np.concatenate([table[name] for table in tables]) for name in FRAME_COLUMNS}
+
+
+def _first_per_group(groups: np.ndarray, mask: np.ndarray, values: np.ndarray, n_groups: int,
+                     missing: int = NAT) -> np.ndarray:
+    """Value of the first masked row of every group (rows sorted by group), missing when there is none."""
+    result = np.full(n_groups, missing, dtype=np.int64)
+    rows = np.flatnonzero(mask)
+    found, first = np.unique(groups[rows], return_index=True)
+    result[found] = values[rows[first]]
+    return result
+
+
+def _merge_lookup(keys: np.ndarray, sorted_keys: np.ndarray) -> np.ndarray:
+    """Position of every key in sorted_keys, -1 when it is not there."""
+    position = np.searchsorted(sorted_keys, keys)
+    inside = position < len(sorted_keys)
+    found = np.zeros(len(keys), dtype=bool)
+    found[inside] = sorted_keys[position[inside]] == keys[inside]
+    return np.where(found, position, -1)
+
+
+def decompose(frames: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Split every HTTP response time into network round trip and server time.
+
+    Everything is done on the frame table with sorts and merges:
+
+    - frames are sorted by (endpoint pair, time) and split into connections
+      at every new SYN, so reused ports give separate TCP streams;
+    - the client of a connection is the side that sent the SYN (or, for a
+      connection opened before the capture, the first HTTP request);
+    - the handshake RTT is measured like tshark's tcp.analysis.initial_rtt,
+      from the SYN to the first client frame after the SYN/ACK;
+    - requests and responses are numbered per connection and joined on
+      (connection, number); HTTP/1.x answers requests in order;
+    - the server ACK of a request is the first server frame (by sequence
+      order) acknowledging the request's last byte, found with a merge on
+      (connection, relative acknowledgement number). When it arrives before
+      the response, its delay is the network RTT of the request; when the
+      ACK rides on the response, the handshake RTT of the connection is used.
+      A delayed ACK (held back up to ~40 ms by the server's stack) would
+      inflate the network RTT and understate the server time, so the ACK
+      delay is capped at the handshake RTT of the connection.
+
+    Server time is the HTTP time minus the network RTT.
+
+    Args:
+        frames: Frame table from tcp_frames, native_frames or tshark_frames
+
+    Returns:
+        Dictionary of int64 arrays, one row per matched request, sorted by
+        response time: 'arrival_ns', 'stream', 'http_time_ns',
+        'handshake_rtt_ns', 'ack_rtt_ns' (as measured, before the cap),
+        'network_rtt_ns' and 'server_time_ns' (NAT where unknown)
+    """
+    order = np.lexsort((frames['ts_ns'], frames['pair']))
+    table = {name: frames[name][order] for name in FRAME_COLUMNS}
+    n = len(order)
+    names = ['arrival_ns', 'stream', 'http_time_ns', 'handshake_rtt_ns', 'ack_rtt_ns',
+             'network_rtt_ns', 'server_time_ns']
+    if n == 0:
+        return {name: np.empty(0, dtype=np.int64) for name in names}
+    pair, flags, seq, ts = table['pair'], table['flags'], table['seq'], table['ts_ns']
+
+    # Connections: a new one starts at every SYN that is not a retransmission
+    syn_only = (flags & (TCP_SYN | TCP_ACK)) == TCP_SYN
+    same_pair = np.r_[False, pair[1:] == pair[:-1]]
+    retransmitted_syn = syn_only & same_pair & np.r_[False, syn_only[:-1]] & np.r_[False, seq[1:] == seq[:-1]]
+    starts = ~same_pair | (syn_only & ~retransmitted_syn)
+    conn = np.cumsum(starts) - 1
+    n_conn = int(conn[-1]) + 1
+    # Number connections by their first frame, like tshark's tcp.stream
+    renumber = np.empty(n_conn, dtype=np.int64)
+    renumber[np.argsort(ts[starts], kind='stable')] = np.arange(n_conn)
+
+    # Client side and direction of every frame
+    opener = syn_only | (table['kind'] == REQUEST)
+    client_low = _first_per_group(conn, opener, table['from_low'], n_conn, missing=-1)
+    from_client = table['from_low'] == client_low[conn]
+    known = client_low[conn] >= 0
+
+    # Handshake RTT (SYN to the client's first frame after the SYN/ACK)
+    syn_ts = _first_per_group(conn, syn_only & known, ts, n_conn)
+    synack = ((flags & (TCP_SYN | TCP_ACK)) == (TCP_SYN | TCP_ACK)) & ~from_client & known
+    synack_ts = _first_per_group(conn, synack, ts, n_conn)
+    after_synack = from_client & known & (synack_ts[conn] != NAT) & (ts > synack_ts[conn])
+    third_ts = _first_per_group(conn, after_synack, ts, n_conn)
+    handshake_rtt = np.where((syn_ts != NAT) & (third_ts != NAT), third_ts - syn_ts, NAT)
+
+    # Relative sequence numbers of the client's bytes (from its first frame in the connection)
+    client_frames = from_client & known
+    syn_seq = _first_per_group(conn, syn_only & known, seq, n_conn, missing=-1)
+    client_isn = np.where(syn_seq >= 0, syn_seq + 1, _first_per_group(conn, client_frames, seq, n_conn, missing=0))
+    relative_end = (seq + table['length'] - client_isn[conn]) & SEQ_MASK
+    relative_ack = (table['ack'] - client_isn[conn]) & SEQ_MASK
+
+    # Requests: client payload frames, retransmissions dropped, numbered per connection
+    payload = client_frames & (table['length'] > 0)
+    rows = np.flatnonzero(payload)
+    _, unique_rows = np.unique(conn[rows] * (SEQ_MASK + 1) + seq[rows], return_index=True)
+    rows = np.sort(rows[unique_rows])
+    request_start = table['kind'][rows] == REQUEST
+    # Number of request starts so far in the connection of every payload frame
+    started = np.cumsum(request_start)
+    conn_first = np.r_[True, conn[rows][1:] != conn[rows][:-1]]
+    before_conn = np.maximum.accumulate(np.where(conn_first, started - request_start, 0))
+    number = started - before_conn
+    rows, number = rows[number > 0], number[number > 0]
+    request_key = conn[rows] * (1 << 32) + number
+    groups = np.flatnonzero(np.r_[True, request_key[1:] != request_key[:-1]])
+    request_keys = request_key[groups]
+    request_end_ts = np.maximum.reduceat(ts[rows], groups)
+    request_end_seq = np.maximum.reduceat(relative_end[rows], groups)
+
+    # Responses: server frames with a final status line, numbered per connection
+    rows = np.flatnonzero((table['kind'] == RESPONSE) & ~from_client & known)
+    _, unique_rows = np.unique(conn[rows] * (SEQ_MASK + 1) + seq[rows], return_index=True)
+    rows = np.sort(rows[unique_rows])
+    response_conn = conn[rows]
+    conn_first = np.r_[True, response_conn[1:] != response_conn[:-1]]
+    position = np.arange(len(rows))
+    response_number = position - np.maximum.accumulate(np.where(conn_first, position, 0)) + 1
+    response_keys = response_conn * (1 << 32) + response_number
+    response_ts = ts[rows]
+
+    # Join requests and responses on (connection, number)
+    match = _merge_lookup(request_keys, response_keys)
+    matched = match >= 0
+    request_conn = request_keys[matched] >> 32
+    request_end_ts, request_end_seq = request_end_ts[matched], request_end_seq[matched]
+    arrival = response_ts[match[matched]]
+    http_time = arrival - request_end_ts
+
+    # Server ACK of every request: first server frame acknowledging its last byte
+    rows = np.flatnonzero(~from_client & known & ((flags & TCP_ACK) != 0))
+    ack_keys = conn[rows] * (1 << 32) + relative_ack[rows]
+    ack_order = np.lexsort((ts[rows], ack_keys))
+    ack_keys, ack_ts = ack_keys[ack_order], ts[rows][ack_order]
+    position = np.searchsorted(ack_keys, request_conn * (1 << 32) + request_end_seq, side='left')
+    inside = position < len(ack_keys)
+    found = np.zeros(len(position), dtype=bool)
+    found[inside] = (ack_keys[position[inside]] >> 32) == request_conn[inside]
+    first_ack_ts = np.where(found, ack_ts[np.minimum(position, len(ack_ts) - 1)], NAT)
+    separate = found & (first_ack_ts >= request_end_ts) & (first_ack_ts < arrival)
+    ack_rtt = np.where(separate, first_ack_ts - request_end_ts, NAT)
+
+    handshake = handshake_rtt[request_conn]
+    capped = np.where(handshake != NAT, np.minimum(ack_rtt, handshake), ack_rtt)
+    network_rtt = np.where(separate, capped, handshake)
+    server_time = np.where(network_rtt != NAT, http_time - network_rtt, NAT)
+
+    result = {
+        'arrival_ns': arrival,
+        'stream': renumber[request_conn],
+        'http_time_ns': http_time,
+        'handshake_rtt_ns': handshake,
+        'ack_rtt_ns': ack_rtt,
+        'network_rtt_ns': network_rtt,
+        'server_time_ns': server_time,
+    }
+    by_arrival = np.argsort(arrival, kind='stable')
+    return {name: values[by_arrival] for name, values in result.items()}
+
+
+def split_capture(path: str, engine: str = 'native', shards: int = 1) -> Dict[str, np.ndarray]:
+    """Decompose the HTTP response times of a capture (see decompose)."""
+    frames = tshark_frames(path) if engine == 'tshark' else native_frames(path, shards)
+    return decompose(frames)
+
+
+def format_durations(ns: np.ndarray) -> List[str]:
+    """Format nanosecond durations as seconds with nine decimals ('' where unknown)."""
+    ns = np.asarray(ns, dtype=np.int64)
+    missing = ns == NAT
+    sign = np.where(ns < 0, '-', '')
+    seconds, fraction = np.divmod(np.abs(np.where(missing, 0, ns)), 1_000_000_000)
+    text = [f'{s}{whole}.{part:09d}' for s, whole, part in zip(sign.tolist(), seconds.tolist(), fraction.tolist())]
+    return [('' if gap else value) for gap, value in zip(missing.tolist(), text)]
+
+
+def summary(result: Dict[str, np.ndarray]) -> Optional[Dict[str, float]]:
+    """Median HTTP time, network RTT and server time in seconds (None without requests)."""
+    if len(result['http_time_ns']) == 0:
+        return None
+    stats = {}
+    for name in ('http_time_ns', 'network_rtt_ns', 'server_time_ns'):
+        values = result[name][result[name] != NAT]
+        stats[name[:-3]] = float(np.median(values)) / 1e9 if len(values) else float('nan')
+    return stats
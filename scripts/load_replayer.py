@@ -0,0 +1,413 @@
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import shutil
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from columnar_cache import cache_dir_for, install_cache
+from latency_split import format_durations
+from percentiles import exact_quantiles
+from tshark_time import NAT, NS_PER_SECOND, format_frame_times
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_PATH = os.path.abspath(os.path.join(SCRIPT_DIR, '..'))
+DEFAULT_URL = 'http://127.0.0.1:31881'
+DEFAULT_OUTPUT = os.path.join(BASE_PATH, 'csv-data', 'replay.csv')
+# The workload of route-swap-test.js: 110 req/s, 10 min on the slow route then 50 min on the fast one
+DEFAULT_RATE = 110
+ROUTE_SWAP_SCENARIOS = [('slowRoute', 600.0), ('fastRoute', 3000.0)]
+DEFAULT_ENTITIES = 15  # preAllocatedVUs; k6 names the entity after the VU
+DEFAULT_CONNECTIONS = 20  # maximumVUs, one keep-alive connection each
+DEFAULT_PREALLOCATED = 15  # preAllocatedVUs: connections opened before the first request
+ATTRIBUTE_PATH = '/ngsi-ld/v1/entities/urn:ngsi-ld:ArtificialSensor:{}/attrs/peopleCount'
+LINK = ('<https://fiware.github.io/data-models/context.jsonld>; rel="http://www.w3.org/ns/json-ld#context"; '
+        'type="application/ld+json"')
+CSV_HEADER = ['Request Number', 'UTC Arrival Time', 'HTTP Request Time', 'Service Time',
+              'Entity', 'Scenario', 'Status']
+WRITE_ROWS = 1_000_000
+FAILED = 0  # status of requests without a response, like k6
+
+
+def parse_scenarios(scenarios: List[str]) -> List[Tuple[str, float]]:
+    """Parse NAME:SECONDS scenario arguments, run one after the other."""
+    parsed = []
+    for scenario in scenarios:
+        name, _, seconds = scenario.rpartition(':')
+        try:
+            parsed.append((name or 'default', float(seconds)))
+        except ValueError:
+            raise ValueError(f"Bad scenario '{scenario}', expected NAME:SECONDS")
+    return parsed
+
+
+def build_requests(host: str, entities: int) -> List[List[bytes]]:
+    """Raw PATCH requests of route-swap-test.js for every entity (1..entities) and value (0..9)."""
+    requests = []
+    for entity in range(1, entities + 1):
+        head = (f'PATCH {ATTRIBUTE_PATH.format(entity)} HTTP/1.1\r\nHost: {host}\r\n'
+                f'Content-Type: application/json\r\nLink: {LINK}\r\nAccept: application/json\r\n')
+        bodies = [f'{{"type":"Property","value":{value}}}'.encode() for value in range(10)]
+        requests.append([(head + f'Content-Length: {len(body)}\r\n\r\n').encode() + body for body in bodies])
+    return requests
+
+
+class _Connection(asyncio.Protocol):
+    """One keep-alive connection of the pool, with at most one request in flight."""
+
+    def __init__(self, replayer: 'Replayer'):
+        self.replayer = replayer
+        self.transport = None
+        self.buffer = b''
+        self.request: Optional[int] = None
+        self.timer = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.replayer.ready(self)
+
+    def send(self, index: int, payload: bytes) -> None:
+        self.request = index
+        self.timer = self.replayer.loop.call_later(self.replayer.timeout, self.transport.abort)
+        self.transport.write(payload)
+
+    def data_received(self, data: bytes):
+        self.buffer += data
+        end = self.buffer.find(b'\r\n\r\n')
+        if end < 0 or self.request is None:
+            return
+        head = self.buffer[:end].lower()
+        length = 0
+        found = head.find(b'\r\ncontent-length:')
+        if found >= 0:
+            stop = head.find(b'\r\n', found + 2)
+            length = int(head[found + 17:stop if stop >= 0 else len(head)])
+        if len(self.buffer) < end + 4 + length:
+            return
+        self.buffer = self.buffer[end + 4 + length:]
+        self.timer.cancel()
+        index, self.request = self.request, None
+        close = b'\r\nconnection: close' in head
+        self.replayer.completed(index, int(head[9:12]))
+        if close:
+            self.transport.close()
+        else:
+            self.replayer.ready(self)
+
+    def connection_lost(self, exc):
+        if self.timer is not None:
+            self.timer.cancel()
+        self.replayer.lost(self)
+
+
+class Replayer:
+    """
+    Open-loop constant-arrival-rate load generator over a pool of keep-alive connections.
+
+    Request i is due at a fixed time on the schedule, whatever happened to
+    the previous ones. When no connection is idle it waits in a queue (a new
+    connection is opened while the pool is below its limit), and its latency
+    is still measured from the scheduled time: that is the coordinated
+    omission correction, so a stalled broker shows up as the latency every
+    scheduled client would have seen instead of as fewer, faster samples.
+    The time from the actual send is kept as the service time.
+
+    Args:
+        url: Broker base URL (http://host:port)
+        rate: Requests per second
+        scenarios: (name, seconds) run one after the other at the same rate
+        entities: Requests cycle over urn:ngsi-ld:ArtificialSensor:1..entities
+        max_connections: Pool size limit
+        preallocated: Connections opened before the schedule starts (more are opened on demand)
+        timeout: Seconds before a request without response is failed (status 0)
+        seed: Seed of the random attribute values
+    """
+
+    def __init__(self, url: str, rate: float, scenarios: List[Tuple[str, float]], entities: int = DEFAULT_ENTITIES,
+                 max_connections: int = DEFAULT_CONNECTIONS, preallocated: int = DEFAULT_PREALLOCATED,
+                 timeout: float = 60.0, seed: Optional[int] = None):
+        parts = urlsplit(url)
+        if parts.scheme != 'http' or not parts.hostname:
+            raise ValueError(f"Only http://host:port URLs are supported, got {url}")
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.requests = build_requests(parts.netloc, entities)
+        self.rate = rate
+        self.labels = [name for name, _ in scenarios]
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.preallocated = min(preallocated, max_connections)
+        self.random = random.Random(seed)
+
+        # The whole schedule is known up front: intended send times in ns since the start
+        counts = [int(round(rate * seconds)) for _, seconds in scenarios]
+        starts = np.cumsum([0] + [seconds for _, seconds in scenarios])[:-1]
+        self.intended = np.concatenate([np.int64(round(start * NS_PER_SECOND)) +
+                                        (np.arange(count, dtype=np.int64) * NS_PER_SECOND / rate).astype(np.int64)
+                                        for start, count in zip(starts, counts)] or [np.empty(0, dtype=np.int64)])
+        self.scenario = np.repeat(np.arange(len(counts), dtype=np.int16), counts)
+        self.entity = np.arange(len(self.intended), dtype=np.int64) % entities + 1
+        self.sent = np.full(len(self.intended), NAT, dtype=np.int64)
+        self.done = np.full(len(self.intended), NAT, dtype=np.int64)
+        self.status = np.zeros(len(self.intended), dtype=np.int64)
+
+        self.loop = None
+        self.base_ns = 0
+        self.wall_base_ns = 0
+        self.idle: deque = deque()
+        self.queue: deque = deque()
+        self.connections = 0
+        self.peak_connections = 0
+        self.peak_queue = 0
+        self.finished = 0
+        self.all_done = None
+
+    def __len__(self) -> int:
+        return len(self.intended)
+
+    def now(self) -> int:
+        return time.monotonic_ns() - self.base_ns
+
+    def dispatch(self, index: int) -> None:
+        if self.idle:
+            self._send(self.idle.pop(), index)
+            return
+        self.queue.append(index)
+        self.peak_queue = max(self.peak_queue, len(self.queue))
+        if self.connections < self.max_connections:
+            self.connections += 1
+            self.peak_connections = max(self.peak_connections, self.connections)
+            self.loop.create_task(self._connect())
+
+    def _send(self, connection: _Connection, index: int) -> None:
+        self.sent[index] = self.now()
+        connection.send(index, self.requests[self.entity[index] - 1][self.random.randrange(10)])
+
+    async def _connect(self) -> None:
+        try:
+            await self.loop.create_connection(lambda: _Connection(self), self.host, self.port)
+        except OSError as e:
+            self.connections -= 1
+            if self.queue:
+                # Fail one waiting request per refused attempt, so an unreachable broker cannot stall the run
+                self.completed(self.queue.popleft(), FAILED)
+            if self.finished == 0 and self.connections == 0:
+                print(f"Warning: cannot connect to {self.host}:{self.port}: {e}")
+
+    def ready(self, connection: _Connection) -> None:
+        """A connection is free: serve the oldest waiting request, or park it."""
+        if self.queue:
+            self._send(connection, self.queue.popleft())
+        else:
+            self.idle.append(connection)
+
+    def completed(self, index: int, status: int) -> None:
+        self.done[index] = self.now()
+        self.status[index] = status
+        self.finished += 1
+        if self.finished == len(self):
+            self.all_done.set()
+
+    def lost(self, connection: _Connection) -> None:
+        self.connections -= 1
+        if connection in self.idle:
+            self.idle.remove(connection)
+        if connection.request is not None:
+            self.completed(connection.request, FAILED)
+            connection.request = None
+        if self.queue and self.connections < self.max_connections:
+            self.connections += 1
+            self.loop.create_task(self._connect())
+
+    async def run(self) -> None:
+        """Send the whole schedule and wait for the last response."""
+        self.loop = asyncio.get_running_loop()
+        self.all_done = asyncio.Event()
+        if len(self) == 0:
+            return
+        # Connect up front, so the first requests do not pay for the handshakes
+        self.connections = self.preallocated
+        await asyncio.gather(*(self._connect() for _ in range(self.preallocated)))
+        self.peak_connections = self.connections
+        self.base_ns = time.monotonic_ns()
+        self.wall_base_ns = time.time_ns()
+        intended = self.intended
+        index = 0
+        while index < len(self):
+            now = self.now()
+            while index < len(self) and intended[index] <= now:
+                self.dispatch(index)
+                index += 1
+            if index < len(self):
+                await asyncio.sleep(max(0, int(intended[index]) - self.now()) / NS_PER_SECOND)
+        await self.all_done.wait()
+        for connection in list(self.idle):
+            connection.transport.close()
+
+    def trim(self) -> None:
+        """Drop the end of the schedule that was never sent (after an interrupted run)."""
+        started = np.flatnonzero((self.sent != NAT) | (self.done != NAT))
+        end = int(started[-1]) + 1 if len(started) else 0
+        for name in ('intended', 'scenario', 'entity', 'sent', 'done', 'status'):
+            setattr(self, name, getattr(self, name)[:end])
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """
+        Per-request results: wall-clock arrival, corrected latency and service time in ns.
+
+        Failed requests (refused or lost connections) keep the time they
+        failed at but have no latency (NAT), so they are not taken for very
+        fast responses.
+        """
+        finished = self.done != NAT
+        answered = finished & (self.status != FAILED)
+        return {
+            'Request Number': np.arange(1, len(self) + 1, dtype=np.int64),
+            'UTC Arrival Time': np.where(finished, self.wall_base_ns + self.done, NAT),
+            'HTTP Request Time': np.where(answered, self.done - self.intended, NAT),
+            'Service Time': np.where(answered & (self.sent != NAT), self.done - self.sent, NAT),
+            'Entity': self.entity,
+            'Scenario': self.scenario,
+            'Status': self.status,
+        }
+
+    def report(self) -> str:
+        """Achieved rate, send lag and latency percentiles of the run."""
+        if len(self) == 0:
+            return 'No requests scheduled'
+        columns = self.columns()
+        sent = self.sent != NAT
+        elapsed = (self.done[self.done != NAT].max() if (self.done != NAT).any() else 0) / NS_PER_SECOND
+        lines = [f"{len(self):,} requests scheduled at {self.rate:g}/s, {int(sent.sum()):,} sent, "
+                 f"{int((self.status == FAILED).sum()):,} failed, "
+                 f"{len(self) / max(elapsed, 1e-9):,.0f} req/s over {elapsed:.1f} s",
+                 f"Connections: {self.peak_connections} (limit {self.max_connections}), "
+                 f"queued requests: at most {self.peak_queue:,}"]
+        lag = (self.sent - self.intended)[sent]
+        if len(lag):
+            p50, p99 = exact_quantiles(lag / 1e6, [50, 99])
+            lines.append(f"Send lag behind schedule (ms): median {p50:.3f}, p99 {p99:.3f}, max {lag.max() / 1e6:.3f}")
+        for name in ('HTTP Request Time', 'Service Time'):
+            values = columns[name][columns[name] != NAT] / 1e6
+            if len(values):
+                p50, p99, p999 = exact_quantiles(values, [50, 99, 99.9])
+                lines.append(f"{name} (ms): median {p50:.3f}, p99 {p99:.3f}, p99.9 {p999:.3f}")
+        return '\n'.join(lines)
+
+
+def _csv_field(label: str) -> str:
+    if any(c in label for c in ',"\n\r'):
+        return '"' + label.replace('"', '""') + '"'
+    return label
+
+
+def write_results(replayer: Replayer, output_file: str, chunk_rows: int = WRITE_ROWS) -> int:
+    """
+    Write the requests of a run as CSV, together with its columnar cache.
+
+    Times are written like the tshark-derived CSVs (frame.time_utc arrival
+    time, durations in seconds with nine decimals), so the extractor and
+    the plots read the file as they read a capture; the cache is published
+    with the CSV so they memory-map the columns without parsing it.
+
+    Returns:
+        Number of rows written
+    """
+    columns = replayer.columns()
+    labels = [_csv_field(label) for label in replayer.labels]
+    output_dir = os.path.dirname(os.path.abspath(output_file))
+    os.makedirs(output_dir, exist_ok=True)
+    tmp_csv = f'{output_file}.tmp-{os.getpid()}'
+    tmp_cache = f'{cache_dir_for(output_file)}.tmp-{os.getpid()}'
+    digest = hashlib.sha256()
+    try:
+        with open(tmp_csv, 'wb') as f:
+            header = (','.join(CSV_HEADER) + '\n').encode()
+            f.write(header)
+            digest.update(header)
+            for start in range(0, len(replayer), chunk_rows):
+                rows = slice(start, start + chunk_rows)
+                arrivals = columns['UTC Arrival Time'][rows]
+                frame_times = ['' if ns == NAT else f'"{text}"'
+                               for text, ns in zip(format_frame_times(arrivals).tolist(), arrivals.tolist())]
+                text = ''.join(f'{number},{frame_time},{http_time},{service},{entity},{labels[scenario]},{status}\n'
+                               for number, frame_time, http_time, service, entity, scenario, status in zip(
+                                   columns['Request Number'][rows].tolist(), frame_times,
+                                   format_durations(columns['HTTP Request Time'][rows]),
+                                   format_durations(columns['Service Time'][rows]),
+                                   columns['Entity'][rows].tolist(), columns['Scenario'][rows].tolist(),
+                                   columns['Status'][rows].tolist())).encode()
+                f.write(text)
+                digest.update(text)
+        os.replace(tmp_csv, output_file)
+
+        # Columns as build_cache would parse them from the CSV
+        shutil.rmtree(tmp_cache, ignore_errors=True)
+        os.makedirs(tmp_cache)
+        cached = []
+        for name in CSV_HEADER:
+            array = columns[name]
+            if name == 'Scenario':
+                continue  # text, not cached
+            if name in ('HTTP Request Time', 'Service Time'):
+                if not (array != NAT).any():
+                    continue
+                array = np.where(array == NAT, np.nan, array / NS_PER_SECOND)
+            file_name = f'{CSV_HEADER.index(name):03d}.npy'
+            np.save(os.path.join(tmp_cache, file_name), array)
+            cached.append({'name': name, 'file': file_name, 'dtype': str(array.dtype)})
+        install_cache(output_file, tmp_cache, CSV_HEADER, CSV_HEADER, cached, len(replayer), sha256=digest.hexdigest())
+    finally:
+        shutil.rmtree(tmp_cache, ignore_errors=True)
+        if os.path.exists(tmp_csv):
+            os.remove(tmp_csv)
+    return len(replayer)
+
+
+def main():
+    """Main function with command line argument parsing."""
+    parser = argparse.ArgumentParser(
+        description='Replay the route-swap-test.js workload (PATCH peopleCount at a constant arrival rate)')
+    parser.add_argument('--url', default=DEFAULT_URL,
+                        help=f'Broker base URL (default: {DEFAULT_URL}, see stand_in_broker.py)')
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE,
+                        help=f'Requests per second (default: {DEFAULT_RATE})')
+    parser.add_argument('--scenario', action='append', default=[], metavar='NAME:SECONDS',
+                        help='Scenario run at the rate, repeat to chain them '
+                             '(default: slowRoute:600 then fastRoute:3000, like route-swap-test.js)')
+    parser.add_argument('--entities', type=int, default=DEFAULT_ENTITIES,
+                        help=f'Entities updated in turn (default: {DEFAULT_ENTITIES})')
+    parser.add_argument('--connections', type=int, default=DEFAULT_CONNECTIONS,
+                        help=f'Maximum keep-alive connections (default: {DEFAULT_CONNECTIONS})')
+    parser.add_argument('--preallocated', type=int, default=DEFAULT_PREALLOCATED,
+                        help=f'Connections opened before the first request (default: {DEFAULT_PREALLOCATED})')
+    parser.add_argument('--timeout', type=float, default=60.0, help='Request timeout in seconds (default: 60)')
+    parser.add_argument('--seed', type=int, help='Seed of the random peopleCount values')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='Output CSV (default: csv-data/replay.csv)')
+    args = parser.parse_args()
+
+    try:
+        scenarios = parse_scenarios(args.scenario) if args.scenario else ROUTE_SWAP_SCENARIOS
+        replayer = Replayer(args.url, args.rate, scenarios, args.entities, args.connections,
+                            args.preallocated, args.timeout, args.seed)
+    except ValueError as e:
+        parser.error(str(e))
+    print(f"Replaying {len(replayer):,} requests at {args.rate:g}/s against {args.url}: "
+          + ', '.join(f'{name} {seconds:g} s' for name, seconds in scenarios), flush=True)
+    try:
+        asyncio.run(replayer.run())
+    except KeyboardInterrupt:
+        print("Interrupted, keeping the requests sent so far")
+        replayer.trim()
+    print(replayer.report())
+    rows = write_results(replayer, args.output)
+    print(f"{rows:,} requests written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from columnar_cache import CACHE_DIR_NAME, load_columns
+from csv_index import read_range
+from dataset import Dataset
+from quantile_sketch import LogHistogram, merge_sketches
+
+HISTOGRAM_CACHE_VERSION = 2
+CHUNK_SIZE = 1_000_000
+MIN_BINS = 10
+FALLBACK_BINS = 100
+
+
+def iter_chunks(values: np.ndarray, chunk_size: int = CHUNK_SIZE):
+    """Yield the positive, non-NaN values of an array chunk by chunk."""
+    for start in range(0, len(values), chunk_size):
+        chunk = np.asarray(values[start:start + chunk_size], dtype=np.float64)
+        yield chunk[chunk > 0]  # also drops NaNs
+
+
+def freedman_diaconis_log_edges(sketch: LogHistogram) -> np.ndarray:
+    """
+    Log-spaced bin edges following the Freedman-Diaconis rule in log10 space.
+
+    The quartiles, minimum and maximum come from a quantile sketch, so the
+    edges can be chosen without holding the values in memory (the sketch's
+    relative error is negligible once moved to log space).
+
+    Args:
+        sketch: Sketch of the positive values of every series sharing the edges
+
+    Returns:
+        Bin edges spaced evenly in log10
+    """
+    low, high = np.log10(sketch.min), np.log10(sketch.max)
+    q25, q75 = np.log10(sketch.quantiles([0.25, 0.75]))
+    bin_width = 2 * (q75 - q25) / sketch.count ** (1 / 3)
+    if bin_width <= 0 or high <= low:
+        bin_count = FALLBACK_BINS
+    else:
+        bin_count = max(MIN_BINS, int((high - low) / bin_width))
+    if high <= low:
+        return np.logspace(low - 0.5, high + 0.5, bin_count + 1)
+    edges = np.logspace(low, high, bin_count + 1)
+    # Pin the outer edges so rounding in logspace cannot drop the extremes
+    edges[0], edges[-1] = sketch.min, sketch.max
+    return edges
+
+
+def density_counts(values: np.ndarray, edges: np.ndarray, scale: float = 1.0,
+                   chunk_size: int = CHUNK_SIZE) -> np.ndarray:
+    """
+    Probability density of the positive values of an array (times scale) over fixed edges.
+
+    Counts are accumulated chunk by chunk, so a memory-mapped column is never
+    copied as a whole. The density integrates to one over the bins, like
+    sns.histplot(stat='density').
+    """
+    counts = np.zeros(len(edges) - 1, dtype=np.int64)
+    for chunk in iter_chunks(values, chunk_size):
+        counts += np.histogram(chunk * scale, bins=edges)[0]
+    total = counts.sum()
+    if total == 0:
+        return counts.astype(np.float64)
+    return counts / (total * np.diff(edges))
+
+
+def _cache_path(csv_paths: List[str], column: str, scale: float, time_range=None) -> str:
+    """Return the cache file for the histograms of a set of CSV files."""
+    signature = []
+    for path in csv_paths:
+        stat = os.stat(path)
+        signature.append([os.path.abspath(path), stat.st_size, stat.st_mtime_ns])
+    key = [HISTOGRAM_CACHE_VERSION, signature, column, scale]
+    if time_range is not None:
+        key.append(list(time_range))
+    key = json.dumps(key)
+    digest = hashlib.sha256(key.encode()).hexdigest()[:16]
+    directory = os.path.join(os.path.dirname(os.path.abspath(csv_paths[0])), CACHE_DIR_NAME, 'histograms')
+    return os.path.join(directory, f'{digest}.npz')
+
+
+def series_histograms(series: Dict[str, np.ndarray],
+                      scale: float = 1.0) -> Tuple[np.ndarray, Dict[str, Optional[np.ndarray]]]:
+    """
+    Log-binned density histograms of several arrays (times scale), on shared edges.
+
+    Both passes (sketching for the edges, then counting) go chunk by chunk,
+    so memory-mapped columns are never copied as a whole.
+
+    Returns:
+        Tuple of (edges, {label: density or None when the series has no positive values})
+    """
+    sketches = []
+    for values in series.values():
+        sketch = LogHistogram()
+        for chunk in iter_chunks(values):
+            sketch.update(chunk * scale)
+        sketches.append(sketch)
+    merged = merge_sketches(sketches)
+    if merged is None or merged.count == 0:
+        return np.logspace(0, 1, 2), {label: None for label in series}
+    edges = freedman_diaconis_log_edges(merged)
+    densities = {}
+    for (label, values), sketch in zip(series.items(), sketches):
+        densities[label] = None if sketch.count == 0 else density_counts(values, edges, scale)
+    return edges, densities
+
+
+def dataset_histograms(dataset: Dataset) -> Tuple[np.ndarray, Dict[str, Optional[np.ndarray]]]:
+    """
+    Log-binned density histograms of every path of a dataset, on shared edges.
+
+    Returns:
+        Tuple of (edges, {label: density or None when the path has no positive values})
+    """
+    return series_histograms({view.label: view.values for view in dataset})
+
+
+def log_histograms(csv_paths: Dict[str, str], column: str = 'HTTP Request Time', scale: float = 1000,
+                   use_cache: bool = True, time_range: Optional[Tuple] = None,
+                   time_column: str = 'UTC Arrival Time') -> Tuple[np.ndarray, Dict[str, Optional[np.ndarray]]]:
+    """
+    Log-binned density histograms of one column of several CSV files.
+
+    All series share the same log-spaced edges. The result is cached next to
+    the data, keyed by the size and modification time of every input, so
+    re-rendering a figure only loads a few kilobytes.
+
+    Args:
+        csv_paths: Mapping of series label to CSV file
+        column: Column holding the values
+        scale: Factor applied to the values (1000 turns seconds into ms)
+        use_cache: Read and write the on-disk cache
+        time_range: (start, end) bounds on time_column (see csv_index.parse_bound);
+            only the rows in range are read, through the block index of each file
+        time_column: Column the time range applies to
+
+    Returns:
+        Tuple of (edges, {label: density or None when the series has no positive values})
+    """
+    labels = list(csv_paths)
+    cache_path = _cache_path(list(csv_paths.values()), column, scale, time_range)
+    if use_cache and os.path.exists(cache_path):
+        with np.load(cache_path) as cached:
+            densities = {label: cached[f'density_{i}'] if f'density_{i}' in cached else None
+                         for i, label in enumerate(labels)}
+            return cached['edges'], densities
+
+    # Memory-mapped columns, read chunk by chunk: memory does not grow with the number of requests
+    if time_range is not None:
+        series = {label: read_range(path, time_column, *time_range, columns=[column]).get(column, np.empty(0))
+                  for label, path in csv_paths.items()}
+    else:
+        series = {label: load_columns(path, [column]).get(column, np.empty(0)) for label, path in csv_paths.items()}
+    edges, densities = series_histograms(series, scale)
+
+    if use_cache:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        arrays = {f'density_{i}': densities[label] for i, label in enumerate(labels) if densities[label] is not None}
+        tmp_path = f'{cache_path}.tmp-{os.getpid()}.npz'
+        np.savez(tmp_path, edges=edges, **arrays)
+        os.replace(tmp_path, cache_path)
+    return edges, densities
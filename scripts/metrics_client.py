@@ -0,0 +1,144 @@
+import argparse
+import http.client
+import json
+import os
+import socket
+import sys
+from typing import Dict, List, Optional
+from urllib.parse import urlencode
+
+from compressed_io import find_input
+
+# Standard library only (compressed_io included): the client starts in
+# milliseconds and leaves numpy, pandas and the data to the long-running
+# metrics_service.py
+DEFAULT_PORT = 8765
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_PATH = os.path.abspath(os.path.join(SCRIPT_DIR, '..'))
+PRESETS = {
+    '24h': ['24h-polka-3.csv', '24h-polka-2.csv', '24h-ip.csv', '24h-polka-1.csv'],
+    'stress': ['stress-ip.csv', 'stress-polka-1.csv', 'stress-polka-2.csv', 'stress-polka-3.csv'],
+}
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP connection over a Unix domain socket."""
+
+    def __init__(self, socket_path: str, timeout: float = 60):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def query(endpoint: str, params: Dict, port: int = DEFAULT_PORT, socket_path: Optional[str] = None,
+          timeout: float = 600) -> Dict:
+    """
+    Send one query to the metrics service and return its JSON answer.
+
+    Args:
+        endpoint: 'stats', 'histogram', 'windows' or 'status'
+        params: Query parameters; list values are repeated (file=a&file=b)
+        port: Service port on 127.0.0.1
+        socket_path: Unix socket of the service (instead of the port)
+        timeout: Seconds to wait; the first query of a file builds its dataset
+
+    Returns:
+        The decoded answer
+
+    Raises:
+        RuntimeError: when the service rejects the query
+    """
+    if socket_path:
+        connection = UnixHTTPConnection(socket_path, timeout)
+    else:
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        connection.request('GET', f'/{endpoint}?' + urlencode({k: v for k, v in params.items() if v is not None},
+                                                               doseq=True))
+        response = connection.getresponse()
+        body = json.loads(response.read())
+    finally:
+        connection.close()
+    if response.status != 200:
+        raise RuntimeError(body.get('error', f'HTTP {response.status}'))
+    return body
+
+
+def print_windows(answer: Dict) -> None:
+    """Print a window series as CSV (window start in epoch ns, or ns since midnight with fold_day)."""
+    print('start_ns,count,mean,' + ','.join(f"p{q:g}" for q in answer['percentiles']))
+    for start, count, mean, quantiles in zip(answer['start_ns'], answer['count'], answer['mean'],
+                                             answer['quantiles']):
+        print(f"{start},{count},{mean:.6f}," + ','.join(f'{value:.6f}' for value in quantiles))
+
+
+def print_histogram(answer: Dict) -> None:
+    """Print log-binned densities as CSV, one row per bin."""
+    labels = list(answer['densities'])
+    print('low,high,' + ','.join(labels))
+    edges = answer['edges']
+    for i in range(len(edges) - 1):
+        cells = ['' if answer['densities'][label] is None else f"{answer['densities'][label][i]:.6g}"
+                 for label in labels]
+        print(f'{edges[i]:.6g},{edges[i + 1]:.6g},' + ','.join(cells))
+
+
+def main():
+    """Main function with command line argument parsing."""
+    parser = argparse.ArgumentParser(description='Query a running metrics_service.py')
+    parser.add_argument('files', nargs='*', help='CSV files to analyze')
+    parser.add_argument('--preset', choices=sorted(PRESETS), help='Use predefined file sets')
+    parser.add_argument('--query', choices=['stats', 'histogram', 'windows', 'status'], default='stats',
+                        help='What to ask for (default: stats, printed like 24h-extract-result-metrics.py)')
+    parser.add_argument('--percentiles', help='Comma-separated percentiles, e.g. 50,90,95,99')
+    parser.add_argument('--column', help='Value column (default: detected from the header)')
+    parser.add_argument('--from', dest='range_from', metavar='START',
+                        help='Only rows arriving at or after START (2025-06-11T18:00, 18:00 or +2h)')
+    parser.add_argument('--to', dest='range_to', metavar='END', help='Only rows arriving at or before END')
+    parser.add_argument('--window', type=float, default=300, help='Window length in seconds (default: 300)')
+    parser.add_argument('--time-of-day', action='store_true', help='Fold the windows onto one 0-24 h day')
+    parser.add_argument('--scale', type=float, default=1000,
+                        help='Factor applied to histogram and window values (default: 1000, seconds to ms)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'Service port (default: {DEFAULT_PORT})')
+    parser.add_argument('--socket', metavar='PATH', help='Unix socket of the service')
+    parser.add_argument('--json', action='store_true', help='Print the raw JSON answer')
+    args = parser.parse_args()
+
+    files: List[str] = [os.path.abspath(path) for path in args.files]
+    if args.preset:
+        files = [find_input(os.path.join(BASE_PATH, 'csv-data', name)) for name in PRESETS[args.preset]]
+    if args.query == 'windows' and len(files) != 1:
+        parser.error('--query windows takes exactly one file')
+    if args.query in ('stats', 'histogram') and not files:
+        parser.error('no file given')
+
+    params = {'file': files, 'percentiles': args.percentiles, 'column': args.column,
+              'from': args.range_from, 'to': args.range_to}
+    if args.query == 'windows':
+        params.update(window=args.window, fold_day=int(args.time_of_day), scale=args.scale)
+    elif args.query == 'histogram':
+        params.update(scale=args.scale)
+    try:
+        answer = query(args.query, params, args.port, args.socket)
+    except (ConnectionError, FileNotFoundError) as e:
+        sys.exit(f"Cannot reach the metrics service ({e}); start it with scripts/metrics_service.py")
+    except RuntimeError as e:
+        sys.exit(f"Error: {e}")
+
+    if args.json or args.query == 'status':
+        print(json.dumps(answer, indent=1))
+    elif args.query == 'stats':
+        print(answer['text'], end='')
+    elif args.query == 'windows':
+        print_windows(answer)
+    else:
+        print_histogram(answer)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,383 @@
+import argparse
+import contextlib
+import glob
+import hashlib
+import importlib.util
+import io
+import json
+import os
+import shutil
+import socketserver
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from columnar_cache import CACHE_DIR_NAME, directory_lock
+from compressed_io import open_input
+from csv_index import resolve_range
+from dataset import Dataset
+from log_histogram import dataset_histograms
+from percentiles import parse_percentiles
+from time_windows import TREND_PERCENTILES, window_series
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PORT = 8765
+DATASET_CACHE_VERSION = 1
+RESULT_CACHE_SIZE = 4096
+TIME_COLUMN = 'UTC Arrival Time'
+
+
+def _load_script(file_name: str):
+    """Import one of the dash-named scripts of this directory as a module."""
+    spec = importlib.util.spec_from_file_location(file_name[:-3].replace('-', '_'),
+                                                  os.path.join(SCRIPT_DIR, file_name))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# Statistics and reports are those of the extractor, so answers match it exactly
+extractor = _load_script('24h-extract-result-metrics.py')
+
+
+class QueryError(ValueError):
+    """A query the service cannot answer (reported to the client as HTTP 400)."""
+
+
+def _signature(csv_path: str) -> Tuple[int, int]:
+    stat = os.stat(csv_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _dataset_dir(csv_path: str, column: str, signature: Tuple[int, int]) -> str:
+    """Directory of the memory-mappable dataset of one column of a CSV file version."""
+    key = json.dumps([DATASET_CACHE_VERSION, os.path.abspath(csv_path), column, list(signature)])
+    directory = os.path.join(os.path.dirname(os.path.abspath(csv_path)), CACHE_DIR_NAME, 'datasets')
+    return os.path.join(directory, f'{os.path.basename(csv_path)}-{hashlib.sha256(key.encode()).hexdigest()[:16]}')
+
+
+def open_dataset(csv_path: str, column: Optional[str] = None) -> Tuple[Dataset, str]:
+    """
+    Memory-map the dataset of one column of a CSV file, building it on first use.
+
+    The values are kept as float64 (so statistics match the extractor) and,
+    when the file has arrival times, sorted by time so ranges are slices.
+    The dataset is stored next to the data, named after the size and
+    modification time of the file, so a changed file gets a new one and
+    older versions are removed.
+
+    Returns:
+        Tuple of (dataset with one path labelled by the file name, value column)
+    """
+    if column is None:
+        column = extractor.find_timing_column(csv_path)
+        if column is None:
+            raise QueryError(f"{csv_path}: no timing column")
+    signature = _signature(csv_path)
+    directory = _dataset_dir(csv_path, column, signature)
+    # Built under the dataset's lock, so another service process does not build it twice
+    with directory_lock(directory):
+        if not os.path.exists(os.path.join(directory, 'meta.json')):
+            with open_input(csv_path, block_size=1 << 16, prefetch=1) as f:
+                header = extractor.pd.read_csv(f, nrows=0).columns
+            if column not in header:
+                raise QueryError(f"{csv_path}: no column '{column}'")
+            time_column = TIME_COLUMN if TIME_COLUMN in header and column != TIME_COLUMN else None
+            dataset = Dataset.from_csv({os.path.basename(csv_path): csv_path}, column, time_column,
+                                       dtype=np.float64)
+            dataset.save(directory)
+            for stale in glob.glob(os.path.join(os.path.dirname(directory), f'{os.path.basename(csv_path)}-*')):
+                if stale != directory and '.tmp-' not in stale and not stale.endswith('.lock'):
+                    shutil.rmtree(stale, ignore_errors=True)
+        return Dataset.load(directory), column
+
+
+class MetricsService:
+    """
+    Statistics, histograms and window series of CSV files, answered from memory.
+
+    Datasets are memory-mapped once per file version and every result is
+    kept in an LRU cache keyed by (query, file, file version, column, range,
+    percentiles...). Each query checks the size and modification time of its
+    files, so a file that changed is reloaded and its old results dropped.
+    """
+
+    def __init__(self, cache_size: int = RESULT_CACHE_SIZE):
+        self.cache_size = cache_size
+        self.lock = threading.Lock()
+        self.datasets: Dict[Tuple[str, Optional[str]], Tuple[Tuple[int, int], Dataset, str]] = {}
+        self.loading: Dict[Tuple[str, Optional[str]], threading.Lock] = {}
+        self.results: 'OrderedDict[tuple, Dict]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.print_lock = threading.Lock()
+
+    def dataset(self, csv_path: str, column: Optional[str]) -> Tuple[Tuple[int, int], Dataset, str]:
+        """Current (signature, dataset, column) of a file, reloaded when the file changed."""
+        csv_path = os.path.abspath(csv_path)
+        if not os.path.exists(csv_path):
+            raise QueryError(f"File not found: {csv_path}")
+        key = (csv_path, column)
+        signature = _signature(csv_path)
+        with self.lock:
+            entry = self.datasets.get(key)
+            if entry is not None and entry[0] == signature:
+                return entry
+            loading = self.loading.setdefault(key, threading.Lock())
+        with loading:  # one thread builds, the others wait for it
+            with self.lock:
+                entry = self.datasets.get(key)
+                if entry is not None and entry[0] == signature:
+                    return entry
+            dataset, resolved = open_dataset(csv_path, column)
+            entry = (signature, dataset, resolved)
+            with self.lock:
+                self.datasets[key] = entry
+                # Results of older versions of the file can no longer be asked for
+                for cached in [k for k in self.results if k[1] == csv_path and k[2] != signature]:
+                    del self.results[cached]
+            return entry
+
+    def cached(self, key: tuple, compute):
+        """Return the cached result of key, computing and storing it on a miss."""
+        with self.lock:
+            if key in self.results:
+                self.results.move_to_end(key)
+                self.hits += 1
+                return self.results[key], True
+            self.misses += 1
+        result = compute()
+        with self.lock:
+            self.results[key] = result
+            while len(self.results) > self.cache_size:
+                self.results.popitem(last=False)
+        return result, False
+
+    def values(self, csv_path: str, column: Optional[str], start, end):
+        """(signature, resolved column, timestamps, values) of a file, restricted to [start, end]."""
+        signature, dataset, column = self.dataset(csv_path, column)
+        view = dataset.path(dataset.labels[0])
+        if start is None and end is None:
+            return signature, column, view.timestamps, view.values
+        if view.timestamps is None:
+            raise QueryError(f"{csv_path}: no '{TIME_COLUMN}' column for a time range")
+        origin = int(view.timestamps[0]) if len(view) else None
+        try:
+            low, high = resolve_range('time', origin, start, end)
+        except ValueError as e:
+            raise QueryError(str(e))
+        view = view.between(low, None if high is None else high + 1)
+        return signature, column, view.timestamps, view.values
+
+    def stats(self, files: List[str], percentiles: List[float], column: Optional[str] = None,
+              start=None, end=None) -> Dict:
+        """Exact statistics of every file, plus the extractor's text report."""
+        results = []
+        for csv_path in files:
+            signature, resolved, _, values = self.values(csv_path, column, start, end)
+            key = ('stats', os.path.abspath(csv_path), signature, resolved, start, end, tuple(percentiles))
+            stats, hit = self.cached(key, lambda: extractor.calculate_statistics(values, percentiles))
+            results.append({'file': os.path.basename(csv_path), 'column': resolved, 'cached': hit, 'stats': stats})
+        return {'results': results, 'text': self.report(results)}
+
+    def report(self, results: List[Dict]) -> str:
+        """The extractor's printed report of a set of statistics."""
+        output = io.StringIO()
+        # redirect_stdout swaps the process-wide sys.stdout: one report at a time
+        with self.print_lock, contextlib.redirect_stdout(output):
+            print("=" * 80)
+            print("NETWORK PERFORMANCE METRICS EXTRACTION")
+            print("=" * 80)
+            print()
+            for result in results:
+                if result['stats']['count'] > 0:
+                    extractor.print_file_statistics(result['file'], result['stats'])
+                else:
+                    print(f"No data extracted from: {result['file']}")
+                    print()
+            with_data = [(result['file'], result['stats']) for result in results if result['stats']['count'] > 0]
+            if len(with_data) > 1:
+                extractor.print_comparison_table(with_data)
+        return output.getvalue()
+
+    def histogram(self, files: List[str], column: Optional[str] = None, scale: float = 1000,
+                  start=None, end=None) -> Dict:
+        """Log-binned densities of the files on shared edges (like 24h-histogram.png)."""
+        # Several files: the key names the version of each one instead of a single file
+        views, key = [], ('histogram', None, None, scale, start, end)
+        for csv_path in files:
+            signature, resolved, _, values = self.values(csv_path, column, start, end)
+            views.append((os.path.basename(csv_path), values))
+            key += ((os.path.abspath(csv_path), signature, resolved),)
+
+        def compute():
+            counts = [len(values) for _, values in views]
+            dataset = Dataset([label for label, _ in views], counts, None,
+                              np.concatenate([values for _, values in views]) * scale if views else np.empty(0))
+            edges, densities = dataset_histograms(dataset)
+            return {'edges': edges.tolist(),
+                    'densities': {label: None if density is None else density.tolist()
+                                  for label, density in densities.items()}}
+        result, hit = self.cached(key, compute)
+        return dict(result, cached=hit)
+
+    def windows(self, csv_path: str, window_s: float, percentiles: List[float], fold_day: bool = False,
+                column: Optional[str] = None, scale: float = 1000, start=None, end=None) -> Dict:
+        """Per-window count, mean and percentiles of one file (see time_windows.window_series)."""
+        signature, resolved, timestamps, values = self.values(csv_path, column, start, end)
+        if timestamps is None:
+            raise QueryError(f"{csv_path}: no '{TIME_COLUMN}' column for windows")
+        window_ns = int(round(window_s * 1e9))
+        if window_ns <= 0:
+            raise QueryError('window must be positive')
+        key = ('windows', os.path.abspath(csv_path), signature, resolved, start, end, tuple(percentiles),
+               window_ns, fold_day, scale)
+
+        def compute():
+            series = window_series(timestamps, values, window_ns, percentiles, fold_day, scale=scale)
+            return {'start_ns': series['start_ns'].tolist(), 'count': series['count'].tolist(),
+                    'mean': series['mean'].tolist(), 'quantiles': series['quantiles'].tolist(),
+                    'percentiles': list(percentiles), 'window_ns': window_ns, 'fold_day': fold_day}
+        result, hit = self.cached(key, compute)
+        return dict(result, cached=hit)
+
+    def status(self) -> Dict:
+        with self.lock:
+            return {'pid': os.getpid(), 'files': sorted({path for path, _ in self.datasets}),
+                    'cached_results': len(self.results), 'hits': self.hits, 'misses': self.misses}
+
+
+def _params(query: Dict[str, List[str]]) -> Dict:
+    """Common query parameters: files, column, percentiles and time range."""
+    def first(name, default=None):
+        return query.get(name, [default])[0]
+    try:
+        percentiles = parse_percentiles(first('percentiles')) if first('percentiles') else None
+        scale = float(first('scale', 1000))
+    except ValueError as e:
+        raise QueryError(str(e))
+    return {'files': query.get('file', []), 'column': first('column'), 'percentiles': percentiles,
+            'scale': scale, 'start': first('from'), 'end': first('to'), 'first': first}
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """GET /stats, /histogram, /windows and /status, answered as JSON."""
+
+    service: MetricsService = None
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        started = time.perf_counter()
+        url = urlparse(self.path)
+        try:
+            params = _params(parse_qs(url.query))
+            service = self.service
+            if url.path == '/status':
+                body = service.status()
+            elif url.path == '/stats':
+                if not params['files']:
+                    raise QueryError('at least one file= parameter is needed')
+                body = service.stats(params['files'], params['percentiles'] or extractor.DEFAULT_PERCENTILES,
+                                     params['column'], params['start'], params['end'])
+            elif url.path == '/histogram':
+                if not params['files']:
+                    raise QueryError('at least one file= parameter is needed')
+                body = service.histogram(params['files'], params['column'], params['scale'],
+                                         params['start'], params['end'])
+            elif url.path == '/windows':
+                if len(params['files']) != 1:
+                    raise QueryError('exactly one file= parameter is needed')
+                try:
+                    window = float(params['first']('window', 300))
+                except ValueError as e:
+                    raise QueryError(str(e))
+                body = service.windows(params['files'][0], window, params['percentiles'] or TREND_PERCENTILES,
+                                       params['first']('fold_day', '0') in ('1', 'true', 'yes'), params['column'],
+                                       params['scale'], params['start'], params['end'])
+            else:
+                self.send_json(404, {'error': f'unknown endpoint {url.path}'})
+                return
+            body['elapsed_ms'] = (time.perf_counter() - started) * 1000
+            self.send_json(200, body)
+        except QueryError as e:
+            self.send_json(400, {'error': str(e)})
+        except Exception as e:
+            self.send_json(500, {'error': f'{type(e).__name__}: {e}'})
+
+    def send_json(self, status: int, body: Dict) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def address_string(self) -> str:
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """HTTP server on a Unix domain socket, one thread per connection."""
+    daemon_threads = True
+
+    def server_bind(self):
+        socketserver.UnixStreamServer.server_bind(self)
+        self.server_name, self.server_port = 'localhost', 0
+
+
+def make_server(service: MetricsService, port: int = DEFAULT_PORT, socket_path: Optional[str] = None,
+                verbose: bool = False):
+    """HTTP server of a service, on localhost:port or on a Unix socket."""
+    handler = type('Handler', (MetricsHandler,), {'service': service})
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = UnixHTTPServer(socket_path, handler)
+    else:
+        server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+        server.daemon_threads = True
+    server.verbose = verbose
+    return server
+
+
+def main():
+    """Main function with command line argument parsing."""
+    parser = argparse.ArgumentParser(description='Serve statistics, histograms and window series of CSV files')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                        help=f'Port on 127.0.0.1 (default: {DEFAULT_PORT})')
+    parser.add_argument('--socket', metavar='PATH', help='Listen on a Unix socket instead of a TCP port')
+    parser.add_argument('--preload', nargs='*', default=[], metavar='FILE',
+                        help='Memory-map these CSV files before serving')
+    parser.add_argument('--cache-size', type=int, default=RESULT_CACHE_SIZE,
+                        help=f'Results kept in memory (default: {RESULT_CACHE_SIZE})')
+    parser.add_argument('--verbose', action='store_true', help='Log every request')
+    args = parser.parse_args()
+
+    service = MetricsService(args.cache_size)
+    for csv_path in args.preload:
+        signature, dataset, column = service.dataset(csv_path, None)
+        print(f"Loaded {csv_path}: {len(dataset):,} rows of '{column}'")
+    server = make_server(service, args.port, args.socket, args.verbose)
+    where = args.socket or f'http://127.0.0.1:{args.port}'
+    print(f"Metrics service listening on {where}; Ctrl-C to stop", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+
+
+if __name__ == "__main__":
+    main()
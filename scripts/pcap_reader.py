@@ -0,0 +1,530 @@
+import mmap
+import os
+import struct
+import tempfile
+from collections import deque
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+from compressed_io import copy_decompressed, is_compressed
+
+# pcap magic numbers (as read little-endian) and the timestamp unit they imply
+PCAP_MAGICS = {
+    0xa1b2c3d4: ('<', 1000),        # microsecond timestamps
+    0xd4c3b2a1: ('>', 1000),
+    0xa1b23c4d: ('<', 1),           # nanosecond timestamps
+    0x4d3cb2a1: ('>', 1),
+}
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+
+# Link-layer types we know how to walk down to the IP header
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+
+HTTP_METHODS = (b'GET ', b'POST ', b'PUT ', b'PATCH ', b'DELETE ', b'HEAD ', b'OPTIONS ', b'CONNECT ', b'TRACE ')
+
+IPV6_EXTENSION_HEADERS = (0, 43, 60)
+
+
+class CaptureBuffer:
+    """
+    Read-only memory map of a capture file.
+
+    Plain pcap/pcapng files are mapped directly. Compressed captures (.gz,
+    .xz, .bz2, .zip) are first inflated into a temporary file which is then
+    mapped, so the decompressed bytes live in the page cache instead of the
+    heap; decompression runs in a background thread while the previous
+    blocks are written.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        if is_compressed(path):
+            self._file = tempfile.NamedTemporaryFile(prefix='capture-', suffix='.pcap')
+            copy_decompressed(path, self._file)
+            self._file.flush()
+        else:
+            self._file = open(path, 'rb')
+        # Uncompressed bytes, which other processes can map while this buffer is open
+        self.data_path = self._file.name
+        size = os.fstat(self._file.fileno()).st_size
+        self.buf = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+
+    def close(self) -> None:
+        if isinstance(self.buf, mmap.mmap):
+            self.buf.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_layout(buf) -> Dict:
+    """
+    Read the global header of a pcap file or the leading blocks of a pcapng file.
+
+    Args:
+        buf: Buffer holding the whole capture (usually a mmap)
+
+    Returns:
+        Dictionary with the capture 'format', its 'endian' and the offset of
+        the first record ('first_record'), plus 'linktype', 'ns_per_unit' and
+        'snaplen' for pcap or the 'interfaces' described so far for pcapng
+    """
+    if len(buf) < 24:
+        return {'format': 'empty', 'first_record': len(buf)}
+    magic = struct.unpack_from('<I', buf, 0)[0]
+    if magic in PCAP_MAGICS:
+        endian, ns_per_unit = PCAP_MAGICS[magic]
+        snaplen, linktype = struct.unpack_from(endian + 'II', buf, 16)
+        return {'format': 'pcap', 'endian': endian, 'ns_per_unit': ns_per_unit, 'snaplen': snaplen or 262144,
+                'linktype': linktype & 0x0FFFFFFF, 'first_record': 24}
+    if magic == PCAPNG_SHB:
+        bom = struct.unpack_from('<I', buf, 8)[0]
+        endian = '<' if bom == PCAPNG_BYTE_ORDER_MAGIC else '>'
+        layout = {'format': 'pcapng', 'endian': endian, 'interfaces': []}
+        # Interfaces are described before the first packet that uses them
+        offset = 0
+        while offset + 12 <= len(buf):
+            block_type, block_len = struct.unpack_from(endian + 'II', buf, offset)
+            if block_type not in (PCAPNG_SHB, 1) or block_len < 12:
+                break
+            if block_type == 1:
+                layout['interfaces'].append(_pcapng_interface(buf, endian, offset, block_len))
+            offset += block_len
+        layout['first_record'] = offset
+        return layout
+    raise ValueError(f"Unknown capture format (magic 0x{magic:08x})")
+
+
+def interface_changes(buf, layout: Dict, end: int = None) -> List[Tuple[int, str, list]]:
+    """
+    Find the section headers and interface descriptions past the leading blocks of a pcapng capture.
+
+    A worker that starts reading in the middle of a capture never sees the
+    interfaces described between the first record and its start; this walk
+    over the block headers (not the packets) lets it begin with the right
+    ones (see layout_at).
+
+    Args:
+        buf: Capture buffer
+        layout: Result of read_layout
+        end: Stop at this byte offset (default: end of the buffer)
+
+    Returns:
+        List of (offset after the block, endian, interfaces) in capture
+        order, one per block that changes them; empty for pcap
+    """
+    changes = []
+    if layout['format'] != 'pcapng':
+        return changes
+    end = len(buf) if end is None else min(end, len(buf))
+    endian = layout['endian']
+    interfaces = list(layout['interfaces'])
+    offset = layout['first_record']
+    header = struct.Struct(endian + 'II')
+    while offset + 12 <= end:
+        block_type, block_len = header.unpack_from(buf, offset)
+        if block_type == PCAPNG_SHB:
+            bom = struct.unpack_from('<I', buf, offset + 8)[0]
+            endian = '<' if bom == PCAPNG_BYTE_ORDER_MAGIC else '>'
+            header = struct.Struct(endian + 'II')
+            block_len = header.unpack_from(buf, offset)[1]
+            interfaces = []
+        if block_len < 12 or offset + block_len > len(buf):
+            break  # truncated or corrupt capture
+        if block_type == 1:
+            interfaces = interfaces + [_pcapng_interface(buf, endian, offset, block_len)]
+        if block_type in (PCAPNG_SHB, 1):
+            changes.append((offset + block_len, endian, interfaces))
+        offset += block_len
+    return changes
+
+
+def layout_at(layout: Dict, changes: List[Tuple[int, str, list]], offset: int) -> Dict:
+    """
+    Return the layout in force for the records starting at or after offset.
+
+    Args:
+        layout: Result of read_layout
+        changes: Result of interface_changes
+        offset: Byte offset where reading starts
+
+    Returns:
+        Copy of layout with the endian and interfaces of the last change
+        before offset, or layout itself when there is none
+    """
+    current = None
+    for change in changes:
+        if change[0] > offset:
+            break
+        current = change
+    if current is None:
+        return layout
+    return dict(layout, endian=current[1], interfaces=current[2], first_record=current[0])
+
+
+def iter_records(buf, start: int = None, end: int = None,
+                 layout: Dict = None) -> Iterator[Tuple[int, int, int, int]]:
+    """
+    Walk the record headers of a pcap or pcapng buffer.
+
+    No packet bytes are copied: each record is described by offsets into buf.
+    A byte range can be given to walk only the records starting inside it;
+    start must then be a record boundary (see find_record_boundary).
+
+    Args:
+        buf: Buffer holding the whole capture (usually a mmap)
+        start: Offset of the first record to walk (default: first record of the file)
+        end: Records starting at or after this offset are not walked (default: end of buffer)
+        layout: Result of read_layout, when already known
+
+    Returns:
+        Iterator of (timestamp_ns, linktype, data_offset, captured_length)
+    """
+    layout = layout or read_layout(buf)
+    start = layout['first_record'] if start is None else start
+    end = len(buf) if end is None else min(end, len(buf))
+    if layout['format'] == 'pcap':
+        yield from _iter_pcap(buf, layout, start, end)
+    elif layout['format'] == 'pcapng':
+        yield from _iter_pcapng(buf, layout, start, end)
+
+
+def _iter_pcap(buf, layout: Dict, offset: int, end: int) -> Iterator[Tuple[int, int, int, int]]:
+    ns_per_unit = layout['ns_per_unit']
+    linktype = layout['linktype']
+    record = struct.Struct(layout['endian'] + 'IIII')
+    size = len(buf)
+    while offset < end and offset + 16 <= size:
+        ts_sec, ts_frac, caplen, _ = record.unpack_from(buf, offset)
+        offset += 16
+        if offset + caplen > size:
+            break  # truncated capture
+        yield ts_sec * 1_000_000_000 + ts_frac * ns_per_unit, linktype, offset, caplen
+        offset += caplen
+
+
+def _iter_pcapng(buf, layout: Dict, offset: int, end: int) -> Iterator[Tuple[int, int, int, int]]:
+    size = len(buf)
+    endian = layout['endian']
+    interfaces = list(layout['interfaces'])
+    while offset < end and offset + 12 <= size:
+        block_type = struct.unpack_from(endian + 'I', buf, offset)[0]
+        if block_type == PCAPNG_SHB:
+            bom = struct.unpack_from('<I', buf, offset + 8)[0]
+            endian = '<' if bom == PCAPNG_BYTE_ORDER_MAGIC else '>'
+            if offset:
+                interfaces = []
+        block_len = struct.unpack_from(endian + 'I', buf, offset + 4)[0]
+        if block_len < 12 or offset + block_len > size:
+            break  # truncated or corrupt capture
+
+        if block_type == 1:  # Interface Description Block
+            if offset >= layout['first_record']:
+                interfaces.append(_pcapng_interface(buf, endian, offset, block_len))
+        elif block_type == 6:  # Enhanced Packet Block
+            if_id, ts_high, ts_low, caplen = struct.unpack_from(endian + 'IIII', buf, offset + 8)
+            linktype, multiplier, divisor = interfaces[if_id]
+            ticks = (ts_high << 32) | ts_low
+            yield ticks * multiplier // divisor, linktype, offset + 28, caplen
+        elif block_type == 2:  # obsolete Packet Block
+            if_id = struct.unpack_from(endian + 'H', buf, offset + 8)[0]
+            ts_high, ts_low, caplen = struct.unpack_from(endian + 'III', buf, offset + 12)
+            linktype, multiplier, divisor = interfaces[if_id]
+            ticks = (ts_high << 32) | ts_low
+            yield ticks * multiplier // divisor, linktype, offset + 28, caplen
+        # Simple Packet Blocks carry no timestamp and everything else is metadata
+
+        offset += block_len
+
+
+def find_record_boundary(buf, layout: Dict, offset: int, confirm: int = 8) -> int:
+    """
+    Find the first record that starts at or after an arbitrary byte offset.
+
+    pcap and pcapng have no sync markers, so candidate offsets are accepted
+    only when a chain of `confirm` consecutive plausible record headers
+    starts there. This lets workers split a capture by byte ranges without a
+    serial pass over every record header.
+
+    Args:
+        buf: Capture buffer
+        layout: Result of read_layout
+        offset: Byte offset to start searching from
+        confirm: Number of consecutive valid records required
+
+    Returns:
+        Offset of the record boundary, or len(buf) when there is none
+    """
+    size = len(buf)
+    offset = max(offset, layout['first_record'])
+    if layout['format'] == 'pcapng':
+        offset += -offset % 4  # blocks are 32-bit aligned
+        step = 4
+        first_ts = 0
+        valid = _valid_pcapng_block
+    elif layout['format'] == 'pcap':
+        step = 1
+        first_ts = struct.unpack_from(layout['endian'] + 'I', buf, 24)[0] if size >= 40 else 0
+        valid = _valid_pcap_record
+    else:
+        return size
+
+    while offset < size:
+        at = offset
+        for _ in range(confirm):
+            at = valid(buf, layout, at, first_ts)
+            if at < 0 or at >= size:
+                break
+        if at >= 0:
+            return offset
+        offset += step
+    return size
+
+
+def _valid_pcap_record(buf, layout: Dict, offset: int, first_ts: int) -> int:
+    """Return the offset of the next record if a plausible pcap record starts at offset, else -1."""
+    if offset + 16 > len(buf):
+        return -1
+    ts_sec, ts_frac, caplen, origlen = struct.unpack_from(layout['endian'] + 'IIII', buf, offset)
+    if (caplen > layout['snaplen'] or caplen > origlen or origlen > (1 << 20)
+            or ts_frac >= 1_000_000_000 // layout['ns_per_unit']
+            or abs(ts_sec - first_ts) > 366 * 86400
+            or offset + 16 + caplen > len(buf)):
+        return -1
+    return offset + 16 + caplen
+
+
+def _valid_pcapng_block(buf, layout: Dict, offset: int, first_ts: int) -> int:
+    """Return the offset of the next block if a plausible pcapng block starts at offset, else -1."""
+    if offset + 12 > len(buf):
+        return -1
+    endian = layout['endian']
+    block_type, block_len = struct.unpack_from(endian + 'II', buf, offset)
+    if (block_type not in (1, 2, 3, 4, 5, 6, 0x0BAD, 0x40000BAD) or block_len < 12 or block_len % 4
+            or offset + block_len > len(buf)
+            or struct.unpack_from(endian + 'I', buf, offset + block_len - 4)[0] != block_len):
+        return -1
+    if block_type == 6 and struct.unpack_from(endian + 'I', buf, offset + 8)[0] >= len(layout['interfaces']):
+        return -1
+    return offset + block_len
+
+
+def _pcapng_interface(buf, endian: str, offset: int, block_len: int) -> Tuple[int, int, int]:
+    """Return (linktype, tick multiplier, tick divisor) of an Interface Description Block."""
+    linktype = struct.unpack_from(endian + 'H', buf, offset + 8)[0]
+    return (linktype,) + _pcapng_resolution(buf, endian, offset + 16, offset + block_len - 4)
+
+
+def _pcapng_resolution(buf, endian: str, offset: int, end: int) -> Tuple[int, int]:
+    """
+    Return the timestamp resolution of an interface (if_tsresol option).
+
+    The resolution is kept as an integer ratio so that epoch nanoseconds,
+    which do not fit in a float mantissa, are computed exactly.
+
+    Returns:
+        Tuple of (multiplier, divisor) turning ticks into nanoseconds
+    """
+    while offset + 4 <= end:
+        code, length = struct.unpack_from(endian + 'HH', buf, offset)
+        if code == 0:
+            break
+        if code == 9 and length >= 1:  # if_tsresol
+            value = buf[offset + 4]
+            if value & 0x80:
+                return 1_000_000_000, 2 ** (value & 0x7F)
+            if value <= 9:
+                return 10 ** (9 - value), 1
+            return 1, 10 ** (value - 9)
+        offset += 4 + ((length + 3) & ~3)
+    return 1000, 1  # default resolution is microseconds
+
+
+def _ip_offset(buf, linktype: int, offset: int, caplen: int) -> int:
+    """Return the offset of the IP header inside a frame, or -1 when it is not IP."""
+    if linktype == LINKTYPE_ETHERNET:
+        if caplen < 14:
+            return -1
+        ethertype = (buf[offset + 12] << 8) | buf[offset + 13]
+        header = 14
+        while ethertype in (0x8100, 0x88a8) and caplen >= header + 4:  # VLAN tags
+            ethertype = (buf[offset + header + 2] << 8) | buf[offset + header + 3]
+            header += 4
+        return offset + header if ethertype in (0x0800, 0x86dd) else -1
+    if linktype in (LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6):
+        return offset
+    if linktype == LINKTYPE_LINUX_SLL:
+        if caplen < 16:
+            return -1
+        protocol = (buf[offset + 14] << 8) | buf[offset + 15]
+        return offset + 16 if protocol in (0x0800, 0x86dd) else -1
+    if linktype == LINKTYPE_LINUX_SLL2:
+        if caplen < 20:
+            return -1
+        protocol = (buf[offset] << 8) | buf[offset + 1]
+        return offset + 20 if protocol in (0x0800, 0x86dd) else -1
+    if linktype == LINKTYPE_NULL:
+        return offset + 4 if caplen >= 4 else -1
+    return -1
+
+
+def parse_tcp(buf, linktype: int, offset: int, caplen: int):
+    """
+    Decode the IP and TCP headers of a frame.
+
+    Args:
+        buf: Capture buffer
+        linktype: Link-layer type of the frame
+        offset: Offset of the frame data in buf
+        caplen: Captured length of the frame
+
+    Returns:
+        (src, sport, dst, dport, seq, ack, flags, payload_offset, payload_end),
+        or None when the frame is not a TCP segment
+    """
+    ip = _ip_offset(buf, linktype, offset, caplen)
+    frame_end = offset + caplen
+    if ip < 0 or ip >= frame_end:
+        return None
+
+    version = buf[ip] >> 4
+    if version == 4:
+        ihl = (buf[ip] & 0x0F) * 4
+        if buf[ip + 9] != 6 or ip + ihl + 20 > frame_end:
+            return None
+        if struct.unpack_from('!H', buf, ip + 6)[0] & 0x1FFF:
+            return None  # non-first fragment
+        ip_end = min(frame_end, ip + struct.unpack_from('!H', buf, ip + 2)[0])
+        src = bytes(buf[ip + 12:ip + 16])
+        dst = bytes(buf[ip + 16:ip + 20])
+        tcp = ip + ihl
+    elif version == 6:
+        if ip + 40 > frame_end:
+            return None
+        next_header = buf[ip + 6]
+        ip_end = min(frame_end, ip + 40 + struct.unpack_from('!H', buf, ip + 4)[0])
+        src = bytes(buf[ip + 8:ip + 24])
+        dst = bytes(buf[ip + 24:ip + 40])
+        tcp = ip + 40
+        while next_header in IPV6_EXTENSION_HEADERS and tcp + 8 <= frame_end:
+            next_header = buf[tcp]
+            tcp += (buf[tcp + 1] + 1) * 8
+        if next_header != 6 or tcp + 20 > frame_end:
+            return None
+    else:
+        return None
+
+    sport, dport, seq, ack, data_offset, flags = struct.unpack_from('!HHIIBB', buf, tcp)
+    payload = tcp + (data_offset >> 4) * 4
+    return src, sport, dst, dport, seq, ack, flags, payload, max(payload, ip_end)
+
+
+class HttpMatcher:
+    """
+    Match HTTP/1.x requests to responses per TCP connection.
+
+    Requests and responses are matched in order per connection (HTTP/1.x
+    keeps responses in request order, pipelined or not). Like tshark's
+    http.time, the request time is taken from the last segment of the
+    request and the response time from the frame carrying the status line;
+    the reported arrival time is the time of the response frame.
+
+    Segments that refer to a request sent before the matcher started (a
+    response with no pending request, or a request continuation on a
+    connection with no request seen yet) are kept in `orphans` so that
+    shards of one capture can be reconciled afterwards. Only the latest
+    continuation of a connection before each of its orphan responses is
+    kept, since earlier ones would be overwritten anyway; response bodies
+    therefore add one entry per connection, not one per segment.
+    """
+
+    def __init__(self):
+        self.arrivals = []
+        self.http_times = []
+        self.orphans = []  # (timestamp_ns, 'response' | 'continuation', key)
+        self.open_continuation: Dict[tuple, int] = {}  # key -> index of its latest continuation in orphans
+        self.pending: Dict[tuple, deque] = {}
+        self.last_request_seq: Dict[tuple, int] = {}
+        self.last_response_seq: Dict[tuple, int] = {}
+
+    def feed(self, buf, ts_ns: int, linktype: int, offset: int, caplen: int) -> None:
+        """Process one captured frame."""
+        segment = parse_tcp(buf, linktype, offset, caplen)
+        if segment is None:
+            return
+        src, sport, dst, dport, seq, ack, flags, payload, payload_end = segment
+        if payload == payload_end:
+            return  # no TCP payload
+
+        head = bytes(buf[payload:min(payload + 12, payload_end)])
+        if head.startswith(b'HTTP/'):
+            key = (dst, dport, src, sport)
+            if self.last_response_seq.get(key) == seq:
+                return  # retransmission
+            self.last_response_seq[key] = seq
+            if head[9:10] == b'1':
+                return  # 1xx interim response, the final one follows
+            queue = self.pending.get(key)
+            if queue:
+                request_ns = queue.popleft()
+                self.arrivals.append(ts_ns)
+                self.http_times.append(ts_ns - request_ns)
+            else:
+                self.orphans.append((ts_ns, 'response', key))
+                self.open_continuation.pop(key, None)
+        else:
+            key = (src, sport, dst, dport)
+            if head.startswith(HTTP_METHODS):
+                if self.last_request_seq.get(key) == seq:
+                    return  # retransmission
+                self.last_request_seq[key] = seq
+                self.pending.setdefault(key, deque()).append(ts_ns)
+            elif self.pending.get(key):
+                # Continuation of the latest request (body or headers spanning segments)
+                self.pending[key][-1] = ts_ns
+            elif key not in self.last_request_seq:
+                index = self.open_continuation.get(key)
+                if index is None:
+                    self.open_continuation[key] = len(self.orphans)
+                    self.orphans.append((ts_ns, 'continuation', key))
+                else:
+                    self.orphans[index] = (ts_ns, 'continuation', key)
+
+
+def extract_http_times(path: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Compute HTTP response times from a capture without tshark.
+
+    Args:
+        path: pcap or pcapng capture, possibly compressed (.gz, .xz, .bz2, .zip)
+
+    Returns:
+        Tuple of (arrival_ns, http_time_ns) int64 arrays, in capture order
+    """
+    matcher = HttpMatcher()
+    with CaptureBuffer(path) as capture:
+        buf = capture.buf
+        for ts_ns, linktype, offset, caplen in iter_records(buf):
+            matcher.feed(buf, ts_ns, linktype, offset, caplen)
+
+    return np.array(matcher.arrivals, dtype=np.int64), np.array(matcher.http_times, dtype=np.int64)
+
+
+def format_seconds(ns: int) -> str:
+    """Format a nanosecond duration as seconds with nine decimals, like tshark's http.time."""
+    ns = int(ns)
+    sign = '-' if ns < 0 else ''
+    seconds, fraction = divmod(abs(ns), 1_000_000_000)
+    return f'{sign}{seconds}.{fraction:09d}'
@@ -0,0 +1,197 @@
+import atexit
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional
+
+PROFILE_VERSION = 1
+
+
+class _NullStage:
+    """Stage used when profiling is off: entering and leaving it does nothing."""
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class Stage:
+    """
+    One measured run of a pipeline stage.
+
+    Wall and CPU time are taken around the block and tracemalloc's peak is
+    reset on entry, so the peak is the memory allocated by the stage itself
+    (numpy arrays included, memory-mapped files not). Set rows inside the
+    block to get a throughput in the report. Stages may be nested: an outer
+    stage keeps the peaks reached inside its inner stages.
+    """
+
+    def __init__(self, profiler: 'Profiler', name: str, rows: Optional[int]):
+        self.profiler = profiler
+        self.name = name
+        self.rows = rows
+
+    def __enter__(self):
+        import tracemalloc
+        self.cprofile = None
+        if self.name == self.profiler.cprofile_stage:
+            import cProfile
+            self.cprofile = cProfile.Profile()
+        self.profiler.update_peaks()
+        tracemalloc.reset_peak()
+        self.memory_start = tracemalloc.get_traced_memory()[0]
+        self.peak = self.memory_start
+        self.profiler.open_stages.append(self)
+        self.cpu_start = time.process_time()
+        self.wall_start = time.perf_counter()
+        if self.cprofile is not None:
+            self.cprofile.enable()
+        return self
+
+    def __exit__(self, *exc):
+        import tracemalloc
+        if self.cprofile is not None:
+            self.cprofile.disable()
+        wall = time.perf_counter() - self.wall_start
+        cpu = time.process_time() - self.cpu_start
+        self.profiler.update_peaks()
+        self.profiler.open_stages.remove(self)
+        self.profiler.record(self.name, wall, cpu, self.peak - self.memory_start, self.rows, self.cprofile)
+        return False
+
+
+class Profiler:
+    """
+    Collects per-stage wall time, CPU time, peak memory and throughput.
+
+    Stages with the same name (e.g. one per input file) are added up; the
+    peak memory is the largest of them.
+    """
+
+    def __init__(self, script: str, output: Optional[str] = None, cprofile_stage: Optional[str] = None,
+                 cprofile_file: Optional[str] = None):
+        import tracemalloc
+        self.script = script
+        self.output = output
+        self.cprofile_stage = cprofile_stage
+        self.cprofile_file = cprofile_file or (f'{cprofile_stage}.prof' if cprofile_stage else None)
+        self.stages: Dict[str, Dict] = {}
+        self.open_stages: List[Stage] = []
+        self.cprofile_stats = None
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        tracemalloc.start()
+
+    def stage(self, name: str, rows: Optional[int] = None) -> Stage:
+        return Stage(self, name, rows)
+
+    def update_peaks(self) -> None:
+        """Fold tracemalloc's peak since the last reset into every open stage."""
+        import tracemalloc
+        peak = tracemalloc.get_traced_memory()[1]
+        for stage in self.open_stages:
+            stage.peak = max(stage.peak, peak)
+
+    def record(self, name: str, wall: float, cpu: float, peak: int, rows: Optional[int], cprofile) -> None:
+        entry = self.stages.setdefault(name, {'name': name, 'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0,
+                                              'peak_memory_mb': 0.0, 'rows': None})
+        entry['calls'] += 1
+        entry['wall_seconds'] += wall
+        entry['cpu_seconds'] += cpu
+        entry['peak_memory_mb'] = max(entry['peak_memory_mb'], peak / (1 << 20))
+        if rows is not None:
+            entry['rows'] = (entry['rows'] or 0) + int(rows)
+        if cprofile is not None:
+            import pstats
+            if self.cprofile_stats is None:
+                self.cprofile_stats = pstats.Stats(cprofile)
+            else:
+                self.cprofile_stats.add(cprofile)
+
+    def report(self) -> Dict:
+        """Machine-readable report of every stage, in the order they first ran."""
+        stages = []
+        for entry in self.stages.values():
+            entry = dict(entry)
+            rows, wall = entry['rows'], entry['wall_seconds']
+            entry['rows_per_second'] = rows / wall if rows is not None and wall > 0 else None
+            stages.append(entry)
+        return {
+            'version': PROFILE_VERSION,
+            'script': self.script,
+            'argv': sys.argv[1:],
+            'total_wall_seconds': time.perf_counter() - self.wall_start,
+            'total_cpu_seconds': time.process_time() - self.cpu_start,
+            'stages': stages,
+            'cprofile_file': self.cprofile_file if self.cprofile_stats is not None else None,
+        }
+
+    def finish(self) -> None:
+        """Print the stage table to stderr, write the JSON report and the cProfile dump."""
+        report = self.report()
+        print(f"\nPROFILE {report['script']} ({report['total_wall_seconds']:.3f} s wall, "
+              f"{report['total_cpu_seconds']:.3f} s CPU)", file=sys.stderr)
+        print(f"{'Stage':<16} {'Calls':>5} {'Wall (s)':>10} {'CPU (s)':>10} {'Peak (MB)':>10} {'Rows/s':>14}",
+              file=sys.stderr)
+        for entry in report['stages']:
+            rate = f"{entry['rows_per_second']:,.0f}" if entry['rows_per_second'] is not None else '-'
+            print(f"{entry['name']:<16} {entry['calls']:>5} {entry['wall_seconds']:>10.3f} "
+                  f"{entry['cpu_seconds']:>10.3f} {entry['peak_memory_mb']:>10.1f} {rate:>14}", file=sys.stderr)
+        if self.cprofile_stats is not None:
+            self.cprofile_stats.dump_stats(self.cprofile_file)
+            print(f"cProfile of stage '{self.cprofile_stage}' written to {self.cprofile_file}", file=sys.stderr)
+        elif self.cprofile_stage:
+            print(f"Warning: stage '{self.cprofile_stage}' never ran, no cProfile written", file=sys.stderr)
+        if self.output:
+            with open(self.output, 'w') as f:
+                json.dump(report, f, indent=1)
+
+
+_profiler: Optional[Profiler] = None
+
+
+def stage(name: str, rows: Optional[int] = None):
+    """
+    Context manager measuring a pipeline stage when profiling is on.
+
+    When it is off this returns a shared object whose enter and exit do
+    nothing, so stages cost a function call.
+    """
+    if _profiler is None:
+        return _NULL_STAGE
+    return _profiler.stage(name, rows)
+
+
+def enable(script: str, output: Optional[str] = None, cprofile_stage: Optional[str] = None,
+           cprofile_file: Optional[str] = None) -> Profiler:
+    """Turn profiling on for this process; the report is produced at exit."""
+    global _profiler
+    _profiler = Profiler(script, output, cprofile_stage, cprofile_file)
+    atexit.register(_profiler.finish)
+    return _profiler
+
+
+def add_arguments(parser) -> None:
+    """Add the common --profile options to an argument parser."""
+    parser.add_argument('--profile', action='store_true',
+                        help='Report wall/CPU time, peak memory and rows/s of every pipeline stage')
+    parser.add_argument('--profile-output', metavar='FILE',
+                        help='Write the per-stage profile report to FILE as JSON (implies --profile)')
+    parser.add_argument('--cprofile', metavar='STAGE',
+                        help='Also record a cProfile of one stage (implies --profile)')
+    parser.add_argument('--cprofile-file', metavar='FILE',
+                        help='Where the cProfile dump is written (default: STAGE.prof)')
+
+
+def configure(args) -> Optional[Profiler]:
+    """Enable profiling if the parsed arguments of add_arguments ask for it."""
+    if not (args.profile or args.profile_output or args.cprofile):
+        return None
+    return enable(os.path.basename(sys.argv[0]), args.profile_output, args.cprofile, args.cprofile_file)
@@ -0,0 +1,155 @@
+import json
+import math
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+
+class LogHistogram:
+    """
+    Mergeable quantile sketch with bounded relative error.
+
+    Positive values are counted in logarithmic buckets: bucket i covers
+    (gamma^(i-1), gamma^i] with gamma = (1 + alpha) / (1 - alpha), so any
+    quantile is returned within a relative error of alpha of a value of
+    the data (the DDSketch construction). Memory depends on the dynamic
+    range of the data, not on the number of values: with alpha = 1% every
+    duration between 1 us and 1000 s fits in about a thousand buckets.
+
+    count, min, max and the sum (for the mean) are tracked exactly. Values
+    that are zero or negative are counted separately and reported as 0.
+    """
+
+    def __init__(self, relative_error: float = 0.01):
+        if not 0 < relative_error < 1:
+            raise ValueError("relative_error must be between 0 and 1")
+        self.relative_error = relative_error
+        self.gamma = (1 + relative_error) / (1 - relative_error)
+        self.log_gamma = math.log(self.gamma)
+        self.offset = 0  # bucket index of counts[0]
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.zero_count = 0
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _grow(self, low: int, high: int) -> None:
+        """Make sure bucket indices low..high (inclusive) are allocated."""
+        if len(self.counts) == 0:
+            self.offset = low
+            self.counts = np.zeros(high - low + 1, dtype=np.int64)
+            return
+        new_offset = min(low, self.offset)
+        new_end = max(high + 1, self.offset + len(self.counts))
+        if new_offset == self.offset and new_end == self.offset + len(self.counts):
+            return
+        counts = np.zeros(new_end - new_offset, dtype=np.int64)
+        counts[self.offset - new_offset:self.offset - new_offset + len(self.counts)] = self.counts
+        self.offset = new_offset
+        self.counts = counts
+
+    def update(self, values) -> None:
+        """Add a chunk of values (NaNs are ignored)."""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        self.count += len(values)
+        self.total += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+        positive = values[values > 0]
+        self.zero_count += len(values) - len(positive)
+        if len(positive) == 0:
+            return
+        index = np.ceil(np.log(positive) / self.log_gamma).astype(np.int64)
+        low, high = int(index.min()), int(index.max())
+        self._grow(low, high)
+        start = low - self.offset
+        self.counts[start:start + high - low + 1] += np.bincount(index - low, minlength=high - low + 1)
+
+    def merge(self, other: 'LogHistogram') -> None:
+        """Add the contents of another sketch built with the same relative error."""
+        if not math.isclose(other.relative_error, self.relative_error):
+            raise ValueError("Cannot merge sketches with different relative errors")
+        if other.count == 0:
+            return
+        if len(other.counts):
+            self._grow(other.offset, other.offset + len(other.counts) - 1)
+            start = other.offset - self.offset
+            self.counts[start:start + len(other.counts)] += other.counts
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantiles(self, qs: Iterable[float]) -> np.ndarray:
+        """
+        Return the approximate quantiles for fractions qs (0..1).
+
+        The rank of each quantile follows numpy's default (linear) definition,
+        q * (count - 1), and is looked up in the cumulative bucket counts.
+        """
+        qs = np.asarray(list(qs), dtype=np.float64)
+        if self.count == 0:
+            return np.zeros(len(qs))
+        ranks = qs * (self.count - 1)
+        cumulative = self.zero_count + np.cumsum(self.counts)
+        bucket = np.searchsorted(cumulative, ranks, side='right')
+        bucket = np.minimum(bucket, len(self.counts) - 1)
+        # Representative value of bucket i, within alpha of anything in it
+        values = 2 * self.gamma ** (self.offset + bucket) / (self.gamma + 1)
+        values = np.where(ranks < self.zero_count, 0.0, values)
+        return np.clip(values, self.min, self.max)
+
+    def to_dict(self) -> Dict:
+        """Serializable form; only non-empty buckets are stored."""
+        nonzero = np.flatnonzero(self.counts)
+        return {
+            'type': 'log-histogram',
+            'relative_error': self.relative_error,
+            'buckets': (nonzero + self.offset).tolist(),
+            'counts': self.counts[nonzero].tolist(),
+            'zero_count': self.zero_count,
+            'count': self.count,
+            'sum': self.total,
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'LogHistogram':
+        sketch = cls(data['relative_error'])
+        buckets = np.asarray(data['buckets'], dtype=np.int64)
+        if len(buckets):
+            sketch._grow(int(buckets.min()), int(buckets.max()))
+            sketch.counts[buckets - sketch.offset] = data['counts']
+        sketch.zero_count = data['zero_count']
+        sketch.count = data['count']
+        sketch.total = data['sum']
+        if sketch.count:
+            sketch.min = data['min']
+            sketch.max = data['max']
+        return sketch
+
+    def save(self, path: str) -> None:
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, path: str) -> 'LogHistogram':
+        with open(path, 'r') as f:
+            return cls.from_dict(json.load(f))
+
+
+def merge_sketches(sketches: Iterable[LogHistogram]) -> Optional[LogHistogram]:
+    """Merge several sketches into a new one (None if there are none)."""
+    merged = None
+    for sketch in sketches:
+        if merged is None:
+            merged = LogHistogram(sketch.relative_error)
+        merged.merge(sketch)
+    return merged
@@ -1,30 +1,104 @@
-import csv
 import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np
+import argparse
 import os
 
+import profiling
+from changepoint import OnlineCusum, analyze_shifts
+from columnar_cache import load_columns
+from compressed_io import find_input
+from csv_tail import follow_csv_column
+from decimate import decimate_figure
+
 # === FILE PATHS ===
-CSV = 'csv-data/route-swap.csv'
+CSV = find_input('csv-data/route-swap.csv')  # or its .gz/.xz/.bz2/.zip copy
+DPI = 300
+
+parser = argparse.ArgumentParser(description='Plot the HTTP request times of the route swap experiment')
+parser.add_argument('--full-resolution', action='store_true',
+                    help='Draw every request instead of the per-pixel decimated series')
+parser.add_argument('--decimation', choices=['minmax', 'lttb'], default='minmax',
+                    help='minmax: per-pixel min/max envelope (exact spikes); lttb: largest-triangle-three-buckets')
+parser.add_argument('--analyze', action='store_true',
+                    help='Detect the route swap and report latency before/after, convergence time and disruption window')
+parser.add_argument('--follow', action='store_true',
+                    help='Stream the CSV as it grows and report level shifts as they happen (no plot)')
+parser.add_argument('--rate', type=float, default=110,
+                    help='Request rate of the test in requests/s; one-second blocks are analyzed (default: 110)')
+parser.add_argument('--min-shift', type=float, default=0.01,
+                    help='Smallest relative latency change reported as a shift (default: 0.01)')
+parser.add_argument('--follow-timeout', type=float,
+                    help='Stop following after this many seconds without new rows')
+parser.add_argument('--csv', default=CSV, help=f'Route swap CSV (default: {CSV})')
+profiling.add_arguments(parser)
+args = parser.parse_args()
+profiling.configure(args)
+block = max(1, int(round(args.rate)))
+
+def seconds(requests):
+    return requests / args.rate
+
+def print_distribution(label, stats):
+    print(f"  {label:<6} {stats['count']:>9,} requests   mean {stats['mean']:8.2f}   median {stats['p50']:8.2f}   "
+          f"p90 {stats['p90']:8.2f}   p99 {stats['p99']:8.2f}   p99.9 {stats['p99.9']:8.2f} ms")
+
+# === STREAMING MODE ===
+if args.follow:
+    detector = OnlineCusum(block, min_shift=args.min_shift)
+    print(f"Following {args.csv} ({args.rate:g} req/s, one-second blocks); Ctrl-C to stop")
+    try:
+        for values in follow_csv_column(args.csv, 'HTTP Request Time', idle_timeout=args.follow_timeout):
+            with profiling.stage('detect', len(values)):
+                events = detector.update(values * 1000)
+            for event in events:
+                at = f"request {event['request'] + 1:,} (t={seconds(event['request']):.0f} s)"
+                if event['event'] == 'level':
+                    print(f"{at}: baseline {event['level']:.2f} ms")
+                elif event['event'] == 'shift':
+                    print(f"{at}: SHIFT from {event['before']:.2f} ms, started at request {event['onset'] + 1:,}")
+                else:
+                    print(f"{at}: converged to {event['level']:.2f} ms after "
+                          f"{seconds(event['request'] - event['onset']):.0f} s")
+    except KeyboardInterrupt:
+        pass
+    raise SystemExit(0)
 
 # Ensure output directory exists
 os.makedirs('result-plots', exist_ok=True)
 
 # === READ CSV FILES ===
 def read_times_from_csv(filepath):
-    times = []
-    with open(filepath, 'r') as csvfile:
-        reader = csv.reader(csvfile)
-        next(reader)  # skip header
-        for row in reader:
-            try:
-                times.append(float(row[1])*1000)
-            except ValueError:
-                continue
-    return np.array(times)
+    times = load_columns(filepath, ['HTTP Request Time'])['HTTP Request Time']
+    return times[~np.isnan(times)] * 1000
 
 # Read all datasets
-times = read_times_from_csv(CSV)
+with profiling.stage('load') as stage:
+    times = read_times_from_csv(args.csv)
+    stage.rows = len(times)
+
+# === ROUTE SWAP ANALYSIS ===
+analysis = None
+if args.analyze:
+    with profiling.stage('analysis', len(times)):
+        analysis = analyze_shifts(times, block, min_shift=args.min_shift)
+    print(f"Route swap analysis of {args.csv} ({len(times):,} requests, {args.rate:g} req/s)")
+    for number, shift in enumerate(analysis['shifts'], start=1):
+        print(f"Shift {number}: {shift['pre_level']:.2f} ms -> {shift['post_level']:.2f} ms")
+        print(f"  change at request {shift['onset'] + 1:,} (t={seconds(shift['onset']):.0f} s)")
+        if shift['converged'] > shift['onset']:
+            print(f"  disruption window: requests {shift['onset'] + 1:,}-{shift['converged']:,} "
+                  f"(t={seconds(shift['onset']):.0f}-{seconds(shift['converged']):.0f} s)")
+        else:
+            print("  disruption window: none (step change)")
+        print(f"  convergence time: {seconds(shift['converged'] - shift['onset']):.0f} s")
+        print_distribution('before', shift['pre'])
+        print_distribution('after', shift['post'])
+    if not analysis['shifts']:
+        print("No level shift found")
+    for start, end in analysis['instabilities']:
+        print(f"Transient instability: requests {start + 1:,}-{end:,} "
+              f"(t={seconds(start):.0f}-{seconds(end):.0f} s), same level before and after")
 
 # Align lengths
 x = np.arange(1, len(times) + 1)
@@ -38,12 +112,24 @@ scenarios = [
 ]
 
 for label, times, color, filename in scenarios:
-    plt.figure(figsize=(10, 6))
-    sns.lineplot(x=x, y=times, color=color, linewidth=1.5)
+    fig = plt.figure(figsize=(10, 6))
+    # Every x is unique, so a plain line draws the same thing as
+    # sns.lineplot without its aggregation and confidence intervals
+    plt.plot(x, times, color=color, linewidth=1.5)
+    if analysis is not None:
+        for shift in analysis['shifts']:
+            plt.axvline(shift['onset'] + 1, color='red', linestyle='--', linewidth=1)
+            plt.axvspan(shift['onset'] + 1, shift['converged'], color='red', alpha=0.15)
+        for start, end in analysis['instabilities']:
+            plt.axvspan(start + 1, end, color='orange', alpha=0.15)
     plt.title(f'HTTP Request Times - {label}', fontsize=24, fontweight='bold')
     plt.xlabel('Request Number', fontsize=20)
     plt.ylabel('HTTP Request Time (ms)', fontsize=20)
     plt.grid(True, linestyle='--', alpha=0.7)
     plt.tight_layout()
-    plt.savefig(filename, dpi=300)
+    if not args.full_resolution:
+        with profiling.stage('decimate', len(times)):
+            decimate_figure(fig, DPI, args.decimation)
+    with profiling.stage('render'):
+        plt.savefig(filename, dpi=DPI)
     plt.close()
\ No newline at end of file
@@ -0,0 +1,301 @@
+import argparse
+import asyncio
+import copy
+import json
+import math
+import os
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_FILE = os.path.join(SCRIPT_DIR, '..', 'ngsi-ld-model', 'artificial-sensor.jsonld')
+DEFAULT_PORT = 31881
+ENTITIES_PATH = '/ngsi-ld/v1/entities'
+LATENCY_PATH = '/admin/latency'
+# Same area as the entities created by 24h-test.js (1 km around Vitória)
+CENTER_LAT = -20.27868363298307
+CENTER_LON = -40.29781714837235
+RADIUS_M = 1000
+REASONS = {200: 'OK', 201: 'Created', 204: 'No Content', 400: 'Bad Request', 404: 'Not Found',
+           405: 'Method Not Allowed', 409: 'Conflict'}
+MAX_HEADER = 65536
+
+
+def parse_steps(steps: List[str]) -> List[Tuple[float, float]]:
+    """
+    Parse latency steps given as SECONDS:MILLISECONDS (e.g. 600:12.5).
+
+    Returns:
+        (offset in s, added delay in s) pairs sorted by offset
+    """
+    parsed = []
+    for step in steps:
+        offset, _, delay = step.partition(':')
+        try:
+            parsed.append((float(offset), float(delay) / 1000))
+        except ValueError:
+            raise ValueError(f"Bad latency step '{step}', expected SECONDS:MILLISECONDS")
+    return sorted(parsed)
+
+
+class Latency:
+    """
+    Delay added before every response: a step schedule plus log-normal jitter.
+
+    Step offsets count from the first request received, so a replay started
+    at any time sees the same schedule, e.g. [(0, 0.040), (600, 0.010)] for a
+    route swap ten minutes into the run. set() overrides the schedule.
+    """
+
+    def __init__(self, steps: List[Tuple[float, float]] = (), jitter: float = 0.0):
+        self.steps = list(steps)
+        self.jitter = jitter
+        self.started: Optional[float] = None
+        self.override: Optional[float] = None
+
+    def current(self, now: float) -> float:
+        """Base delay in seconds at loop time now (before jitter)."""
+        if self.override is not None:
+            return self.override
+        if self.started is None:
+            self.started = now
+        delay = 0.0
+        for offset, value in self.steps:
+            if now - self.started < offset:
+                break
+            delay = value
+        return delay
+
+    def sample(self, now: float) -> float:
+        delay = self.current(now)
+        if delay > 0 and self.jitter > 0:
+            delay *= random.lognormvariate(-self.jitter ** 2 / 2, self.jitter)
+        return delay
+
+    def set(self, delay: Optional[float]) -> None:
+        self.override = delay
+
+
+def new_entity(model: Dict, number: int, value=0) -> Dict:
+    """An ArtificialSensor entity from the JSON-LD model, with its placeholders filled in."""
+    entity = copy.deepcopy(model)
+    radius = RADIUS_M / 111320 * math.sqrt(random.random())
+    angle = random.random() * 2 * math.pi
+    latitude = CENTER_LAT + radius * math.cos(angle)
+    longitude = CENTER_LON + radius * math.sin(angle) / math.cos(math.radians(CENTER_LAT))
+    entity['id'] = entity['id'].replace('[N]', str(number))
+    for attribute in entity.values():
+        if not isinstance(attribute, dict):
+            continue
+        if attribute.get('type') == 'GeoProperty':
+            attribute['value']['coordinates'] = [longitude, latitude]
+        elif isinstance(attribute.get('value'), str):
+            attribute['value'] = attribute['value'].replace('[N]', str(number))
+            if attribute['value'] == '[Value]':
+                attribute['value'] = value
+    return entity
+
+
+def _short_name(name: str) -> str:
+    """Attribute name without its context expansion ('...data-models#peopleCount' -> 'peopleCount')."""
+    return name.rsplit('#', 1)[-1].rsplit('/', 1)[-1]
+
+
+class Broker:
+    """In-memory entity store answering the NGSI-LD calls of the k6 tests."""
+
+    def __init__(self, model: Dict, latency: Latency):
+        self.model = model
+        self.latency = latency
+        self.entities: Dict[str, Dict] = {}
+        self.requests = 0
+
+    def populate(self, count: int) -> None:
+        for number in range(1, count + 1):
+            entity = new_entity(self.model, number)
+            self.entities[entity['id']] = entity
+
+    def handle(self, method: str, path: str, body: bytes) -> Tuple[int, bytes, Dict[str, str]]:
+        """Answer one request: (status, body, extra headers)."""
+        self.requests += 1
+        path = path.split('?', 1)[0]
+        if path == LATENCY_PATH:
+            return self._latency(method, body)
+        if not path.startswith(ENTITIES_PATH):
+            return self._error(404, 'ResourceNotFound', path)
+        parts = path[len(ENTITIES_PATH):].strip('/').split('/')
+        if parts == ['']:
+            if method != 'POST':
+                return self._error(405, 'MethodNotAllowed', path)
+            try:
+                entity = json.loads(body)
+                entity_id = entity['id']
+            except (ValueError, KeyError, TypeError):
+                return self._error(400, 'BadRequestData', 'entity without id')
+            if entity_id in self.entities:
+                return self._error(409, 'AlreadyExists', entity_id)
+            self.entities[entity_id] = entity
+            return 201, b'', {'Location': f'{ENTITIES_PATH}/{entity_id}'}
+
+        entity = self.entities.get(parts[0])
+        if entity is None:
+            return self._error(404, 'ResourceNotFound', parts[0])
+        if len(parts) == 1:
+            if method == 'GET':
+                return 200, json.dumps(entity).encode(), {'Content-Type': 'application/ld+json'}
+            if method == 'DELETE':
+                del self.entities[parts[0]]
+                return 204, b'', {}
+            return self._error(405, 'MethodNotAllowed', path)
+        if len(parts) == 3 and parts[1] == 'attrs' and method == 'PATCH':
+            key = next((name for name in entity if _short_name(name) == parts[2]), None)
+            if key is None:
+                return self._error(404, 'ResourceNotFound', f'{parts[0]}/{parts[2]}')
+            try:
+                update = json.loads(body)
+            except ValueError:
+                return self._error(400, 'InvalidRequest', 'body is not JSON')
+            if isinstance(update, dict) and 'value' in update:
+                entity[key]['value'] = update['value']
+            return 204, b'', {}
+        return self._error(405, 'MethodNotAllowed', path)
+
+    def _latency(self, method: str, body: bytes) -> Tuple[int, bytes, Dict[str, str]]:
+        """GET the current delay, or PUT/POST {"delay_ms": x} (null returns to the steps)."""
+        if method in ('PUT', 'POST'):
+            try:
+                delay_ms = json.loads(body).get('delay_ms')
+                self.latency.set(None if delay_ms is None else float(delay_ms) / 1000)
+            except (ValueError, AttributeError, TypeError):
+                return self._error(400, 'InvalidRequest', 'expected {"delay_ms": number or null}')
+        elif method != 'GET':
+            return self._error(405, 'MethodNotAllowed', LATENCY_PATH)
+        delay = self.latency.current(asyncio.get_running_loop().time())
+        return 200, json.dumps({'delay_ms': delay * 1000, 'requests': self.requests}).encode(), \
+            {'Content-Type': 'application/json'}
+
+    @staticmethod
+    def _error(status: int, kind: str, detail: str) -> Tuple[int, bytes, Dict[str, str]]:
+        body = {'type': f'https://uri.etsi.org/ngsi-ld/errors/{kind}', 'title': kind, 'detail': detail}
+        return status, json.dumps(body).encode(), {'Content-Type': 'application/json'}
+
+
+class BrokerProtocol(asyncio.Protocol):
+    """
+    One HTTP/1.1 keep-alive connection.
+
+    Requests are parsed straight from the received bytes; each response is
+    sent after the injected delay, in request order when a client pipelines.
+    """
+
+    def __init__(self, broker: Broker):
+        self.broker = broker
+        self.loop = asyncio.get_running_loop()
+        self.transport = None
+        self.buffer = b''
+        self.ready_at = 0.0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data: bytes):
+        self.buffer += data
+        while True:
+            end = self.buffer.find(b'\r\n\r\n')
+            if end < 0:
+                if len(self.buffer) > MAX_HEADER:
+                    self.transport.close()
+                return
+            head = self.buffer[:end].decode('latin-1').split('\r\n')
+            length = 0
+            close = False
+            for line in head[1:]:
+                name, _, value = line.partition(':')
+                name = name.strip().lower()
+                if name == 'content-length':
+                    length = int(value)
+                elif name == 'connection':
+                    close = value.strip().lower() == 'close'
+            if len(self.buffer) < end + 4 + length:
+                return
+            body = self.buffer[end + 4:end + 4 + length]
+            self.buffer = self.buffer[end + 4 + length:]
+            try:
+                method, path, _ = head[0].split(' ', 2)
+            except ValueError:
+                self.transport.close()
+                return
+            status, payload, headers = self.broker.handle(method, path, body)
+            self.respond(status, payload, headers, close)
+
+    def respond(self, status: int, payload: bytes, headers: Dict[str, str], close: bool) -> None:
+        lines = [f'HTTP/1.1 {status} {REASONS.get(status, "")}', f'Content-Length: {len(payload)}']
+        lines += [f'{name}: {value}' for name, value in headers.items()]
+        if close:
+            lines.append('Connection: close')
+        response = ('\r\n'.join(lines) + '\r\n\r\n').encode() + payload
+        now = self.loop.time()
+        self.ready_at = max(now + self.broker.latency.sample(now), self.ready_at)
+        if self.ready_at <= now:
+            self.send(response, close)
+        else:
+            self.loop.call_at(self.ready_at, self.send, response, close)
+
+    def send(self, response: bytes, close: bool) -> None:
+        if self.transport.is_closing():
+            return
+        self.transport.write(response)
+        if close:
+            self.transport.close()
+
+
+def load_model(path: str = MODEL_FILE) -> Dict:
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+async def serve(broker: Broker, host: str = '127.0.0.1', port: int = DEFAULT_PORT) -> None:
+    server = await asyncio.get_running_loop().create_server(lambda: BrokerProtocol(broker), host, port,
+                                                            reuse_address=True, backlog=1024)
+    print(f"Stand-in broker on http://{host}:{port}{ENTITIES_PATH} with {len(broker.entities)} entities; "
+          f"Ctrl-C to stop", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    """Main function with command line argument parsing."""
+    parser = argparse.ArgumentParser(description='Local stand-in for the NGSI-LD broker of the k6 tests')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'Port (default: {DEFAULT_PORT})')
+    parser.add_argument('--entities', type=int, default=20,
+                        help='ArtificialSensor entities created at start, urn:ngsi-ld:ArtificialSensor:1..N '
+                             '(default: 20, the maximum VUs of route-swap-test.js)')
+    parser.add_argument('--model', default=MODEL_FILE, help='JSON-LD entity model (default: ngsi-ld-model/artificial-sensor.jsonld)')
+    parser.add_argument('--step', action='append', default=[], metavar='SECONDS:MS',
+                        help='From SECONDS after the first request on, delay responses by MS milliseconds; '
+                             'repeat for a schedule, e.g. --step 0:40 --step 600:10 for a route swap at 10 min')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='Log-normal sigma applied to the delay (default: 0, constant delay)')
+    parser.add_argument('--seed', type=int, help='Random seed for the coordinates and the jitter')
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    try:
+        steps = parse_steps(args.step)
+    except ValueError as e:
+        parser.error(str(e))
+    broker = Broker(load_model(args.model), Latency(steps, args.jitter))
+    broker.populate(args.entities)
+    started = time.time()
+    try:
+        asyncio.run(serve(broker, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    print(f"Served {broker.requests:,} requests in {time.time() - started:.0f} s")
+
+
+if __name__ == "__main__":
+    main()
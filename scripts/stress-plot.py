@@ -2,8 +2,18 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.ticker as ticker
 import seaborn as sns
+import argparse
 import os
 
+import profiling
+from compressed_io import find_input
+from csv_index import read_range
+
+parser = argparse.ArgumentParser(description='Plot the average throughput of the stress tests')
+profiling.add_arguments(parser)
+args = parser.parse_args()
+profiling.configure(args)
+
 # Set seaborn style and color palette
 # Seaborn style + larger default fonts for readability
 sns.set_style("whitegrid")
@@ -11,17 +21,14 @@ sns.set_context("notebook", font_scale=1.35)
 # Use the default seaborn palette to match histogram colors
 colors = sns.color_palette("tab10")  # This gives: blue, orange, green, red, etc.
 
-# Carregar os dados dos testes de stress
-df_stress_ip = pd.read_csv('csv-data/stress-ip.csv')
-df_stress_polka1 = pd.read_csv('csv-data/stress-polka-1.csv')
-df_stress_polka2 = pd.read_csv('csv-data/stress-polka-2.csv')
-df_stress_polka3 = pd.read_csv('csv-data/stress-polka-3.csv')
-
-# Filtrar dados para apenas até 20 minutos (1200 segundos)
-df_stress_ip = df_stress_ip[df_stress_ip['time'] <= 1200]
-df_stress_polka1 = df_stress_polka1[df_stress_polka1['time'] <= 1200]
-df_stress_polka2 = df_stress_polka2[df_stress_polka2['time'] <= 1200]
-df_stress_polka3 = df_stress_polka3[df_stress_polka3['time'] <= 1200]
+# Carregar os dados dos testes de stress, apenas até 20 minutos (1200 segundos):
+# o índice de blocos ao lado de cada CSV evita ler o resto do arquivo
+with profiling.stage('load') as stage:
+    df_stress_ip = pd.DataFrame(read_range(find_input('csv-data/stress-ip.csv'), 'time', end=1200))
+    df_stress_polka1 = pd.DataFrame(read_range(find_input('csv-data/stress-polka-1.csv'), 'time', end=1200))
+    df_stress_polka2 = pd.DataFrame(read_range(find_input('csv-data/stress-polka-2.csv'), 'time', end=1200))
+    df_stress_polka3 = pd.DataFrame(read_range(find_input('csv-data/stress-polka-3.csv'), 'time', end=1200))
+    stage.rows = len(df_stress_ip) + len(df_stress_polka1) + len(df_stress_polka2) + len(df_stress_polka3)
 
 # Plotar os dados
 plt.figure(figsize=(10, 6))
@@ -83,4 +90,5 @@ ax.tick_params(axis='both', which='minor', labelsize=12, length=6, width=1.2, co
 plt.legend(fontsize=18, loc='lower right')
 plt.grid(True, alpha=0.3)
 plt.tight_layout()
-plt.savefig('result-plots/stress.png', dpi=300, bbox_inches='tight')  # Save the figure
\ No newline at end of file
+with profiling.stage('render'):
+    plt.savefig('result-plots/stress.png', dpi=300, bbox_inches='tight')  # Save the figure
\ No newline at end of file
@@ -0,0 +1,303 @@
+import gzip
+import heapq
+import struct
+from typing import Iterable, Iterator, Sequence, Tuple
+
+import numpy as np
+
+CLIENT_IP = bytes([192, 168, 0, 10])
+SERVER_IP = bytes([200, 137, 66, 110])
+SERVER_PORT = 31881
+
+REQUEST_TEMPLATE = (
+    b'PATCH /ngsi-ld/v1/entities/urn:ngsi-ld:ArtificialSensor:%d/attrs/peopleCount HTTP/1.1\r\n'
+    b'Host: 200.137.66.110:31881\r\n'
+    b'Content-Type: application/json\r\n'
+    b'Accept: application/json\r\n'
+    b'Content-Length: %d\r\n\r\n'
+)
+RESPONSE = b'HTTP/1.1 204 No Content\r\nDate: Wed, 11 Jun 2025 18:07:49 GMT\r\n\r\n'
+
+# Start of the synthetic runs (Jun 11, 2025 18:07:49 UTC, like the 24h test)
+START_NS = 1_749_665_269_000_000_000
+
+TCP_SYN = 0x02
+TCP_ACK = 0x10
+TCP_PSH_ACK = 0x18
+TCP_SYN_ACK = 0x12
+
+
+def _checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b'\0'
+    total = sum(struct.unpack('!%dH' % (len(data) // 2), data))
+    while total >> 16:
+        total = (total & 0xFFFF) + (total >> 16)
+    return ~total & 0xFFFF
+
+
+def _frame(src: bytes, sport: int, dst: bytes, dport: int, seq: int, ack: int, flags: int,
+           payload: bytes = b'') -> bytes:
+    """Build an Ethernet/IPv4/TCP frame."""
+    tcp = struct.pack('!HHIIBBHHH', sport, dport, seq & 0xFFFFFFFF, ack & 0xFFFFFFFF,
+                      5 << 4, flags, 64240, 0, 0) + payload
+    total_length = 20 + len(tcp)
+    ip = struct.pack('!BBHHHBBH4s4s', 0x45, 0, total_length, 0, 0x4000, 64, 6, 0, src, dst)
+    ip = ip[:10] + struct.pack('!H', _checksum(ip)) + ip[12:]
+    ethernet = b'\x02\x00\x00\x00\x00\x02' + b'\x02\x00\x00\x00\x00\x01' + b'\x08\x00'
+    return ethernet + ip + tcp
+
+
+def synthetic_exchanges(requests: Iterable[Tuple[int, int]], requests_per_connection: int = 1000,
+                        rtt_ns: int = 1_000_000, delayed_ack_ns: int = 0) -> Iterator[Tuple[int, bytes]]:
+    """
+    Turn (request_ns, response_ns) pairs into a time-ordered sequence of frames.
+
+    Like the VUs of the k6 tests, each keep-alive connection carries one
+    request at a time: a request reuses the connection that has been idle the
+    longest, and a new connection is opened (three-way handshake taking
+    rtt_ns) when all of them are busy or one has carried
+    requests_per_connection requests. Each request is a single PATCH segment
+    answered by a 204 No Content, with the server ACK sent after rtt_ns when
+    the response is slower than that. delayed_ack_ns holds the ACK back like
+    a delayed-ACK timer (Linux waits up to 40 ms), so it no longer measures
+    the round trip.
+
+    Args:
+        requests: Iterable of (request timestamp, response timestamp) in nanoseconds,
+            sorted by request timestamp
+        requests_per_connection: Requests sent over a connection before it is re-opened
+        rtt_ns: Round-trip time used for the handshake and ACKs
+        delayed_ack_ns: Extra delay of the server ACK of every request
+
+    Returns:
+        Iterator of (timestamp_ns, frame bytes), sorted by timestamp
+    """
+    body = b'{"type":"Property","value":7}'
+    idle = []  # heap of (free at, connection id)
+    state = {}  # connection id -> [sport, client_seq, server_seq, requests sent]
+    pending = []  # heap of frames not yet emitted
+    counter = 0
+    opened = 0
+    for request_ns, response_ns in requests:
+        # No frame generated from now on can be earlier than the next handshake
+        horizon = request_ns - rtt_ns - 1000
+        while pending and pending[0][0] < horizon:
+            ts_ns, _, frame = heapq.heappop(pending)
+            yield ts_ns, frame
+
+        frames = []
+        if idle and idle[0][0] < request_ns:
+            connection = heapq.heappop(idle)[1]
+            conn = state[connection]
+        else:
+            connection, conn = opened, None
+        if conn is None or conn[3] >= requests_per_connection:
+            sport = 1024 + opened % 64000
+            opened += 1
+            conn = state[connection] = [sport, 1000, 5000, 0]
+            frames.append((horizon, _frame(CLIENT_IP, sport, SERVER_IP, SERVER_PORT, 999, 0, TCP_SYN)))
+            frames.append((horizon + rtt_ns, _frame(SERVER_IP, SERVER_PORT, CLIENT_IP, sport, 4999,
+                                                    1000, TCP_SYN_ACK)))
+            frames.append((horizon + rtt_ns + 500, _frame(CLIENT_IP, sport, SERVER_IP, SERVER_PORT, 1000,
+                                                          5000, TCP_ACK)))
+        sport, client_seq, server_seq, sent = conn
+
+        payload = REQUEST_TEMPLATE % (connection % 20 + 1, len(body)) + body
+        frames.append((request_ns, _frame(CLIENT_IP, sport, SERVER_IP, SERVER_PORT, client_seq, server_seq,
+                                          TCP_PSH_ACK, payload)))
+        client_seq += len(payload)
+        ack_ns = request_ns + rtt_ns + delayed_ack_ns
+        if ack_ns < response_ns:
+            # Server ACKs the request before it has computed the response
+            frames.append((ack_ns, _frame(SERVER_IP, SERVER_PORT, CLIENT_IP, sport, server_seq, client_seq,
+                                          TCP_ACK)))
+        frames.append((response_ns, _frame(SERVER_IP, SERVER_PORT, CLIENT_IP, sport, server_seq, client_seq,
+                                           TCP_PSH_ACK, RESPONSE)))
+        server_seq += len(RESPONSE)
+        frames.append((response_ns + 1000, _frame(CLIENT_IP, sport, SERVER_IP, SERVER_PORT, client_seq,
+                                                  server_seq, TCP_ACK)))
+        state[connection] = [sport, client_seq, server_seq, sent + 1]
+        heapq.heappush(idle, (response_ns + 1000, connection))
+
+        for ts_ns, frame in frames:
+            counter += 1
+            heapq.heappush(pending, (ts_ns, counter, frame))
+
+    while pending:
+        ts_ns, _, frame = heapq.heappop(pending)
+        yield ts_ns, frame
+
+
+def write_capture(path: str, frames: Iterable[Tuple[int, bytes]], fmt: str = 'pcap') -> None:
+    """
+    Write frames to a pcap (nanosecond) or pcapng capture, gzip-compressed when path ends in .gz.
+
+    Args:
+        path: Output capture path
+        frames: Iterable of (timestamp_ns, Ethernet frame bytes)
+        fmt: 'pcap' or 'pcapng'
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'wb') as f:
+        if fmt == 'pcap':
+            f.write(struct.pack('<IHHiIII', 0xa1b23c4d, 2, 4, 0, 0, 262144, 1))
+            for ts_ns, frame in frames:
+                seconds, nanos = divmod(ts_ns, 1_000_000_000)
+                f.write(struct.pack('<IIII', seconds, nanos, len(frame), len(frame)))
+                f.write(frame)
+        elif fmt == 'pcapng':
+            f.write(struct.pack('<IIIHHqI', 0x0A0D0D0A, 28, 0x1A2B3C4D, 1, 0, -1, 28))
+            # Interface with nanosecond resolution (if_tsresol = 9)
+            options = struct.pack('<HHB3x', 9, 1, 9) + struct.pack('<HH', 0, 0)
+            idb_len = 20 + len(options)
+            f.write(struct.pack('<IIHHI', 1, idb_len, 1, 0, 262144) + options + struct.pack('<I', idb_len))
+            for ts_ns, frame in frames:
+                padded = frame + b'\0' * (-len(frame) % 4)
+                block_len = 32 + len(padded)
+                f.write(struct.pack('<IIIIIII', 6, block_len, 0, ts_ns >> 32, ts_ns & 0xFFFFFFFF,
+                                    len(frame), len(frame)))
+                f.write(padded)
+                f.write(struct.pack('<I', block_len))
+        else:
+            raise ValueError(f"Unknown capture format: {fmt}")
+
+
+def iter_http_times(rows: int, rate: float = 1000, base: float = 0.14, sigma: float = 0.08,
+                    tail_probability: float = 0.002, tail_scale: float = 0.2,
+                    steps: Sequence[Tuple[float, float]] = (), seed: int = 0,
+                    chunk_size: int = 1_000_000) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Generate realistic request arrivals and HTTP response times, chunk by chunk.
+
+    Arrivals are a Poisson process at rate requests/s. Response times are
+    log-normal around base seconds with a Pareto tail added to a small share
+    of requests (retransmissions, broker stalls), and steps change the base
+    level part-way through the run like a route swap.
+
+    Args:
+        rows: Number of requests
+        rate: Mean request rate (requests/s)
+        base: Median response time before any step (s)
+        sigma: Log-normal shape of the response times
+        tail_probability: Share of requests with an added heavy-tailed delay
+        tail_scale: Scale of the Pareto delay (s)
+        steps: (fraction of the run, new median in s) pairs, e.g. [(0.5, 0.16)]
+        seed: Random seed; the same seed always gives the same data
+        chunk_size: Requests generated at a time
+
+    Returns:
+        Iterator of (int64 arrival epoch ns, float64 response time in s) chunks
+    """
+    rng = np.random.default_rng(seed)
+    boundaries = np.array([int(fraction * rows) for fraction, _ in steps], dtype=np.int64)
+    levels = np.array([base] + [level for _, level in steps])
+    clock = START_NS
+    for start in range(0, rows, chunk_size):
+        n = min(chunk_size, rows - start)
+        gaps = rng.exponential(1e9 / rate, n).astype(np.int64)
+        arrivals = clock + np.cumsum(gaps)
+        clock = int(arrivals[-1])
+        medians = levels[np.searchsorted(boundaries, np.arange(start, start + n), side='right')]
+        times = medians * rng.lognormal(0, sigma, n)
+        tail = rng.random(n) < tail_probability
+        times[tail] += tail_scale * rng.pareto(1.5, int(tail.sum()))
+        yield arrivals, times
+
+
+def write_http_times_csv(path: str, rows: int, with_timestamps: bool = True,
+                         chunk_size: int = 1_000_000, **options) -> None:
+    """
+    Write synthetic requests in the CSV format produced by html-time-parser.py.
+
+    With timestamps the columns are Request Number, UTC Arrival Time (quoted
+    tshark frame.time_utc strings) and HTTP Request Time; without them the
+    file looks like route-swap.csv (Request Number, HTTP Request Time).
+
+    Args:
+        path: Output CSV file
+        rows: Number of requests
+        with_timestamps: Include the UTC Arrival Time column
+        chunk_size: Rows generated and written at a time
+        **options: Passed to iter_http_times (rate, steps, seed, ...)
+    """
+    import pandas as pd
+    from tshark_time import format_frame_times
+
+    written = 0
+    with open(path, 'w', newline='') as f:
+        for arrivals, times in iter_http_times(rows, chunk_size=chunk_size, **options):
+            columns = {'Request Number': np.arange(written + 1, written + len(times) + 1)}
+            if with_timestamps:
+                columns['UTC Arrival Time'] = format_frame_times(arrivals)
+            columns['HTTP Request Time'] = times
+            pd.DataFrame(columns).to_csv(f, index=False, header=written == 0, float_format='%.9f')
+            written += len(times)
+
+
+
+K6_METRICS = [('http_reqs', 'counter'), ('http_req_duration', 'trend'), ('http_req_blocked', 'trend'),
+              ('http_req_connecting', 'trend'), ('http_req_tls_handshaking', 'trend'), ('http_req_sending', 'trend'),
+              ('http_req_waiting', 'trend'), ('http_req_receiving', 'trend'), ('http_req_failed', 'rate')]
+
+
+def write_k6_json(path: str, rows: int, scenarios: Sequence[Tuple[float, str]] = ((1 / 6, 'slowRoute'),
+                                                                             (1.0, 'fastRoute')),
+                  vus: int = 15, utc_offset_hours: int = -3, chunk_size: int = 100_000, **options) -> None:
+    """
+    Write synthetic requests the way k6 --out json reports them (NDJSON).
+
+    Every request produces the points k6 emits for an HTTP request
+    (http_reqs, http_req_duration, ..., http_req_waiting, ...), one line
+    each, all with the same time and tags, after the "Metric" declarations.
+    Times are local RFC 3339 strings like k6's, with the response times of
+    iter_http_times in milliseconds.
+
+    Args:
+        path: Output file (.gz is compressed)
+        rows: Number of requests
+        scenarios: (fraction of the run where the scenario ends, name) pairs
+        vus: Requests are spread over this many VUs
+        utc_offset_hours: Offset of the local times written
+        chunk_size: Requests generated at a time
+        **options: Passed to iter_http_times (rate, steps, seed, ...)
+    """
+    import datetime
+    import json
+
+    zone = datetime.timezone(datetime.timedelta(hours=utc_offset_hours))
+    suffix = f'{"+" if utc_offset_hours >= 0 else "-"}{abs(utc_offset_hours):02d}:00'
+    ends = np.array([int(fraction * rows) for fraction, _ in scenarios], dtype=np.int64)
+    names = [name for _, name in scenarios]
+    rng = np.random.default_rng(options.get('seed', 0) + 1)
+    opener = gzip.open if path.endswith('.gz') else open
+    written = 0
+    with opener(path, 'wt') as f:
+        for metric, kind in K6_METRICS:
+            f.write(json.dumps({'type': 'Metric', 'data': {'name': metric, 'type': kind, 'contains': 'time',
+                                                           'thresholds': [], 'submetrics': None},
+                                'metric': metric}, separators=(',', ':')) + '\n')
+        for arrivals, times in iter_http_times(rows, chunk_size=chunk_size, **options):
+            n = len(times)
+            scenario = np.searchsorted(ends, np.arange(written, written + n), side='right')
+            vu = rng.integers(1, vus + 1, n)
+            sending = rng.uniform(0.01, 0.05, n)
+            receiving = rng.uniform(0.01, 0.08, n)
+            lines = []
+            for ns, seconds, code, user, send, receive in zip(arrivals.tolist(), times.tolist(), scenario.tolist(),
+                                                              vu.tolist(), sending.tolist(), receiving.tolist()):
+                stamp = datetime.datetime.fromtimestamp(ns // 1_000_000_000, zone)
+                fraction = f'{ns % 1_000_000_000:09d}'.rstrip('0')
+                time = f'{stamp:%Y-%m-%dT%H:%M:%S}{"." + fraction if fraction else ""}{suffix}'
+                duration = seconds * 1000
+                url = f'http://200.137.66.110:31881/ngsi-ld/v1/entities/urn:ngsi-ld:ArtificialSensor:{user}/attrs/peopleCount'
+                tags = json.dumps({'expected_response': 'true', 'group': '', 'method': 'PATCH', 'name': url,
+                                   'proto': 'HTTP/1.1', 'scenario': names[min(code, len(names) - 1)],
+                                   'status': '204', 'tls_version': '', 'url': url, 'vu': str(user)},
+                                  separators=(',', ':'))
+                values = [1, duration, 0.0021, 0, 0, send, duration - send - receive, receive, 0]
+                for (metric, _), value in zip(K6_METRICS, values):
+                    lines.append(f'{{"metric":"{metric}","type":"Point","data":{{"time":"{time}",'
+                                 f'"value":{round(value, 6)!r},"tags":{tags}}}}}\n')
+            f.write(''.join(lines))
+            written += n
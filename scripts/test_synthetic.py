@@ -0,0 +1,208 @@
+import os
+import struct
+
+import numpy as np
+import pytest
+
+import capture_shards
+import csv_index
+import k6_ingest
+from columnar_cache import load_columns
+from k6_ingest import parse_rfc3339
+from pcap_reader import LINKTYPE_ETHERNET, HttpMatcher, extract_http_times
+from quantile_sketch import LogHistogram, merge_sketches
+from synthetic_data import (CLIENT_IP, REQUEST_TEMPLATE, RESPONSE, SERVER_IP, SERVER_PORT, START_NS, TCP_PSH_ACK,
+                            _frame, synthetic_exchanges, write_capture, write_http_times_csv, write_k6_json)
+from tshark_time import NAT, format_frame_times, parse_frame_times
+
+MS = 1_000_000
+
+
+def known_requests(count: int = 3000):
+    """(request_ns, response_ns) pairs, one every ms, with distinct response times."""
+    rng = np.random.default_rng(1)
+    times = rng.integers(200_000, 40 * MS, count)
+    return [(START_NS + i * MS, START_NS + i * MS + int(t)) for i, t in enumerate(times)]
+
+
+def expected_times(requests):
+    """(arrival_ns, http_time_ns) of the requests, sorted like the readers return them."""
+    arrivals = np.array([response for _, response in requests], dtype=np.int64)
+    http_times = np.array([response - request for request, response in requests], dtype=np.int64)
+    order = np.argsort(arrivals, kind='stable')
+    return arrivals[order], http_times[order]
+
+
+def write_pcapng_two_interfaces(path: str, frames) -> None:
+    """pcapng whose second interface is described after a tenth of the packets, then used by every 11th one."""
+    options = struct.pack('<HHB3x', 9, 1, 9) + struct.pack('<HH', 0, 0)
+    idb = struct.pack('<IIHHI', 1, 20 + len(options), LINKTYPE_ETHERNET, 0, 262144) + options
+    idb += struct.pack('<I', 20 + len(options))
+    with open(path, 'wb') as f:
+        f.write(struct.pack('<IIIHHqI', 0x0A0D0D0A, 28, 0x1A2B3C4D, 1, 0, -1, 28) + idb)
+        for i, (ts_ns, frame) in enumerate(frames):
+            if i == len(frames) // 10:
+                f.write(idb)
+            if_id = 1 if i >= len(frames) // 10 and i % 11 == 0 else 0
+            padded = frame + b'\0' * (-len(frame) % 4)
+            block_len = 32 + len(padded)
+            f.write(struct.pack('<IIIIIII', 6, block_len, if_id, ts_ns >> 32, ts_ns & 0xFFFFFFFF,
+                                len(frame), len(frame)) + padded + struct.pack('<I', block_len))
+
+
+@pytest.mark.parametrize('name', ['capture.pcap', 'capture.pcapng', 'capture.pcap.gz'])
+def test_readers_match_known_response_times(tmp_path, name):
+    requests = known_requests()
+    path = str(tmp_path / name)
+    write_capture(path, synthetic_exchanges(requests), 'pcapng' if 'pcapng' in name else 'pcap')
+    arrivals, http_times = expected_times(requests)
+
+    serial = extract_http_times(path)
+    order = np.argsort(serial[0], kind='stable')
+    assert np.array_equal(serial[0][order], arrivals)
+    assert np.array_equal(serial[1][order], http_times)
+    for shards in (2, 7):
+        sharded = capture_shards.extract_http_times_sharded(path, shards, 2)
+        assert np.array_equal(sharded[0], arrivals)
+        assert np.array_equal(sharded[1], http_times)
+
+
+def test_sharded_reader_sees_interfaces_described_mid_capture(tmp_path):
+    requests = known_requests()
+    path = str(tmp_path / 'capture.pcapng')
+    write_pcapng_two_interfaces(path, list(synthetic_exchanges(requests)))
+    arrivals, http_times = expected_times(requests)
+
+    sharded = capture_shards.extract_http_times_sharded(path, 6, 2)
+    assert np.array_equal(sharded[0], arrivals)
+    assert np.array_equal(sharded[1], http_times)
+
+
+def shard_result(matcher: HttpMatcher):
+    """What capture_shards._process_shard returns for the frames fed to matcher."""
+    return {
+        'arrivals': np.array(matcher.arrivals, dtype=np.int64),
+        'http_times': np.array(matcher.http_times, dtype=np.int64),
+        'orphans': matcher.orphans,
+        'pending': {key: list(queue) for key, queue in matcher.pending.items() if queue},
+    }
+
+
+def test_continuation_orphans_are_reconciled_across_shards():
+    body = b'{"type":"Property","value":7}'
+    headers = REQUEST_TEMPLATE % (1, len(body))
+
+    def feed(matcher, ts_ns, frame):
+        matcher.feed(frame, ts_ns, LINKTYPE_ETHERNET, 0, len(frame))
+
+    first, second = HttpMatcher(), HttpMatcher()
+    # Headers of a request in the first shard, its body and the response in the second
+    feed(first, START_NS, _frame(CLIENT_IP, 40000, SERVER_IP, SERVER_PORT, 1000, 5000, TCP_PSH_ACK, headers))
+    feed(second, START_NS + 2 * MS, _frame(CLIENT_IP, 40000, SERVER_IP, SERVER_PORT, 1000 + len(headers), 5000,
+                                           TCP_PSH_ACK, body))
+    feed(second, START_NS + 9 * MS, _frame(SERVER_IP, SERVER_PORT, CLIENT_IP, 40000, 5000,
+                                           1000 + len(headers) + len(body), TCP_PSH_ACK, RESPONSE))
+    # Response to a request sent before the capture started: no match
+    feed(second, START_NS + 3 * MS, _frame(SERVER_IP, SERVER_PORT, CLIENT_IP, 40001, 7000, 3000,
+                                           TCP_PSH_ACK, RESPONSE))
+
+    assert [kind for _, kind, _ in second.orphans] == ['continuation', 'response', 'response']
+    shards = capture_shards.reconcile_shards([shard_result(first), shard_result(second)])
+    arrivals, http_times = capture_shards.merge_shards(shards)
+    assert arrivals.tolist() == [START_NS + 9 * MS]
+    assert http_times.tolist() == [7 * MS]
+
+
+def test_parse_frame_times():
+    values = ['Jun 11, 2025 18:07:49.728608123 UTC', '"Jun 11, 2025 18:07:49.728608000 UTC"',
+              'Jun  1, 2025 00:00:00.5 UTC', 'Jun 1, 2025 00:00:00 UTC', 'Feb 29, 2024 12:00:00.000000001 UTC',
+              'Feb 29, 2023 12:00:00 UTC', 'Feb 30, 2024 12:00:00 UTC', 'Apr 31, 2025 12:00:00 UTC',
+              'Feb 29, 1900 12:00:00 UTC', 'Jun 11, 2025 24:00:00 UTC', 'Foo 11, 2025 18:07:49 UTC', '']
+    ns, bad = parse_frame_times(values)
+    expected = ['2025-06-11T18:07:49.728608123', '2025-06-11T18:07:49.728608', '2025-06-01T00:00:00.5',
+                '2025-06-01T00:00:00', '2024-02-29T12:00:00.000000001']
+    assert ns[:5].tolist() == [int(np.datetime64(value, 'ns').astype(np.int64)) for value in expected]
+    assert bad.tolist() == [False] * 5 + [True] * 7
+    assert (ns[bad] == NAT).all()
+
+    # Formatting and parsing again is lossless
+    stamps = START_NS + np.random.default_rng(2).integers(0, 400 * 86400 * 10 ** 9, 1000)
+    assert np.array_equal(parse_frame_times(format_frame_times(stamps))[0], stamps)
+
+
+def test_parse_rfc3339():
+    values = ['2025-06-11T15:07:49.728608123-03:00', '2025-06-11T18:07:49Z', '2025-06-11T18:07:49.5+00:00',
+              '2024-02-29T23:30:00+05:30', '2025-02-29T00:00:00Z', '2025-06-31T00:00:00Z',
+              '2025-06-11T18:07:49.Z', '2025-06-11T18:07:49', 'not a time']
+    ns, bad = parse_rfc3339(values)
+    expected = ['2025-06-11T18:07:49.728608123', '2025-06-11T18:07:49', '2025-06-11T18:07:49.5',
+                '2024-02-29T18:00:00']
+    assert ns[:4].tolist() == [int(np.datetime64(value, 'ns').astype(np.int64)) for value in expected]
+    assert bad.tolist() == [False] * 4 + [True] * 5
+    assert (ns[bad] == NAT).all()
+
+
+def test_log_histogram_merge_and_error_bound():
+    rng = np.random.default_rng(3)
+    values = np.concatenate([rng.lognormal(-2, 1.5, 50_000), np.zeros(100), 1e-6 + rng.pareto(1.5, 500)])
+    qs = [0, 0.01, 0.25, 0.5, 0.9, 0.99, 0.999, 1]
+
+    whole = LogHistogram(0.01)
+    whole.update(values)
+    chunks = []
+    for chunk in np.array_split(values, 7):
+        sketch = LogHistogram(0.01)
+        sketch.update(chunk)
+        chunks.append(sketch)
+    merged = merge_sketches(chunks)
+    assert merged.count == whole.count == len(values)
+    assert merged.zero_count == whole.zero_count
+    assert (merged.min, merged.max) == (whole.min, whole.max)
+    assert merged.to_dict()['buckets'] == whole.to_dict()['buckets']
+    assert merged.to_dict()['counts'] == whole.to_dict()['counts']
+
+    # Every quantile is within the relative error of the value of its rank
+    exact = np.quantile(values, qs, method='lower')
+    estimate = merged.quantiles(qs)
+    assert np.all(np.abs(estimate - exact) <= 0.01 * exact + 1e-12)
+
+    with pytest.raises(ValueError):
+        merged.merge(LogHistogram(0.02))
+
+
+@pytest.mark.parametrize('start, end', [('2025-06-11T18:07:55', '2025-06-11T18:08:03.5'), (None, '+2s'),
+                                        ('18:08:10', None), ('+100d', None)])
+def test_read_range_matches_full_load(tmp_path, start, end):
+    path = str(tmp_path / 'times.csv')
+    write_http_times_csv(path, 20_000, rate=1000, seed=4)
+    full = load_columns(path)
+    column = full['UTC Arrival Time']
+    low, high = csv_index.resolve_range('time', int(column.min()), start, end)
+    keep = np.ones(len(column), dtype=bool)
+    if low is not None:
+        keep &= column >= low
+    if high is not None:
+        keep &= column <= high
+
+    ranged = csv_index.read_range(path, 'UTC Arrival Time', start, end, block_rows=500)
+    assert list(ranged) == list(full)
+    for name in full:
+        assert np.array_equal(ranged[name], np.asarray(full[name])[keep])
+
+
+def test_k6_ingest_is_independent_of_the_worker_count(tmp_path):
+    json_path = str(tmp_path / 'results.json')
+    write_k6_json(json_path, 5000, seed=5)
+    outputs = {}
+    for workers in (1, 4):
+        output = str(tmp_path / f'results-{workers}' / 'results.csv')
+        assert k6_ingest.ingest_k6_json(json_path, output, workers=workers, block_size=64 << 10) == 5000
+        with open(output, 'rb') as f:
+            outputs[workers] = (f.read(), load_columns(output))
+    assert os.path.getsize(json_path) > 4 * (64 << 10)  # several shards with 4 workers
+
+    single, sharded = outputs[1], outputs[4]
+    assert single[0] == sharded[0]
+    assert list(single[1]) == list(sharded[1])
+    for name in single[1]:
+        assert np.array_equal(single[1][name], sharded[1][name], equal_nan=single[1][name].dtype.kind == 'f')
@@ -0,0 +1,339 @@
+import argparse
+import csv
+import hashlib
+import json
+import math
+import os
+import sys
+from typing import Dict, Sequence
+
+import numpy as np
+
+from columnar_cache import CACHE_DIR_NAME, NAT, load_columns
+
+NS_PER_SECOND = 1_000_000_000
+NS_PER_DAY = 86400 * NS_PER_SECOND
+WINDOW_CACHE_VERSION = 1
+CHUNK_SIZE = 1_000_000
+TREND_PERCENTILES = [50, 95, 99]
+
+
+def window_keys(timestamps: np.ndarray, window_ns: int, fold_day: bool = False) -> np.ndarray:
+    """
+    Window index of every timestamp, with integer arithmetic on epoch nanoseconds.
+
+    Windows are aligned on multiples of window_ns since the epoch; with
+    fold_day the timestamps are first reduced to the time of day, so the
+    windows of a run crossing midnight line up on one 0-24 h axis.
+    """
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    if fold_day:
+        timestamps = timestamps % NS_PER_DAY
+    return timestamps // window_ns
+
+
+def grouped_quantiles(keys: np.ndarray, values: np.ndarray, percentiles: Sequence[float]) -> Dict[str, np.ndarray]:
+    """
+    Exact per-group count, mean and percentiles with one grouped sort.
+
+    The rows are sorted by (key, value), so every group is a contiguous,
+    sorted run and each percentile is read at its rank inside the run
+    (numpy's default linear interpolation), for all groups at once.
+
+    Args:
+        keys: Integer group of every value
+        values: Values (no NaNs)
+        percentiles: Percentiles to compute (0-100)
+
+    Returns:
+        Dictionary with 'keys', 'count', 'mean' and 'quantiles' (groups x percentiles)
+    """
+    keys = np.asarray(keys, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    if len(keys) == 0:
+        return {'keys': np.empty(0, dtype=np.int64), 'count': np.empty(0, dtype=np.int64),
+                'mean': np.empty(0), 'quantiles': np.empty((0, len(percentiles)))}
+    order = np.lexsort((values, keys))
+    keys, values = keys[order], values[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    counts = np.diff(np.r_[starts, len(keys)])
+
+    positions = starts[:, None] + np.asarray(percentiles, dtype=np.float64)[None, :] / 100 * (counts[:, None] - 1)
+    low = np.floor(positions).astype(np.int64)
+    high = np.ceil(positions).astype(np.int64)
+    quantiles = values[low] + (values[high] - values[low]) * (positions - low)
+    return {
+        'keys': keys[starts],
+        'count': counts,
+        'mean': np.add.reduceat(values, starts) / counts,
+        'quantiles': quantiles,
+    }
+
+
+class WindowedSketch:
+    """
+    Per-window quantile sketches in a single 2-D count matrix.
+
+    Every window holds the logarithmic buckets of a LogHistogram with the
+    same relative error (row = window, column = bucket), so a chunk of
+    samples is added with one bincount over (window, bucket) pairs and
+    memory is bounded by the number of windows, not the number of samples.
+    count, mean, min and max are exact per window.
+    """
+
+    def __init__(self, window_ns: int, fold_day: bool = False, relative_error: float = 0.01):
+        if not 0 < relative_error < 1:
+            raise ValueError("relative_error must be between 0 and 1")
+        self.window_ns = window_ns
+        self.fold_day = fold_day
+        self.relative_error = relative_error
+        self.gamma = (1 + relative_error) / (1 - relative_error)
+        self.log_gamma = math.log(self.gamma)
+        self.window_offset = 0
+        self.bucket_offset = 0
+        self.counts = np.zeros((0, 0), dtype=np.int64)
+        self.zero_counts = np.zeros(0, dtype=np.int64)
+        self.totals = np.zeros(0)
+        self.minima = np.zeros(0)
+        self.maxima = np.zeros(0)
+
+    def _grow(self, window_low: int, window_high: int, bucket_low: int, bucket_high: int) -> None:
+        """Make sure windows and buckets low..high (inclusive) are allocated."""
+        rows, columns = self.counts.shape
+        if rows:
+            window_low = min(window_low, self.window_offset)
+            window_high = max(window_high, self.window_offset + rows - 1)
+        if columns:
+            bucket_low = min(bucket_low, self.bucket_offset)
+            bucket_high = max(bucket_high, self.bucket_offset + columns - 1)
+        shape = (window_high - window_low + 1, bucket_high - bucket_low + 1)
+        if shape == self.counts.shape and window_low == self.window_offset and bucket_low == self.bucket_offset:
+            return
+        row = self.window_offset - window_low if rows else 0
+        column = self.bucket_offset - bucket_low if columns else 0
+
+        def regrow(array, fill):
+            grown = np.full(shape[0], fill, dtype=array.dtype)
+            grown[row:row + rows] = array
+            return grown
+
+        counts = np.zeros(shape, dtype=np.int64)
+        counts[row:row + rows, column:column + columns] = self.counts
+        self.counts = counts
+        self.zero_counts = regrow(self.zero_counts, 0)
+        self.totals = regrow(self.totals, 0.0)
+        self.minima = regrow(self.minima, np.inf)
+        self.maxima = regrow(self.maxima, -np.inf)
+        self.window_offset, self.bucket_offset = window_low, bucket_low
+
+    def update(self, timestamps: np.ndarray, values: np.ndarray) -> None:
+        """Add a chunk of (epoch ns, value) samples; NAT timestamps and NaN values are ignored."""
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        valid = (timestamps != NAT) & ~np.isnan(values)
+        timestamps, values = timestamps[valid], values[valid]
+        if len(values) == 0:
+            return
+        windows = window_keys(timestamps, self.window_ns, self.fold_day)
+        positive = values > 0
+        buckets = np.zeros(len(values), dtype=np.int64)
+        buckets[positive] = np.ceil(np.log(values[positive]) / self.log_gamma)
+        bucket_low = int(buckets[positive].min()) if positive.any() else self.bucket_offset
+        bucket_high = int(buckets[positive].max()) if positive.any() else bucket_low
+        self._grow(int(windows.min()), int(windows.max()), bucket_low, bucket_high)
+
+        rows = windows - self.window_offset
+        n_rows, n_columns = self.counts.shape
+        cells = rows[positive] * n_columns + buckets[positive] - self.bucket_offset
+        self.counts += np.bincount(cells, minlength=n_rows * n_columns).reshape(n_rows, n_columns)
+        self.zero_counts += np.bincount(rows[~positive], minlength=n_rows)
+        self.totals += np.bincount(rows, weights=values, minlength=n_rows)
+        np.minimum.at(self.minima, rows, values)
+        np.maximum.at(self.maxima, rows, values)
+
+    def series(self, percentiles: Sequence[float] = TREND_PERCENTILES) -> Dict[str, np.ndarray]:
+        """
+        Per-window statistics of the non-empty windows, in window order.
+
+        Returns:
+            Dictionary with 'keys', 'count', 'mean', 'min', 'max' and
+            'quantiles' (windows x percentiles, within the relative error)
+        """
+        count = self.zero_counts + self.counts.sum(axis=1)
+        rows = np.flatnonzero(count)
+        count = count[rows]
+        counts, zero_counts = self.counts[rows], self.zero_counts[rows]
+        cumulative = zero_counts[:, None] + np.cumsum(counts, axis=1)
+
+        quantiles = np.empty((len(rows), len(percentiles)))
+        for column, q in enumerate(percentiles):
+            ranks = q / 100 * (count - 1)
+            # Same as searchsorted(side='right') on every row at once
+            bucket = np.minimum((cumulative <= ranks[:, None]).sum(axis=1), max(counts.shape[1] - 1, 0))
+            values = 2 * self.gamma ** (self.bucket_offset + bucket) / (self.gamma + 1)
+            values = np.where(ranks < zero_counts, 0.0, values)
+            quantiles[:, column] = np.clip(values, self.minima[rows], self.maxima[rows])
+        return {
+            'keys': rows + self.window_offset,
+            'count': count,
+            'mean': self.totals[rows] / count,
+            'min': self.minima[rows],
+            'max': self.maxima[rows],
+            'quantiles': quantiles,
+        }
+
+
+def window_series(timestamps: np.ndarray, values: np.ndarray, window_ns: int,
+                  percentiles: Sequence[float] = TREND_PERCENTILES, fold_day: bool = False,
+                  engine: str = 'exact', chunk_size: int = CHUNK_SIZE, scale: float = 1.0) -> Dict:
+    """
+    Count, mean and percentiles of values over fixed time windows.
+
+    Args:
+        timestamps: int64 epoch nanoseconds (NAT for missing)
+        values: Values of the samples (NaN for missing)
+        window_ns: Window length in nanoseconds
+        percentiles: Percentiles to compute (0-100)
+        fold_day: Reduce timestamps to the time of day first
+        engine: 'exact' sorts all samples at once; 'sketch' reads them chunk by
+            chunk into per-window sketches (memory bounded by the window count)
+        chunk_size: Samples read at a time by the sketch engine
+        scale: Factor applied to the values, as they are read (a memory-mapped
+            column is never copied as a whole)
+
+    Returns:
+        Time series dictionary with 'start_ns' (window start, time of day with
+        fold_day), 'count', 'mean', 'quantiles' (windows x percentiles),
+        'percentiles', 'window_ns' and 'fold_day'
+    """
+    if engine == 'sketch':
+        sketch = WindowedSketch(window_ns, fold_day)
+        for start in range(0, len(values), chunk_size):
+            chunk = values[start:start + chunk_size]
+            sketch.update(timestamps[start:start + chunk_size], chunk * scale if scale != 1 else chunk)
+        groups = sketch.series(percentiles)
+    elif engine == 'exact':
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+        valid = (timestamps != NAT) & ~np.isnan(values)
+        kept = values[valid]
+        if scale != 1:
+            kept *= scale  # in place: kept is already a copy
+        groups = grouped_quantiles(window_keys(timestamps[valid], window_ns, fold_day), kept, percentiles)
+    else:
+        raise ValueError(f"Unknown engine: {engine}")
+    return {
+        'start_ns': groups['keys'] * window_ns,
+        'count': groups['count'],
+        'mean': groups['mean'],
+        'quantiles': groups['quantiles'],
+        'percentiles': np.asarray(percentiles, dtype=np.float64),
+        'window_ns': window_ns,
+        'fold_day': fold_day,
+    }
+
+
+def save_series(path: str, series: Dict) -> None:
+    """Write a time series to a .npz file (written aside and moved into place)."""
+    tmp_path = f'{path}.tmp-{os.getpid()}.npz'
+    np.savez(tmp_path, **{key: np.asarray(value) for key, value in series.items()})
+    os.replace(tmp_path, path)
+
+
+def load_series(path: str) -> Dict:
+    """Read a time series written by save_series."""
+    with np.load(path) as data:
+        series = {key: data[key] for key in data.files}
+    series['window_ns'] = int(series['window_ns'])
+    series['fold_day'] = bool(series['fold_day'])
+    return series
+
+
+def _cache_path(csv_path: str, key: list) -> str:
+    """Return the cache file for one time series of a CSV file."""
+    stat = os.stat(csv_path)
+    signature = [WINDOW_CACHE_VERSION, os.path.abspath(csv_path), stat.st_size, stat.st_mtime_ns] + key
+    digest = hashlib.sha256(json.dumps(signature).encode()).hexdigest()[:16]
+    directory = os.path.join(os.path.dirname(os.path.abspath(csv_path)), CACHE_DIR_NAME, 'windows')
+    return os.path.join(directory, f'{digest}.npz')
+
+
+def csv_window_series(csv_path: str, window_ns: int, percentiles: Sequence[float] = TREND_PERCENTILES,
+                      fold_day: bool = False, engine: str = 'exact', time_column: str = 'UTC Arrival Time',
+                      value_column: str = 'HTTP Request Time', scale: float = 1000,
+                      use_cache: bool = True) -> Dict:
+    """
+    Windowed statistics of one column of a CSV file over its timestamps.
+
+    The columns come from the columnar cache and the result is cached next
+    to the data, keyed by the size and modification time of the CSV and the
+    parameters, so plots only load a few kilobytes once it is computed.
+
+    Args:
+        csv_path: Source CSV file
+        window_ns: Window length in nanoseconds
+        percentiles: Percentiles to compute (0-100)
+        fold_day: Reduce timestamps to the time of day first
+        engine: 'exact' or 'sketch' (see window_series)
+        time_column: Column holding the tshark timestamps
+        value_column: Column holding the values
+        scale: Factor applied to the values (1000 turns seconds into ms)
+        use_cache: Read and write the on-disk cache
+
+    Returns:
+        Time series dictionary (see window_series)
+    """
+    cache_path = _cache_path(csv_path, [window_ns, list(percentiles), fold_day, engine,
+                                        time_column, value_column, scale])
+    if use_cache and os.path.exists(cache_path):
+        return load_series(cache_path)
+
+    columns = load_columns(csv_path, [time_column, value_column])
+    if time_column not in columns or value_column not in columns:
+        raise ValueError(f"{csv_path} has no '{time_column}' and '{value_column}' columns")
+    series = window_series(columns[time_column], columns[value_column], window_ns, percentiles, fold_day, engine,
+                           scale=scale)
+
+    if use_cache:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        save_series(cache_path, series)
+    return series
+
+
+def main():
+    """Main function with command line argument parsing."""
+    from percentiles import parse_percentiles
+
+    parser = argparse.ArgumentParser(description='Per-window HTTP time percentiles of a capture CSV')
+    parser.add_argument('csv', help='CSV with UTC Arrival Time and HTTP Request Time columns')
+    parser.add_argument('output', help='Time series file to write (.npz), or - to print it')
+    parser.add_argument('--window', type=float, default=60, help='Window length in seconds (default: 60)')
+    parser.add_argument('--percentiles', type=parse_percentiles, default=TREND_PERCENTILES,
+                        help='Comma-separated percentiles (default: 50,95,99)')
+    parser.add_argument('--time-of-day', action='store_true',
+                        help='Fold the timestamps onto a single 0-24 h day')
+    parser.add_argument('--engine', choices=['exact', 'sketch'], default='exact',
+                        help='exact: grouped sort of all samples; sketch: chunked, memory bounded by the window count')
+    args = parser.parse_args()
+
+    window_ns = int(round(args.window * NS_PER_SECOND))
+    if window_ns <= 0:
+        parser.error('--window must be positive')
+    series = csv_window_series(args.csv, window_ns, args.percentiles, args.time_of_day, args.engine,
+                               use_cache=False)
+    if args.output != '-':
+        save_series(args.output, series)
+        print(f"{len(series['count']):,} windows written to {args.output}")
+        return
+
+    from tshark_time import format_frame_times
+    starts = format_frame_times(series['start_ns'])
+    # tshark timestamps contain a comma ("Jun 11, 2025 ..."), so cells are quoted as needed
+    writer = csv.writer(sys.stdout, lineterminator='\n')
+    writer.writerow(["Window start", "Count", "Mean (ms)"] + [f"P{q:g} (ms)" for q in series['percentiles']])
+    for start, count, mean, quantiles in zip(starts, series['count'], series['mean'], series['quantiles']):
+        writer.writerow([start, count, f"{mean:.3f}"] + [f"{value:.3f}" for value in quantiles])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+from typing import Sequence, Tuple
+
+import numpy as np
+
+# Missing or unparseable timestamps are returned as this value (same as numpy's NaT)
+NAT = np.iinfo(np.int64).min
+
+MONTHS = [b'Jan', b'Feb', b'Mar', b'Apr', b'May', b'Jun', b'Jul', b'Aug', b'Sep', b'Oct', b'Nov', b'Dec']
+
+# Canonical layout of tshark's frame.time_utc, e.g. "Jun 11, 2025 18:07:49.728608000 UTC"
+LAYOUT_WIDTH = 35
+RAW_WIDTH = 48
+DIGIT_POSITIONS = [5, 8, 9, 10, 11, 13, 14, 16, 17, 19, 20]
+SEPARATORS = {3: b' ', 6: b',', 7: b' ', 12: b' ', 15: b':', 18: b':'}
+FRACTION_START = 22
+FRACTION_DIGITS = 9
+
+NS_PER_SECOND = 1_000_000_000
+
+# Days in each month of a common year (February gains a day in leap years)
+MONTH_DAYS = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31], dtype=np.int64)
+
+
+def days_from_civil(year: np.ndarray, month: np.ndarray, day: np.ndarray) -> np.ndarray:
+    """Return days since 1970-01-01 for proleptic Gregorian dates (vectorized)."""
+    year = year - (month <= 2)
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * (month + np.where(month > 2, -3, 9)) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    return era * 146097 + day_of_era - 719468
+
+
+def days_in_month(year: np.ndarray, month: np.ndarray) -> np.ndarray:
+    """Return the number of days of each month (1-12) of the proleptic Gregorian calendar (vectorized)."""
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    return MONTH_DAYS[np.clip(month, 1, 12) - 1] + (leap & (month == 2))
+
+
+def civil_from_days(days: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return (year, month, day) for days since 1970-01-01 (vectorized)."""
+    days = days + 719468
+    era = days // 146097
+    day_of_era = days - era * 146097
+    year_of_era = (day_of_era - day_of_era // 1460 + day_of_era // 36524 - day_of_era // 146096) // 365
+    day_of_year = day_of_era - (365 * year_of_era + year_of_era // 4 - year_of_era // 100)
+    month_index = (5 * day_of_year + 2) // 153
+    day = day_of_year - (153 * month_index + 2) // 5 + 1
+    month = month_index + np.where(month_index < 10, 3, -9)
+    year = year_of_era + era * 400 + (month <= 2)
+    return year, month, day
+
+
+def _to_byte_matrix(values) -> np.ndarray:
+    """Return the strings as a (rows, RAW_WIDTH) uint8 matrix, zero padded."""
+    raw = np.asarray(values)
+    try:
+        raw = raw.astype(f'S{RAW_WIDTH}')
+    except UnicodeEncodeError:
+        raw = np.char.encode(raw.astype(str), 'ascii', 'replace').astype(f'S{RAW_WIDTH}')
+    return np.frombuffer(raw.tobytes(), dtype=np.uint8).reshape(len(raw), RAW_WIDTH)
+
+
+def parse_frame_times(values: Sequence) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Parse tshark frame.time_utc strings into epoch nanoseconds.
+
+    The whole column is handled at once: strings are laid out as a byte
+    matrix, realigned to the canonical layout (optional surrounding quotes,
+    space-padded, zero-padded or single-digit day) and every field is read
+    at its fixed offset with integer arithmetic. The fraction keeps all of
+    its digits, so nanoseconds are not truncated like with strptime.
+
+    Args:
+        values: Sequence of strings such as "Jun 11, 2025 18:07:49.728608000 UTC"
+
+    Returns:
+        Tuple of (int64 epoch nanoseconds with NAT for bad rows, boolean mask of bad rows)
+    """
+    n = len(values)
+    if n == 0:
+        return np.empty(0, dtype=np.int64), np.zeros(0, dtype=bool)
+    raw = _to_byte_matrix(values)
+
+    # Skip leading quotes/spaces, then detect a single-digit day ("Jun 1, 2025")
+    lead = np.zeros(n, dtype=np.int64)
+    for _ in range(2):
+        at = raw[np.arange(n), lead]
+        lead += (at == ord('"')) | (at == ord(' '))
+    single_digit_day = raw[np.arange(n), lead + 5] == ord(',')
+
+    # Realign every row to the canonical layout; there are only a handful of
+    # distinct (lead, day width) combinations, so this is a few block copies
+    text = np.zeros((n, LAYOUT_WIDTH), dtype=np.uint8)
+    for start in np.unique(lead):
+        for single in (False, True):
+            rows = (lead == start) & (single_digit_day == single)
+            if not rows.any():
+                continue
+            if single:
+                text[rows, :4] = raw[rows, start:start + 4]
+                text[rows, 4] = ord(' ')
+                text[rows, 5:] = raw[rows, start + 4:start + LAYOUT_WIDTH - 1]
+            else:
+                text[rows] = raw[rows, start:start + LAYOUT_WIDTH]
+
+    digits = text - np.uint8(ord('0'))  # non-digits wrap around to values > 9
+    is_digit = digits <= 9
+
+    def number(*positions):
+        value = np.zeros(n, dtype=np.int64)
+        for position in positions:
+            value = value * 10 + digits[:, position]
+        return value
+
+    bad = ~is_digit[:, DIGIT_POSITIONS].all(axis=1)
+    for position, separator in SEPARATORS.items():
+        bad |= text[:, position] != separator[0]
+    day_tens = np.where(text[:, 4] == ord(' '), 0, digits[:, 4].astype(np.int64))
+    bad |= ~(is_digit[:, 4] | (text[:, 4] == ord(' ')))
+
+    month_key = (text[:, 0].astype(np.int32) << 16) | (text[:, 1].astype(np.int32) << 8) | text[:, 2]
+    month = np.zeros(n, dtype=np.int64)
+    for month_number, name in enumerate(MONTHS, start=1):
+        month[month_key == ((name[0] << 16) | (name[1] << 8) | name[2])] = month_number
+    bad |= month == 0
+
+    day = day_tens * 10 + digits[:, 5]
+    year = number(8, 9, 10, 11)
+    hour = number(13, 14)
+    minute = number(16, 17)
+    second = number(19, 20)
+    bad |= (day < 1) | (day > days_in_month(year, month)) | (hour > 23) | (minute > 59) | (second > 60)
+
+    # Fraction: the run of digits after the dot, padded with zeros to nanoseconds
+    has_fraction = text[:, 21] == ord('.')
+    fraction = np.zeros(n, dtype=np.int64)
+    in_run = has_fraction.copy()
+    for position in range(FRACTION_START, FRACTION_START + FRACTION_DIGITS):
+        in_run &= is_digit[:, position]
+        fraction = fraction * 10 + np.where(in_run, digits[:, position], 0)
+    bad |= has_fraction & ~is_digit[:, FRACTION_START]
+    bad |= ~has_fraction & (text[:, 21] != ord(' ')) & (text[:, 21] != 0) & (text[:, 21] != ord('"'))
+
+    days = days_from_civil(year, np.where(bad, 1, month), np.where(bad, 1, day))
+    ns = (days * 86400 + hour * 3600 + minute * 60 + second) * NS_PER_SECOND + fraction
+    ns[bad] = NAT
+    return ns, bad
+
+
+def format_frame_times(ns: np.ndarray) -> np.ndarray:
+    """
+    Format epoch nanoseconds the way tshark prints frame.time_utc (vectorized).
+
+    Args:
+        ns: int64 epoch nanoseconds
+
+    Returns:
+        Array of str such as "Jun 11, 2025 18:07:49.728608000 UTC"
+    """
+    ns = np.asarray(ns, dtype=np.int64)
+    n = len(ns)
+    seconds, fraction = np.divmod(ns, NS_PER_SECOND)
+    days, second_of_day = np.divmod(seconds, 86400)
+    year, month, day = civil_from_days(days)
+    hour, rest = np.divmod(second_of_day, 3600)
+    minute, second = np.divmod(rest, 60)
+
+    text = np.frombuffer(b'Jan  1, 1970 00:00:00.000000000 UTC' * n, dtype=np.uint8).reshape(n, LAYOUT_WIDTH).copy()
+    month_names = np.frombuffer(b''.join(MONTHS), dtype=np.uint8).reshape(12, 3)
+    text[:, 0:3] = month_names[month - 1]
+
+    def put(value, start, width):
+        for i in range(width):
+            text[:, start + width - 1 - i] = ord('0') + value // 10 ** i % 10
+
+    put(day, 4, 2)
+    text[day < 10, 4] = ord(' ')  # tshark pads the day with a space
+    put(year, 8, 4)
+    put(hour, 13, 2)
+    put(minute, 16, 2)
+    put(second, 19, 2)
+    put(fraction, FRACTION_START, FRACTION_DIGITS)
+    return text.view(f'S{LAYOUT_WIDTH}').ravel().astype(str)
+
+
+def describe_bad_rows(values: Sequence, bad: np.ndarray, limit: int = 5) -> str:
+    """
+    Summarise unparseable rows in a single message.
+
+    Args:
+        values: The strings that were parsed
+        bad: Boolean mask returned by parse_frame_times
+        limit: Number of example rows to include
+
+    Returns:
+        Message such as "3 unparseable timestamps (row 4: 'foo', 10: 'bar', 11: '')"
+    """
+    positions = np.flatnonzero(bad)
+    examples = ', '.join(f'{position}: {values[position]!r}' for position in positions[:limit])
+    more = ', ...' if len(positions) > limit else ''
+    return f"{len(positions):,} unparseable timestamps (row {examples}{more})"